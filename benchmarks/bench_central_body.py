@@ -0,0 +1,55 @@
+'''
+Compares integrating a low Earth orbit with the native DOP853 in
+barycentric coordinates and relative to the Earth, at several tolerances,
+against a tight Earth-relative reference. Barycentric positions of about
+1 AU only resolve the orbit to rtol * 1 AU, however many steps are taken.
+
+Run with: python -m benchmarks.bench_central_body [days]
+'''
+import sys
+import time
+
+import numpy as np
+
+from flyby.simulation.integrators import integrate
+from flyby.simulation.simulation import generate_initial_conditions_from_cartesian
+from flyby.solar_system_model.celestial_body import CelestialBody
+from flyby.time_model.julian_day import datetime64_to_jd
+
+
+def main(days: float = 1):
+    earth = CelestialBody.earth()
+    initial_time = np.datetime64('2025-01-01')
+    initial_state = np.array([7000e3, 0, 0, 0, 7.55e3, 0])
+    duration = days * 86400
+
+    spacecraft = generate_initial_conditions_from_cartesian(initial_state, earth, initial_time)
+    for body in spacecraft.interacting_bodies:
+        body.construct_interpolant(spacecraft.jd_0, datetime64_to_jd(initial_time) + days)
+    spacecraft.stack_ephemeris_tables()
+    tables = spacecraft.ephemeris_tables
+    central = [body.name for body in spacecraft.interacting_bodies].index("Earth")
+
+    def run(central, rtol):
+        return integrate(tables, spacecraft.jd_0, spacecraft.initial_state_icrs, duration,
+                         rtol=rtol, atol=1e-8, central=central)
+
+    # Warm up the JIT before timing
+    run(-1, 1e-8)
+    reference = run(central, 1e-13)
+
+    print(f"{days} day low Earth orbit")
+    print(f"{'frame':>12}{'rtol':>8}{'steps':>10}{'time [s]':>12}{'final |dr| [m]':>16}")
+
+    for frame, rtol in (("barycentre", 1e-8), ("barycentre", 1e-10), ("Earth", 1e-8),
+                        ("Earth", 1e-10), ("Earth", 1e-12)):
+        start = time.perf_counter()
+        solution = run(central if frame == "Earth" else -1, rtol)
+        elapsed = time.perf_counter() - start
+
+        difference = np.linalg.norm(solution.y[:3, -1] - reference.y[:3, -1])
+        print(f"{frame:>12}{rtol:>8.0e}{len(solution.t):>10}{elapsed:>12.4f}{difference:>16.4f}")
+
+
+if __name__ == '__main__':
+    main(*(float(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,77 @@
+'''
+Compares the accuracy, memory footprint and throughput of the Chebyshev,
+cubic Hermite and linear (FastLerp) ephemeris interpolants against DE440
+itself.
+
+Run with: python -m benchmarks.bench_chebyshev_ephemeris [days]
+'''
+import sys
+import time
+
+import numpy as np
+
+from flyby.solar_system_model.jpl_ephemeris import de440
+from flyby.solar_system_model.relational_tree import RelationalTree
+from flyby.spacecraft_model.gravity import n_body_rates, stack_ephemeris_tables
+from flyby.time_model.julian_day import datetime64_to_jd
+
+
+def table_bytes(interpolant) -> int:
+    if hasattr(interpolant, "coefficients"):
+        return interpolant.coefficients.nbytes
+    return interpolant.arr.nbytes + interpolant.jd.nbytes
+
+
+def time_calls(fn, args, repeat: int = 3) -> float:
+    # Best of several passes, in calls per second
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for arg in args:
+            fn(*arg)
+        best = min(best, time.perf_counter() - start)
+    return len(args) / best
+
+
+def main(days: float = 700):
+    start_jd = datetime64_to_jd(np.datetime64('2025-01-01'))
+    end_jd = start_jd + days
+
+    rng = np.random.default_rng(0)
+    t_eval = np.sort(rng.uniform(start_jd, end_jd, 2000))
+    u = np.array([1.5e11, 2e10, -3e9, 1e3, 2.9e4, 5e2])
+
+    print(f"{days} day span, errors against DE440 at {len(t_eval)} random epochs\n")
+    print(f"{'body':<10}{'method':<11}{'max |dr| [m]':>14}{'max |dv| [m/s]':>16}{'table [kB]':>12}")
+
+    stacks = {}
+    for method in ("lerp", "hermite", "chebyshev"):
+        bodies = RelationalTree.solar_system().all_bodies
+        for body in bodies:
+            body.construct_interpolant(start_jd, end_jd, method=method)
+
+            r, v = de440[0, body.ephemeris_id].compute_and_differentiate(t_eval)
+            state = np.array([body.get_state(jd) for jd in t_eval]).T
+
+            dr = np.max(np.linalg.norm(state[:3] - r * 1e3, axis=0))
+            dv = np.max(np.linalg.norm(state[3:] - v * 1e3 / 86400, axis=0))
+            size = table_bytes(body.position_interpolant) + table_bytes(body.velocity_interpolant) \
+                if method == "lerp" else table_bytes(body.position_interpolant)
+
+            print(f"{body.name:<10}{method:<11}{dr:>14.3e}{dv:>16.3e}{size / 1e3:>12.1f}")
+
+        stacks[method] = (bodies, stack_ephemeris_tables(bodies))
+
+    print(f"\n{'method':<11}{'get_state [calls/s]':>21}{'n_body_rates [calls/s]':>24}")
+    for method, (bodies, tables) in stacks.items():
+        earth = bodies[[body.name for body in bodies].index("Earth")]
+        n_body_rates(t_eval[0], u, *tables)
+
+        state_rate = time_calls(earth.get_state, [(jd,) for jd in t_eval])
+        rates_rate = time_calls(n_body_rates, [(jd, u, *tables) for jd in t_eval])
+
+        print(f"{method:<11}{state_rate:>21.0f}{rates_rate:>24.0f}")
+
+
+if __name__ == '__main__':
+    main(*(float(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,58 @@
+'''
+Compares the disk footprint and cold-start time of building the solar
+system interpolants from DE440 and from a compact ephemeris cache file.
+
+Run with: python -m benchmarks.bench_ephemeris_cache [start] [end]
+'''
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+from flyby.solar_system_model.ephemeris_cache import EPHEMERIS_CACHE_VARIABLE, write_ephemeris_cache
+from flyby.solar_system_model.jpl_ephemeris import de440
+from flyby.time_model.julian_day import datetime64_to_jd
+
+# Runs in a fresh interpreter, so that nothing is cached or imported yet
+COLD_START = '''
+import time
+start = time.perf_counter()
+from flyby.solar_system_model.relational_tree import RelationalTree
+for body in RelationalTree.solar_system().all_bodies:
+    body.construct_interpolant({start_jd}, {end_jd})
+print(time.perf_counter() - start)
+'''
+
+
+def cold_start(env: dict, start_jd: float, end_jd: float, repeat: int = 3) -> float:
+    script = COLD_START.format(start_jd=start_jd, end_jd=end_jd)
+    return min(float(subprocess.check_output([sys.executable, "-c", script], env=env))
+               for _ in range(repeat))
+
+
+def main(start: str = "2020-01-01", end: str = "2060-01-01"):
+    start_jd = datetime64_to_jd(np.datetime64(start))
+    end_jd = datetime64_to_jd(np.datetime64(end))
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "solar_system.flybyeph")
+        write_ephemeris_cache(path, start_jd, end_jd)
+
+        env = dict(os.environ, PYTHONPATH=os.getcwd())
+        env.pop(EPHEMERIS_CACHE_VARIABLE, None)
+        # Run a 700 day simulation window inside the cached range
+        span = (start_jd + 1000, start_jd + 1700)
+
+        t_kernel = cold_start(dict(env, FLYBY_EPHEMERIS_PATH=de440.path), *span)
+        t_cache = cold_start(dict(env, **{EPHEMERIS_CACHE_VARIABLE: path}), *span)
+
+        print(f"cache of {start} to {end}")
+        print(f"{'source':<8}{'size [MB]':>12}{'cold start [s]':>16}")
+        print(f"{'DE440':<8}{os.path.getsize(de440.path) / 1e6:>12.2f}{t_kernel:>16.3f}")
+        print(f"{'cache':<8}{os.path.getsize(path) / 1e6:>12.2f}{t_cache:>16.3f}")
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,45 @@
+'''
+Times evaluating a linear interpolant of the Earth's position at many
+epochs: one call with the array of epochs, against a call per epoch.
+
+Run with: python -m benchmarks.bench_fast_lerp [n_points]
+'''
+import sys
+import time
+
+import numpy as np
+
+from flyby.solar_system_model.celestial_body import CelestialBody
+
+
+def main(n_points: int = 100000):
+    start_time, end_time = 2460000.5, 2460000.5 + 365.25
+    earth = CelestialBody.earth()
+    earth.construct_interpolant(start_time, end_time, method="lerp")
+    jd = np.linspace(start_time, end_time, n_points)
+
+    earth.get_position(jd[:2])
+    earth.get_position(jd[0])
+
+    start = time.perf_counter()
+    positions = earth.get_position(jd)
+    elapsed = time.perf_counter() - start
+    print(f"sorted epochs, one call: {n_points} epochs in {elapsed * 1e3:.2f} ms")
+
+    shuffled = np.random.default_rng(0).permutation(jd)
+    start = time.perf_counter()
+    earth.get_position(shuffled)
+    elapsed = time.perf_counter() - start
+    print(f"shuffled epochs, one call: {n_points} epochs in {elapsed * 1e3:.2f} ms")
+
+    start = time.perf_counter()
+    looped = np.array([earth.get_position(jd_k) for jd_k in jd])
+    elapsed = time.perf_counter() - start
+    print(f"a call per epoch: {n_points} epochs in {elapsed * 1e3:.1f} ms")
+
+    error = np.max(np.linalg.norm(positions - looped, axis=-1))
+    print(f"largest difference: {error:.2e} m")
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,69 @@
+'''
+Times the native integrator in low Earth orbit with all bodies against
+AdaptiveForceModel selections of several tolerances. Yoshida4 takes the same
+steps with every selection, so the differences in time are those of the
+evaluations of the rates and in position those of the omitted bodies.
+
+Run with: python -m benchmarks.bench_force_model [days]
+'''
+import sys
+import time
+
+import numpy as np
+
+from flyby.simulation.integrators import integrate
+from flyby.simulation.simulation import generate_initial_conditions_from_cartesian
+from flyby.solar_system_model.celestial_body import CelestialBody
+from flyby.spacecraft_model.force_model import AdaptiveForceModel
+from flyby.time_model.julian_day import datetime64_to_jd
+
+
+def main(days: float = 30):
+    earth = CelestialBody.earth()
+    initial_time = np.datetime64('2025-01-01')
+    initial_state = np.array([7000e3, 0, 0, 0, 7.55e3, 0])
+    duration = days * 86400
+
+    spacecraft = generate_initial_conditions_from_cartesian(initial_state, earth, initial_time)
+    bodies = spacecraft.interacting_bodies
+    for body in bodies:
+        body.construct_interpolant(spacecraft.jd_0, datetime64_to_jd(initial_time) + days)
+    spacecraft.stack_ephemeris_tables()
+    tables = spacecraft.ephemeris_tables
+
+    def run(force_model):
+        select_tables = None
+        if force_model is not None:
+            def select_tables(t, y):
+                return force_model.tables(bodies, tables, t, spacecraft.jd_0, y)
+
+        return integrate(tables, spacecraft.jd_0, spacecraft.initial_state_icrs, duration,
+                         method="Yoshida4", step=30.0, force_model=select_tables)
+
+    # Warm up the JIT and ephemeris before timing
+    run(None)
+    run(AdaptiveForceModel())
+
+    print(f"{days} day low Earth orbit, {len(bodies)} bodies")
+    print(f"{'tolerance':>12}{'bodies':>10}{'time [s]':>12}{'speedup':>10}{'final |dr| [m]':>16}")
+
+    reference = None
+    for tolerance in (None, 1e-9, 1e-7, 1e-5):
+        force_model = None if tolerance is None else AdaptiveForceModel(tolerance)
+
+        start = time.perf_counter()
+        solution = run(force_model)
+        elapsed = time.perf_counter() - start
+
+        if reference is None:
+            reference = solution, elapsed
+        difference = np.linalg.norm(solution.y[:3, -1] - reference[0].y[:3, -1])
+        n_active = len(bodies) if force_model is None else \
+            np.mean([active.sum() for _, active in force_model.segments])
+
+        print(f"{'all' if tolerance is None else f'{tolerance:g}':>12}{n_active:>10.1f}"
+              f"{elapsed:>12.4f}{reference[1] / elapsed:>10.1f}{difference:>16.1f}")
+
+
+if __name__ == '__main__':
+    main(*(float(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,41 @@
+'''
+Times rotating a long trajectory to the ecliptic frame: per epoch with the
+frames service, against a SciPy Rotation per epoch and against the single
+rotation at the first epoch that plot_trajectory used to apply.
+
+Run with: python -m benchmarks.bench_frames [n_points]
+'''
+import sys
+import time
+
+import numpy as np
+from scipy.spatial.transform import Rotation as R
+
+from flyby.orbit_models.frames import icrs_to_ecliptic, obliquity_of_ecliptic
+
+
+def main(n_points: int = 100000):
+    rng = np.random.default_rng(0)
+    r = rng.normal(size=(n_points, 3)) * 1.5e11
+    jd = np.linspace(2460000.5, 2460000.5 + 20 * 365.25, n_points)
+
+    start = time.perf_counter()
+    rotated = icrs_to_ecliptic(r, jd)
+    elapsed = time.perf_counter() - start
+    print(f"frames.icrs_to_ecliptic: {n_points} epochs in {elapsed * 1e3:.1f} ms")
+
+    n_scipy = min(n_points, 10000)
+    start = time.perf_counter()
+    for r_k, jd_k in zip(r[:n_scipy], jd):
+        R.from_euler('x', -obliquity_of_ecliptic(jd_k)).as_matrix() @ r_k
+    elapsed = time.perf_counter() - start
+    print(f"SciPy Rotation per epoch: {n_scipy} epochs in {elapsed * 1e3:.1f} ms "
+          f"({elapsed / n_scipy * 1e6:.0f} us each)")
+
+    first_epoch = r @ R.from_euler('x', -obliquity_of_ecliptic(jd[0])).as_matrix().T
+    error = np.max(np.linalg.norm(first_epoch - rotated, axis=-1))
+    print(f"error of the first epoch rotation over 20 years: {error / 1e3:.0f} km")
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,51 @@
+'''
+Compares the compiled integrators of flyby.simulation.integrators against
+solve_ivp for a spacecraft in low Earth orbit, where the many short steps
+make the cost of each evaluation of the rates dominate.
+
+Run with: python -m benchmarks.bench_integrators [days]
+'''
+import sys
+import time
+
+import numpy as np
+
+from flyby.simulation.simulation import generate_initial_conditions_from_cartesian, simulate
+from flyby.solar_system_model.celestial_body import CelestialBody
+
+
+def main(days: float = 30):
+    earth = CelestialBody.earth()
+    initial_time = np.datetime64('2025-01-01')
+    end_time = initial_time + np.timedelta64(int(days), 'D')
+    initial_state = np.array([7000e3, 0, 0, 0, 7.55e3, 0])
+
+    cases = (("scipy", "DOP853", None), ("native", "DOP853", None),
+             ("native", "RKF78", None), ("native", "Yoshida4", 30.0))
+
+    # Warm up the JIT before timing
+    for integrator, method, step in cases:
+        simulate(generate_initial_conditions_from_cartesian(initial_state, earth, initial_time),
+                 initial_time + np.timedelta64(1, 'D'), False, integrator, method, step)
+
+    print(f"{days} day low Earth orbit")
+    print(f"{'integrator':>12}{'method':>10}{'steps':>10}{'time [s]':>12}{'speedup':>10}{'final |dr| [m]':>16}")
+
+    reference = None
+    for integrator, method, step in cases:
+        spacecraft = generate_initial_conditions_from_cartesian(initial_state, earth, initial_time)
+
+        start = time.perf_counter()
+        solution = simulate(spacecraft, end_time, False, integrator, method, step)
+        elapsed = time.perf_counter() - start
+
+        if reference is None:
+            reference = solution, elapsed
+        difference = np.linalg.norm(solution.y[:3, -1] - reference[0].y[:3, -1])
+
+        print(f"{integrator:>12}{method:>10}{len(solution.t):>10}{elapsed:>12.4f}"
+              f"{reference[1] / elapsed:>10.1f}{difference:>16.1f}")
+
+
+if __name__ == '__main__':
+    main(*(float(arg) for arg in sys.argv[1:]))
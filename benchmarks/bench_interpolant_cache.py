@@ -0,0 +1,37 @@
+'''
+Times building the solar system interpolants for a batch of simulations
+over the same window, as simulate() does for each spacecraft, with and
+without the process-wide interpolant cache.
+
+Run with: python -m benchmarks.bench_interpolant_cache [n_simulations]
+'''
+import sys
+import time
+
+from flyby.solar_system_model.interpolant_cache import interpolant_cache
+from flyby.solar_system_model.relational_tree import RelationalTree
+from flyby.spacecraft_model.gravity import stack_ephemeris_tables
+
+
+def main(n_simulations: int = 200):
+    start_jd, end_jd = 2460000.5, 2460700.5
+
+    for method in ("chebyshev", "hermite"):
+        for use_cache in (False, True):
+            interpolant_cache().clear()
+
+            start = time.perf_counter()
+            for _ in range(n_simulations):
+                bodies = RelationalTree.solar_system().all_bodies
+                for body in bodies:
+                    body.construct_interpolant(start_jd, end_jd, method=method, use_cache=use_cache)
+                stack_ephemeris_tables(bodies)
+            elapsed = time.perf_counter() - start
+
+            print(f"{method:<10} cache={str(use_cache):<6} {n_simulations} simulations: "
+                  f"{elapsed:.2f} s ({elapsed / n_simulations * 1e3:.2f} ms each) "
+                  f"{interpolant_cache().stats() if use_cache else ''}")
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
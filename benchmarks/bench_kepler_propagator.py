@@ -0,0 +1,46 @@
+'''
+Times the batched Kepler propagator against integrating the same two-body
+coasts with solve_ivp.
+
+Run with: python -m benchmarks.bench_kepler_propagator [n_states]
+'''
+import sys
+import time
+
+import numpy as np
+from scipy.integrate import solve_ivp
+
+from flyby.orbit_models.kepler_propagator import propagate_kepler
+from flyby.solar_system_model.celestial_body import CelestialBody
+
+
+def main(n_states: int = 100000):
+    mu = CelestialBody.sun().mu
+    rng = np.random.default_rng(0)
+    states = np.hstack((rng.normal(size=(n_states, 3)) * 1.5e11,
+                        rng.normal(size=(n_states, 3)) * 30e3))
+    dt = rng.uniform(0, 365 * 86400, n_states)
+
+    # Warm up the JIT before timing
+    propagate_kepler(states[:2], dt[:2], mu)
+
+    start = time.perf_counter()
+    propagate_kepler(states, dt, mu)
+    elapsed = time.perf_counter() - start
+    print(f"propagate_kepler: {n_states} coasts in {elapsed * 1e3:.1f} ms "
+          f"({elapsed / n_states * 1e6:.2f} us each)")
+
+    def rates(t, u):
+        return np.concatenate((u[3:], -mu * u[:3] / np.linalg.norm(u[:3])**3))
+
+    n_integrated = 100
+    start = time.perf_counter()
+    for state, t in zip(states[:n_integrated], dt):
+        solve_ivp(rates, (0, t), state, method='DOP853', rtol=1e-8, atol=1e-8)
+    elapsed = time.perf_counter() - start
+    print(f"solve_ivp: {n_integrated} coasts in {elapsed * 1e3:.1f} ms "
+          f"({elapsed / n_integrated * 1e6:.0f} us each)")
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,96 @@
+'''
+Times the KeplerianOrbit work of the 365 frame solar_sys_animation demo:
+fitting each planet's orbit every day and sampling it at 50 points, as
+plot_body does for both panels, with the cached rotation against
+rebuilding it on every call.
+
+Run with: python -m benchmarks.bench_keplerian_orbit [frames]
+'''
+import sys
+import time
+
+import numpy as np
+
+from flyby.orbit_models.keplerian_orbit import KeplerianOrbit
+from flyby.solar_system_model.relational_tree import RelationalTree
+from flyby.time_model.julian_day import datetime64_to_jd
+
+
+def rebuilt_dcm_points(orbit, nu):
+    # The per-call rotation that the cached KeplerianOrbit.dcm replaces, as
+    # get_state_space_orbit used it
+    e, a, i, raan, arg_perigee = orbit.e, orbit.a, orbit.i, orbit.raan, orbit.arg_perigee
+    r = a*(1-e**2)/(1+e*np.cos(nu))
+    rp = r*np.vstack((np.cos(nu), np.sin(nu), np.zeros(len(nu))))
+    C = np.array([
+        [np.cos(raan)*np.cos(arg_perigee)-np.sin(raan)*np.sin(arg_perigee)*np.cos(i), -np.cos(raan)
+         * np.sin(arg_perigee)-np.sin(raan)*np.cos(arg_perigee)*np.cos(i), np.sin(raan)*np.sin(i)],
+        [np.sin(raan)*np.cos(arg_perigee)+np.cos(raan)*np.sin(arg_perigee)*np.cos(i), -np.sin(raan)
+         * np.sin(arg_perigee)+np.cos(raan)*np.cos(arg_perigee)*np.cos(i), -np.cos(raan)*np.sin(i)],
+        [np.sin(arg_perigee)*np.sin(i),
+         np.cos(arg_perigee)*np.sin(i), np.cos(i)]
+    ])
+    return C @ rp
+
+
+def main(frames: int = 365):
+    solar_system = RelationalTree.solar_system()
+    sun = solar_system.root
+    jd = datetime64_to_jd(np.datetime64('2026-01-01')) + np.arange(frames)
+
+    # Planet states are looked up beforehand so only the orbit work is timed;
+    # the inner four planets are plotted on both panels
+    planets = solar_system.root.children
+    planets = planets + planets[:4]
+    states = []
+    for body in planets:
+        body.construct_interpolant(jd[0], jd[-1])
+        states.append([body.get_state(t) - sun.ephemeris_source(t, t).state(t) for t in jd])
+    states = np.array(states).reshape(-1, 6)
+
+    orbits = [KeplerianOrbit.from_state(state[:3], state[3:], sun.mu) for state in states]
+    nu = np.linspace(0, 2*np.pi, 50)
+
+    start = time.perf_counter()
+    for orbit in orbits:
+        rebuilt_dcm_points(orbit, np.linspace(0, 2*np.pi, 50))
+    rebuilt = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for orbit in orbits:
+        KeplerianOrbit(orbit.a, orbit.e, orbit.i, orbit.raan, orbit.arg_perigee) \
+            .get_state_space_orbit(50)
+    cached = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for orbit in orbits:
+        orbit.get_state_space_orbit(50)
+    warm = time.perf_counter() - start
+
+    print(f"{len(orbits)} orbits sampled at 50 points:")
+    print(f"  rotation rebuilt per call: {rebuilt * 1e3:.1f} ms")
+    print(f"  new orbit, rotation cached: {cached * 1e3:.1f} ms")
+    print(f"  existing orbit, rotation reused: {warm * 1e3:.1f} ms")
+
+    orbit = orbits[0]
+    start = time.perf_counter()
+    for _ in range(10000):
+        orbit.get_state_space_point(nu)
+        orbit.get_state_space_velocity(nu, sun.mu)
+    separate = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(10000):
+        orbit.get_state(nu, sun.mu)
+    combined = time.perf_counter() - start
+    print(f"position and velocity, 10000 calls: separate {separate * 1e3:.1f} ms, "
+          f"get_state {combined * 1e3:.1f} ms")
+
+    start = time.perf_counter()
+    for state in states:
+        KeplerianOrbit.from_state(state[:3], state[3:], sun.mu)
+    print(f"{len(states)} orbit fits: {(time.perf_counter() - start) * 1e3:.1f} ms")
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,40 @@
+'''
+Times the batched Lambert solver on an Earth to Mars departure/arrival grid.
+
+Run with: python -m benchmarks.bench_lambert [n_departure] [n_arrival]
+'''
+import sys
+import time
+
+import numpy as np
+
+from flyby.orbit_models.lambert import lambert_between_bodies
+from flyby.solar_system_model.celestial_body import CelestialBody
+from flyby.time_model.julian_day import datetime64_to_jd
+
+
+def main(n_departure: int = 1000, n_arrival: int = 1000):
+    earth = CelestialBody.earth()
+    mars = CelestialBody.mars()
+
+    start_jd = datetime64_to_jd(np.datetime64('2026-01-01'))
+    departure_jd = np.linspace(start_jd, start_jd + 700, n_departure)[:, np.newaxis]
+    arrival_jd = np.linspace(start_jd + 150, start_jd + 1100, n_arrival)[np.newaxis, :]
+
+    # Warm up the JIT before timing
+    lambert_between_bodies(earth, mars, departure_jd[:2], arrival_jd[:, :2])
+
+    start = time.perf_counter()
+    v1, _, earth_state, _ = lambert_between_bodies(earth, mars, departure_jd, arrival_jd)
+    elapsed = time.perf_counter() - start
+
+    valid = ~np.isnan(v1[..., 0]) & (arrival_jd > departure_jd)
+    c3 = np.sum((v1 - earth_state[..., 3:])**2, axis=-1)
+
+    print(f"{n_departure} x {n_arrival} grid: {elapsed:.3f} s "
+          f"({n_departure * n_arrival / elapsed:.0f} transfers/s)")
+    print(f"minimum C3: {np.min(c3[valid]) / 1e6:.2f} km^2/s^2")
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,42 @@
+'''
+Times the conversion of a trajectory of states into osculating elements
+with KeplerianOrbitArray, against KeplerianOrbit.from_state per point.
+
+Run with: python -m benchmarks.bench_orbit_elements [n_points]
+'''
+import sys
+import time
+
+import numpy as np
+
+from flyby.orbit_models.keplerian_orbit import KeplerianOrbit, KeplerianOrbitArray
+from flyby.solar_system_model.celestial_body import CelestialBody
+
+
+def main(n_points: int = 100000):
+    mu = CelestialBody.sun().mu
+    rng = np.random.default_rng(0)
+    states = np.hstack((rng.normal(size=(n_points, 3)) * 1.5e11,
+                        rng.normal(size=(n_points, 3)) * 30e3))
+
+    start = time.perf_counter()
+    orbits = KeplerianOrbitArray.from_states(states, mu)
+    elapsed = time.perf_counter() - start
+    print(f"KeplerianOrbitArray.from_states: {n_points} states in {elapsed * 1e3:.1f} ms")
+
+    start = time.perf_counter()
+    orbits.to_states(mu)
+    elapsed = time.perf_counter() - start
+    print(f"KeplerianOrbitArray.to_states: {n_points} states in {elapsed * 1e3:.1f} ms")
+
+    n_scalar = min(n_points, 10000)
+    start = time.perf_counter()
+    for state in states[:n_scalar]:
+        KeplerianOrbit.from_state(state[:3], state[3:], mu)
+    elapsed = time.perf_counter() - start
+    print(f"KeplerianOrbit.from_state: {n_scalar} states in {elapsed * 1e3:.1f} ms "
+          f"({elapsed / n_scalar * 1e6:.0f} us each)")
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
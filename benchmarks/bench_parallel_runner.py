@@ -0,0 +1,53 @@
+'''
+Measures how simulate_parallel scales with the number of worker processes,
+from 1 up to the number of CPUs.
+
+Run with: python -m benchmarks.bench_parallel_runner [n_jobs] [days]
+'''
+import os
+import sys
+import time
+
+import numpy as np
+
+from flyby.simulation.parallel import simulate_parallel
+from flyby.simulation.simulation import generate_initial_conditions_from_cartesian
+from flyby.solar_system_model.celestial_body import CelestialBody
+
+
+def main(n_jobs: int = 200, days: int = 365):
+    earth = CelestialBody.earth()
+    initial_time = np.datetime64('2025-01-01')
+    end_time = initial_time + np.timedelta64(days, 'D')
+
+    # A launch window: 3 km/s departures spread over 60 days
+    rng = np.random.default_rng(0)
+    spacecraft = []
+    for k in range(n_jobs):
+        direction = rng.normal(size=3)
+        direction /= np.linalg.norm(direction)
+        spacecraft.append(generate_initial_conditions_from_cartesian(
+            np.concatenate((2e9 * direction, 3e3 * direction)), earth,
+            initial_time + np.timedelta64(k * 60 // n_jobs, 'D')))
+
+    # Warm up the pool and the JIT in the parent
+    simulate_parallel(spacecraft[:2], end_time, processes=1, show_progress=False)
+
+    print(f"{n_jobs} jobs of up to {days} days")
+    print(f"{'processes':>10}{'time [s]':>12}{'jobs/s':>10}{'speedup':>10}")
+
+    # Powers of two up to, and including, the number of CPUs
+    counts = sorted({2**k for k in range(os.cpu_count().bit_length())} | {os.cpu_count()})
+
+    t_serial = None
+    for processes in counts:
+        start = time.perf_counter()
+        simulate_parallel(spacecraft, end_time, processes=processes, show_progress=False)
+        elapsed = time.perf_counter() - start
+        t_serial = t_serial or elapsed
+
+        print(f"{processes:>10}{elapsed:>12.3f}{n_jobs / elapsed:>10.1f}{t_serial / elapsed:>10.2f}")
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
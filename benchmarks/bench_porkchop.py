@@ -0,0 +1,39 @@
+'''
+Times porkchop grids between the Earth and Mars, cold and with the cached
+ephemeris state grids.
+
+Run with: python -m benchmarks.bench_porkchop [n_departure] [n_arrival]
+'''
+import sys
+import time
+
+import numpy as np
+
+from flyby.analysis.porkchop import porkchop, heliocentric_state_grid
+from flyby.solar_system_model.celestial_body import CelestialBody
+
+
+def main(n_departure: int = 500, n_arrival: int = 500):
+    earth = CelestialBody.earth()
+    mars = CelestialBody.mars()
+    departure_window = (np.datetime64('2026-08-01'), np.datetime64('2027-02-01'))
+    arrival_window = (np.datetime64('2027-03-01'), np.datetime64('2028-03-01'))
+
+    # Warm up the JIT before timing
+    porkchop(earth, mars, departure_window, arrival_window, 2, 2)
+
+    for label in ("cold", "cached"):
+        if label == "cold":
+            heliocentric_state_grid.cache_clear()
+
+        start = time.perf_counter()
+        grid = porkchop(earth, mars, departure_window, arrival_window, n_departure, n_arrival)
+        elapsed = time.perf_counter() - start
+
+        print(f"{label}: {n_departure} x {n_arrival} grid in {elapsed:.3f} s")
+
+    print(f"minimum C3: {grid.optimum('c3')[2] / 1e6:.2f} km^2/s^2")
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
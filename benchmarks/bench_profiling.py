@@ -0,0 +1,56 @@
+'''
+Measures the overhead of profiling a low Earth orbit propagation with the
+native and scipy integrators, and prints the profile of the native one.
+
+Run with: python -m benchmarks.bench_profiling [days]
+'''
+import sys
+import time
+
+import numpy as np
+
+from flyby.simulation.profiling import Profile
+from flyby.simulation.simulation import generate_initial_conditions_from_cartesian, simulate
+from flyby.solar_system_model.celestial_body import CelestialBody
+
+
+def main(days: float = 10):
+    earth = CelestialBody.earth()
+    initial_time = np.datetime64('2025-01-01')
+    end_time = initial_time + np.timedelta64(int(days), 'D')
+    initial_state = np.array([7000e3, 0, 0, 0, 7.55e3, 0])
+
+    def run(integrator, profile):
+        simulate(generate_initial_conditions_from_cartesian(initial_state, earth, initial_time),
+                 end_time, False, integrator, profile=profile)
+
+    cases = (
+        ("scipy, off", lambda: run("scipy", None)),
+        ("scipy, profiled", lambda: run("scipy", Profile())),
+        ("native, off", lambda: run("native", None)),
+        ("native, profiled", lambda: run("native", Profile())),
+    )
+
+    # Warm up the JIT and the interpolant cache before timing
+    for _, case in cases:
+        case()
+
+    print(f"{days} day low Earth orbit, best of 3")
+    print(f"{'profiling':>20}{'time [s]':>12}")
+    for name, case in cases:
+        elapsed = []
+        for _ in range(3):
+            start = time.perf_counter()
+            case()
+            elapsed.append(time.perf_counter() - start)
+        print(f"{name:>20}{min(elapsed):>12.4f}")
+
+    profile = Profile()
+    run("native", profile)
+    print()
+    print(profile.to_json())
+    print(profile.folded(), end="")
+
+
+if __name__ == '__main__':
+    main(*(float(arg) for arg in sys.argv[1:]))
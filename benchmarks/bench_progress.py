@@ -0,0 +1,78 @@
+'''
+Measures the overhead of monitoring the progress of a low Earth orbit
+propagation: none, the per-step tqdm event simulate() used to pass to
+solve_ivp, and a ProgressMonitor reporting to a silent sink.
+
+Run with: python -m benchmarks.bench_progress [days]
+'''
+import sys
+import time
+
+import numpy as np
+from scipy.integrate import solve_ivp
+from tqdm import tqdm
+
+from flyby.simulation.simulation import generate_initial_conditions_from_cartesian, simulate
+from flyby.simulation.telemetry import ProgressMonitor
+from flyby.solar_system_model.celestial_body import CelestialBody
+
+
+def main(days: float = 10):
+    earth = CelestialBody.earth()
+    initial_time = np.datetime64('2025-01-01')
+    end_time = initial_time + np.timedelta64(int(days), 'D')
+    initial_state = np.array([7000e3, 0, 0, 0, 7.55e3, 0])
+    duration = int(days) * 86400.0
+
+    spacecraft = generate_initial_conditions_from_cartesian(initial_state, earth, initial_time)
+    for body in spacecraft.interacting_bodies:
+        body.construct_interpolant(spacecraft.jd_0, spacecraft.jd_0 + int(days))
+    spacecraft.stack_ephemeris_tables()
+
+    def legacy():
+        pbar = tqdm(total=int(duration), unit="sec", disable=True)
+
+        def progress(t, y=None):
+            pbar.update(int(t - pbar.n))
+            return 0
+
+        solve_ivp(spacecraft.get_rates, (0, duration), spacecraft.initial_state_icrs,
+                  method="DOP853", rtol=1e-8, atol=1e-8, events=[progress])
+
+    def monitored():
+        monitor = ProgressMonitor(duration, [lambda report: None])
+        solve_ivp(monitor.counting(spacecraft.get_rates), (0, duration),
+                  spacecraft.initial_state_icrs, method="DOP853", rtol=1e-8, atol=1e-8)
+        monitor.close()
+
+    def native(telemetry):
+        simulate(generate_initial_conditions_from_cartesian(initial_state, earth, initial_time),
+                 end_time, False, "native", telemetry=telemetry)
+
+    cases = (
+        ("scipy, none", lambda: solve_ivp(spacecraft.get_rates, (0, duration),
+                                          spacecraft.initial_state_icrs, method="DOP853",
+                                          rtol=1e-8, atol=1e-8)),
+        ("scipy, tqdm event", legacy),
+        ("scipy, monitor", monitored),
+        ("native, none", lambda: native(None)),
+        ("native, monitor", lambda: native([lambda report: None])),
+    )
+
+    # Warm up the JIT before timing
+    for _, run in cases:
+        run()
+
+    print(f"{days} day low Earth orbit, best of 3")
+    print(f"{'progress':>20}{'time [s]':>12}")
+    for name, run in cases:
+        elapsed = []
+        for _ in range(3):
+            start = time.perf_counter()
+            run()
+            elapsed.append(time.perf_counter() - start)
+        print(f"{name:>20}{min(elapsed):>12.4f}")
+
+
+if __name__ == '__main__':
+    main(*(float(arg) for arg in sys.argv[1:]))
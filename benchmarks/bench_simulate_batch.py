@@ -0,0 +1,58 @@
+'''
+Compares simulate_batch against calling simulate once per spacecraft for
+batches of heliocentric cruises leaving the Earth.
+
+Run with: python -m benchmarks.bench_simulate_batch [days]
+'''
+import sys
+import time
+
+import numpy as np
+
+from flyby.simulation.simulation import (generate_initial_conditions_from_cartesian,
+                                         simulate, simulate_batch)
+from flyby.solar_system_model.celestial_body import CelestialBody
+
+
+def departure_states(n: int) -> np.ndarray:
+    # 3 km/s departures in random directions from 2e9 m outside the Earth
+    rng = np.random.default_rng(0)
+    direction = rng.normal(size=(n, 3))
+    direction /= np.linalg.norm(direction, axis=1)[:, np.newaxis]
+    return np.hstack((2e9 * direction, 3e3 * direction))
+
+
+def main(days: float = 365):
+    earth = CelestialBody.earth()
+    initial_time = np.datetime64('2025-01-01')
+    end_time = initial_time + np.timedelta64(int(days), 'D')
+
+    # Warm up the JIT before timing
+    simulate_batch(departure_states(2), earth, initial_time,
+                   initial_time + np.timedelta64(1, 'D'), show_progress=False)
+    simulate(generate_initial_conditions_from_cartesian(departure_states(1)[0], earth, initial_time),
+             initial_time + np.timedelta64(1, 'D'), show_progress=False)
+
+    print(f"{days} day cruises")
+    print(f"{'N':>6}{'simulate x N [s]':>18}{'simulate_batch [s]':>20}{'speedup':>10}")
+
+    for n in (1, 10, 100, 1000):
+        states = departure_states(n)
+
+        # Time at most 10 single runs and extrapolate
+        n_single = min(n, 10)
+        start = time.perf_counter()
+        for state in states[:n_single]:
+            spacecraft = generate_initial_conditions_from_cartesian(state, earth, initial_time)
+            simulate(spacecraft, end_time, show_progress=False)
+        t_single = (time.perf_counter() - start) * n / n_single
+
+        start = time.perf_counter()
+        simulate_batch(states, earth, initial_time, end_time, show_progress=False)
+        t_batch = time.perf_counter() - start
+
+        print(f"{n:>6}{t_single:>18.3f}{t_batch:>20.3f}{t_single / t_batch:>10.1f}")
+
+
+if __name__ == '__main__':
+    main(*(float(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,418 @@
+'''
+Multiple gravity assist (MGA) trajectory optimization with patched conics.
+
+A trajectory visits a sequence of bodies, e.g. Earth - Venus - Earth -
+Jupiter. Each leg between two bodies is a heliocentric Lambert arc, and at
+each intermediate body the incoming and outgoing hyperbolic excess
+velocities are joined by a powered flyby: a single impulse at periapsis.
+
+The decision vector is [t0, T1, ..., Tn]: the departure Julian date and the
+time of flight of each leg in days. Its cost is the total impulse, which is
+minimized by differential evolution over whole populations at once.
+'''
+import numpy as np
+from scipy.optimize import differential_evolution, OptimizeResult
+
+from flyby.analysis.porkchop import hyperbolic_impulse
+from flyby.orbit_models.lambert import lambert
+from flyby.simulation.simulation import simulate
+from flyby.solar_system_model.celestial_body import CelestialBody, ephemeris_source
+from flyby.solar_system_model.relational_tree import RelationalTree
+from flyby.spacecraft_model.spacecraft import Spacecraft
+from flyby.time_model.julian_day import datetime64_to_jd, jd_to_datetime64
+
+# Cost of candidates for which a leg has no Lambert solution, in m/s
+INFEASIBLE_COST = 1e8
+
+
+def powered_flyby_dv(v_inf_in: np.ndarray, v_inf_out: np.ndarray, mu: float,
+                     minimum_periapsis: float, iterations: int = 50) -> "tuple[np.ndarray, np.ndarray]":
+    '''
+    Returns the impulse of the powered flybys joining incoming and outgoing
+    hyperbolic excess velocities, and their periapsis radii.
+
+    The periapsis radius is found by bisection such that the incoming and
+    outgoing hyperbolas together turn the excess velocity by the required
+    angle, and the impulse is the change of speed at periapsis. If even a
+    periapsis at minimum_periapsis does not turn far enough, the remaining
+    turn is made by rotating the outgoing excess velocity at infinity.
+
+    Parameters
+    ----------
+    v_inf_in : np.ndarray
+        The excess velocities relative to the body before the flyby, shape (..., 3)
+    v_inf_out : np.ndarray
+        The excess velocities relative to the body after the flyby, shape (..., 3)
+    mu : float
+        The gravitational parameter of the body
+    minimum_periapsis : float
+        The lowest allowed periapsis radius
+    iterations : int, optional
+        The number of bisection steps, by default 50
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray]
+        The impulses and periapsis radii, each of shape (...)
+    '''
+    speed_in = np.linalg.norm(v_inf_in, axis=-1)
+    speed_out = np.linalg.norm(v_inf_out, axis=-1)
+
+    cos_turn = np.sum(v_inf_in * v_inf_out, axis=-1) / (speed_in * speed_out)
+    turn = np.arccos(np.clip(cos_turn, -1, 1))
+
+    def achievable_turn(periapsis):
+        return np.arcsin(1 / (1 + periapsis * speed_in**2 / mu)) + \
+            np.arcsin(1 / (1 + periapsis * speed_out**2 / mu))
+
+    maximum_turn = achievable_turn(minimum_periapsis)
+
+    # The turn decreases with the periapsis, so bisect on its logarithm
+    lower = np.full_like(turn, np.log(minimum_periapsis))
+    upper = lower + np.log(1e6)
+    for _ in range(iterations):
+        middle = (lower + upper) / 2
+        too_close = achievable_turn(np.exp(middle)) > turn
+        lower = np.where(too_close, middle, lower)
+        upper = np.where(too_close, upper, middle)
+
+    periapsis = np.where(turn > maximum_turn, minimum_periapsis, np.exp((lower + upper) / 2))
+
+    dv = np.abs(np.sqrt(speed_out**2 + 2 * mu / periapsis) -
+                np.sqrt(speed_in**2 + 2 * mu / periapsis))
+    dv += np.where(turn > maximum_turn,
+                   2 * speed_out * np.sin(np.maximum(turn - maximum_turn, 0) / 2), 0)
+
+    return dv, periapsis
+
+
+class MGAProblem:
+    '''
+    The epochs of a multiple gravity assist trajectory through a sequence of
+    bodies, posed for a global optimizer.
+
+    Instances are callable on decision vectors of shape (D,) or on whole
+    populations of shape (D, S), and can be pickled to worker processes.
+    '''
+
+    def __init__(self, sequence: "list[CelestialBody]",
+                 departure_window: "tuple[np.datetime64, np.datetime64]",
+                 time_of_flight_bounds: "list[tuple[float, float]]",
+                 departure_altitude: float = None, arrival_altitude: float = None,
+                 departure_v_inf: float = 0.0,
+                 minimum_flyby_altitude: float = 200e3) -> None:
+        '''
+        :param sequence: The bodies visited, including the departure and arrival bodies
+        :param departure_window: The earliest and latest departure dates
+        :param time_of_flight_bounds: The shortest and longest time of flight
+            of each leg, in days
+        :param departure_altitude: Altitude in m of a circular parking orbit
+            to depart from, or None to count the excess speed
+        :param arrival_altitude: Altitude in m of a circular orbit to be
+            captured into, or None to count the excess speed
+        :param departure_v_inf: Excess speed in m/s provided by the launcher,
+            which is not counted in the cost
+        :param minimum_flyby_altitude: The lowest allowed flyby altitude in m
+        '''
+        if len(time_of_flight_bounds) != len(sequence) - 1:
+            raise ValueError(
+                f"Expected {len(sequence) - 1} time of flight bounds, got {len(time_of_flight_bounds)}")
+
+        self.sequence = sequence
+        self.departure_window = tuple(datetime64_to_jd(t) for t in departure_window)
+        self.time_of_flight_bounds = [tuple(bounds) for bounds in time_of_flight_bounds]
+        self.departure_altitude = departure_altitude
+        self.arrival_altitude = arrival_altitude
+        self.departure_v_inf = departure_v_inf
+        self.minimum_flyby_altitude = minimum_flyby_altitude
+
+        self._interpolants: dict = None
+
+    def __repr__(self):
+        return f"MGAProblem({'-'.join(body.name for body in self.sequence)})"
+
+    def __getstate__(self):
+        # Workers rebuild the interpolants rather than receive them
+        state = self.__dict__.copy()
+        state["_interpolants"] = None
+        return state
+
+    @property
+    def bounds(self) -> "list[tuple[float, float]]":
+        '''
+        The bounds of the decision vector [t0, T1, ..., Tn].
+        '''
+        return [self.departure_window] + self.time_of_flight_bounds
+
+    def epochs(self, x: np.ndarray) -> np.ndarray:
+        '''
+        Returns the Julian dates of the encounters, shape (n_bodies, ...).
+        '''
+        return np.cumsum(np.asarray(x, dtype=np.float64), axis=0)
+
+    def heliocentric_states(self, body: CelestialBody, jd: np.ndarray) -> np.ndarray:
+        '''
+        Returns the heliocentric states of a body of the sequence at several
+        Julian dates, shape (len(jd), 6).
+        '''
+        if self._interpolants is None:
+            start = self.departure_window[0]
+            end = self.departure_window[1] + sum(upper for _, upper in self.time_of_flight_bounds)
+            self._interpolants = {
+                ephemeris_id: ephemeris_source(ephemeris_id, start, end)
+                for ephemeris_id in {body.ephemeris_id for body in self.sequence} | {10}
+            }
+
+        return self._interpolants[body.ephemeris_id].states(jd) - \
+            self._interpolants[10].states(jd)
+
+    def legs(self, x: np.ndarray) -> dict:
+        '''
+        Computes the patched conic trajectory of decision vectors.
+
+        Parameters
+        ----------
+        x : np.ndarray
+            The decision vectors, of shape (D,) or (D, S)
+
+        Returns
+        -------
+        dict
+            Arrays with a trailing population axis when x has one:
+            - epochs: the Julian dates of the encounters, shape (n_bodies,)
+            - states: the heliocentric states of the bodies, shape (n_bodies, 6)
+            - v_departure, v_arrival: the heliocentric velocities at the
+              ends of each leg, shape (n_legs, 3)
+            - flyby_dv, flyby_periapsis: the impulses and periapsis radii of
+              the flybys, shape (n_bodies - 2,)
+            - departure_dv, arrival_dv: the impulses at the ends
+            - total_dv: the cost
+        '''
+        x = np.asarray(x, dtype=np.float64)
+        population = x.reshape(len(x), -1)
+        epochs = self.epochs(population)
+
+        states = np.stack([self.heliocentric_states(body, jd)
+                           for body, jd in zip(self.sequence, epochs)])
+
+        v_departure, v_arrival = lambert(states[:-1, :, :3], states[1:, :, :3],
+                                         np.diff(epochs, axis=0) * 86400,
+                                         CelestialBody.sun().mu)
+
+        flyby_dv = np.empty((len(self.sequence) - 2, population.shape[1]))
+        flyby_periapsis = np.empty_like(flyby_dv)
+        for k, body in enumerate(self.sequence[1:-1]):
+            flyby_dv[k], flyby_periapsis[k] = powered_flyby_dv(
+                v_arrival[k] - states[k + 1, :, 3:], v_departure[k + 1] - states[k + 1, :, 3:],
+                body.mu, body.radius + self.minimum_flyby_altitude)
+
+        departure = self.sequence[0]
+        v_inf_departure = np.linalg.norm(v_departure[0] - states[0, :, 3:], axis=-1)
+        v_inf_departure = np.maximum(v_inf_departure - self.departure_v_inf, 0)
+        departure_dv = v_inf_departure if self.departure_altitude is None else hyperbolic_impulse(
+            v_inf_departure, departure.mu, departure.radius + self.departure_altitude)
+
+        arrival = self.sequence[-1]
+        v_inf_arrival = np.linalg.norm(v_arrival[-1] - states[-1, :, 3:], axis=-1)
+        arrival_dv = v_inf_arrival if self.arrival_altitude is None else hyperbolic_impulse(
+            v_inf_arrival, arrival.mu, arrival.radius + self.arrival_altitude)
+
+        total_dv = departure_dv + flyby_dv.sum(axis=0) + arrival_dv
+        total_dv = np.where(np.isnan(total_dv), INFEASIBLE_COST, total_dv)
+
+        legs = {
+            "epochs": epochs,
+            "states": states,
+            "v_departure": v_departure,
+            "v_arrival": v_arrival,
+            "flyby_dv": flyby_dv,
+            "flyby_periapsis": flyby_periapsis,
+            "departure_dv": departure_dv,
+            "arrival_dv": arrival_dv,
+            "total_dv": total_dv,
+        }
+
+        if x.ndim == 1:
+            return {key: value[..., 0, :] if key in ("states", "v_departure", "v_arrival")
+                    else value[..., 0] for key, value in legs.items()}
+        return legs
+
+    def __call__(self, x: np.ndarray) -> np.ndarray:
+        '''
+        Returns the total impulse in m/s of decision vectors of shape (D,)
+        or (D, S).
+        '''
+        total_dv = self.legs(x)["total_dv"]
+        return float(total_dv) if np.ndim(x) == 1 else total_dv
+
+
+def optimize_sequence(problem: MGAProblem, population_size: int = 20,
+                      max_iterations: int = 1000, workers: int = 1,
+                      seed: int = None, **kwargs) -> OptimizeResult:
+    '''
+    Searches the epochs of an MGA trajectory with differential evolution.
+
+    With workers=1 each generation is evaluated as a single vectorized call;
+    otherwise candidates are spread over a pool of worker processes.
+
+    Parameters
+    ----------
+    problem : MGAProblem
+        The trajectory to optimize.
+    population_size : int, optional
+        The population size per decision variable, by default 20
+    max_iterations : int, optional
+        The maximum number of generations, by default 1000
+    workers : int, optional
+        The number of processes evaluating candidates, by default 1;
+        -1 uses all CPUs.
+    seed : int, optional
+        Seed for a reproducible search.
+    **kwargs
+        Passed to scipy.optimize.differential_evolution.
+
+    Returns
+    -------
+    OptimizeResult
+        The result of differential evolution; x is the best decision vector
+        and fun its total impulse in m/s.
+    '''
+    if workers == 1:
+        kwargs.update(vectorized=True, updating="deferred")
+    else:
+        kwargs.update(workers=workers, updating="deferred")
+
+    return differential_evolution(problem, problem.bounds, popsize=population_size,
+                                  maxiter=max_iterations, seed=seed, **kwargs)
+
+
+class RefinedLeg:
+    '''
+    A leg of an MGA trajectory propagated in the full N-body model.
+    '''
+
+    def __init__(self, departure_body: CelestialBody, arrival_body: CelestialBody,
+                 spacecraft: Spacecraft, solution, correction: np.ndarray,
+                 miss_distance: float) -> None:
+        '''
+        :param departure_body: The body the leg starts from
+        :param arrival_body: The body the leg is aimed at
+        :param spacecraft: The spacecraft at the start of the leg, with the
+            corrected departure velocity
+        :param solution: The result of simulate for the leg
+        :param correction: The change of the patched conic departure velocity in m/s
+        :param miss_distance: The distance from the arrival body at the
+            arrival epoch in m
+        '''
+        self.departure_body = departure_body
+        self.arrival_body = arrival_body
+        self.spacecraft = spacecraft
+        self.solution = solution
+        self.correction = correction
+        self.miss_distance = miss_distance
+
+    def __repr__(self):
+        return (f"RefinedLeg({self.departure_body} -> {self.arrival_body}, "
+                f"correction={np.linalg.norm(self.correction):.3f} m/s, "
+                f"miss={self.miss_distance / 1e3:.1f} km)")
+
+
+def refine_with_simulation(problem: MGAProblem, x: np.ndarray, max_iterations: int = 5,
+                           tolerance: float = 1e3, show_progress: bool = False) -> "list[RefinedLeg]":
+    '''
+    Propagates each leg of a patched conic solution with simulate() and
+    corrects its departure velocity by Newton iterations so that the
+    spacecraft reaches the arrival body at the arrival epoch.
+
+    The gravity of the departure and arrival bodies of a leg is left to the
+    flyby model, so each leg is propagated under the remaining bodies of
+    RelationalTree.solar_system().
+
+    Parameters
+    ----------
+    problem : MGAProblem
+        The trajectory.
+    x : np.ndarray
+        A decision vector, e.g. the result of optimize_sequence.
+    max_iterations : int, optional
+        The maximum number of corrections per leg, by default 5
+    tolerance : float, optional
+        The miss distance in m below which a leg is accepted, by default 1e3
+    show_progress : bool, optional
+        Whether to display the progress of each propagation, by default False
+
+    Returns
+    -------
+    list[RefinedLeg]
+        The refined legs.
+    '''
+    legs = problem.legs(x)
+    epochs = legs["epochs"]
+    solar_system = RelationalTree.solar_system().all_bodies
+    sun = CelestialBody.sun()
+
+    def propagate(spacecraft, arrival_jd, arrival_body):
+        solution = simulate(spacecraft, jd_to_datetime64(arrival_jd), show_progress)
+        return solution, solution.y[:3, -1] - arrival_body.get_position(arrival_jd)
+
+    refined = []
+    for k in range(len(problem.sequence) - 1):
+        departure_body, arrival_body = problem.sequence[k], problem.sequence[k + 1]
+        ids = {departure_body.ephemeris_id, arrival_body.ephemeris_id}
+        bodies = [body for body in solar_system if body.ephemeris_id not in ids]
+
+        # The Lambert arc is heliocentric, the simulation barycentric
+        arrival_body.construct_interpolant(epochs[k], epochs[k + 1])
+        sun_state = sun.ephemeris_source(epochs[k], epochs[k]).state(epochs[k])
+        initial_state = np.concatenate((legs["states"][k, :3], legs["v_departure"][k])) + sun_state
+
+        def spacecraft_with(velocity_change):
+            spacecraft = Spacecraft(initial_state + np.concatenate((np.zeros(3), velocity_change)),
+                                    epochs[k])
+            spacecraft.add_interacting_bodies(*bodies)
+            return spacecraft
+
+        correction = np.zeros(3)
+        solution, miss = propagate(spacecraft_with(correction), epochs[k + 1], arrival_body)
+
+        for _ in range(max_iterations):
+            if np.linalg.norm(miss) < tolerance:
+                break
+
+            # Finite difference sensitivity of the arrival position to the
+            # departure velocity
+            step = 1e-3
+            jacobian = np.empty((3, 3))
+            for axis in range(3):
+                perturbation = correction.copy()
+                perturbation[axis] += step
+                _, perturbed_miss = propagate(spacecraft_with(perturbation), epochs[k + 1],
+                                              arrival_body)
+                jacobian[:, axis] = (perturbed_miss - miss) / step
+
+            correction = correction - np.linalg.solve(jacobian, miss)
+            solution, miss = propagate(spacecraft_with(correction), epochs[k + 1], arrival_body)
+
+        refined.append(RefinedLeg(departure_body, arrival_body, spacecraft_with(correction),
+                                  solution, correction, np.linalg.norm(miss)))
+
+    return refined
+
+
+if __name__ == "__main__":
+    problem = MGAProblem(
+        [CelestialBody.earth(), CelestialBody.venus(), CelestialBody.earth(), CelestialBody.jupiter()],
+        (np.datetime64("2026-01-01"), np.datetime64("2030-01-01")),
+        [(80, 400), (100, 700), (400, 2000)])
+
+    result = optimize_sequence(problem, seed=0)
+    legs = problem.legs(result.x)
+
+    print(f"{problem}: {result.fun:.1f} m/s after {result.nit} generations")
+    for body, jd in zip(problem.sequence, legs["epochs"]):
+        print(f"  {body.name:8s} {jd_to_datetime64(jd)}")
+    print(f"  departure {legs['departure_dv']:.1f} m/s, flybys {legs['flyby_dv']} m/s, "
+          f"arrival {legs['arrival_dv']:.1f} m/s")
+
+    for leg in refine_with_simulation(problem, result.x):
+        print(f"  {leg}")
@@ -0,0 +1,172 @@
+from functools import lru_cache
+
+import numpy as np
+
+from flyby.orbit_models.lambert import lambert
+from flyby.solar_system_model.celestial_body import CelestialBody, ephemeris_source
+from flyby.time_model.julian_day import datetime64_to_jd
+
+SUN_EPHEMERIS_ID = 10
+
+
+@lru_cache(maxsize=64)
+def heliocentric_state_grid(ephemeris_id: int, start_jd: float, end_jd: float,
+                            n: int) -> np.ndarray:
+    '''
+    Returns the heliocentric states of a body at n evenly spaced Julian dates
+    from start_jd to end_jd, as a read-only array of shape (n, 6) in
+    [m, m, m, m/s, m/s, m/s].
+
+    Results are kept in an LRU cache keyed by body and date range, so
+    repeated porkchop queries over the same window skip the ephemeris.
+    '''
+    jd = np.linspace(start_jd, end_jd, n)
+
+    states = ephemeris_source(ephemeris_id, start_jd, end_jd).states(jd) - \
+        ephemeris_source(SUN_EPHEMERIS_ID, start_jd, end_jd).states(jd)
+
+    states.flags.writeable = False
+    return states
+
+
+class PorkchopGrid:
+    '''
+    Transfer costs over a grid of departure and arrival dates.
+
+    Arrays of costs have shape (n_departure, n_arrival) and are NaN where
+    there is no transfer (arrival before departure, or no Lambert solution).
+    '''
+
+    def __init__(self, departure_body: CelestialBody, arrival_body: CelestialBody,
+                 departure_jd: np.ndarray, arrival_jd: np.ndarray,
+                 v_inf_departure: np.ndarray, v_inf_arrival: np.ndarray,
+                 departure_dv: np.ndarray, arrival_dv: np.ndarray) -> None:
+        '''
+        :param departure_body: The body departed from
+        :param arrival_body: The body arrived at
+        :param departure_jd: The departure Julian dates, shape (n_departure,)
+        :param arrival_jd: The arrival Julian dates, shape (n_arrival,)
+        :param v_inf_departure: Hyperbolic excess speed at departure in m/s
+        :param v_inf_arrival: Hyperbolic excess speed at arrival in m/s
+        :param departure_dv: Impulse needed to depart in m/s
+        :param arrival_dv: Impulse needed to be captured at arrival in m/s
+        '''
+        self.departure_body = departure_body
+        self.arrival_body = arrival_body
+        self.departure_jd = departure_jd
+        self.arrival_jd = arrival_jd
+        self.v_inf_departure = v_inf_departure
+        self.v_inf_arrival = v_inf_arrival
+        self.departure_dv = departure_dv
+        self.arrival_dv = arrival_dv
+
+    def __repr__(self):
+        return (f"PorkchopGrid({self.departure_body} -> {self.arrival_body}, "
+                f"{len(self.departure_jd)} x {len(self.arrival_jd)})")
+
+    @property
+    def c3(self) -> np.ndarray:
+        '''
+        Characteristic energy at departure in m^2/s^2.
+        '''
+        return self.v_inf_departure**2
+
+    @property
+    def total_dv(self) -> np.ndarray:
+        '''
+        Sum of the departure and arrival impulses in m/s.
+        '''
+        return self.departure_dv + self.arrival_dv
+
+    @property
+    def time_of_flight(self) -> np.ndarray:
+        '''
+        Time of flight in days.
+        '''
+        return self.arrival_jd[np.newaxis, :] - self.departure_jd[:, np.newaxis]
+
+    def optimum(self, quantity: str = "total_dv") -> "tuple[float, float, float]":
+        '''
+        Returns (departure_jd, arrival_jd, value) of the cheapest transfer by
+        the given quantity [c3, v_inf_departure, v_inf_arrival, total_dv].
+        '''
+        values = getattr(self, quantity)
+        i, j = np.unravel_index(np.nanargmin(values), values.shape)
+        return self.departure_jd[i], self.arrival_jd[j], values[i, j]
+
+
+def hyperbolic_impulse(v_inf: np.ndarray, mu: float, periapsis_radius: float) -> np.ndarray:
+    '''
+    Returns the impulse to go between a circular orbit of the given radius
+    and a hyperbola with excess speed v_inf, applied at periapsis.
+    '''
+    return np.sqrt(v_inf**2 + 2 * mu / periapsis_radius) - np.sqrt(mu / periapsis_radius)
+
+
+def porkchop(departure_body: CelestialBody, arrival_body: CelestialBody,
+             departure_window: "tuple[np.datetime64, np.datetime64]",
+             arrival_window: "tuple[np.datetime64, np.datetime64]",
+             n_departure: int = 200, n_arrival: int = 200,
+             departure_altitude: float = None, arrival_altitude: float = None,
+             prograde: bool = True) -> PorkchopGrid:
+    '''
+    Computes a porkchop grid of transfer costs between two bodies.
+
+    The ephemeris is evaluated once along each axis (and reused between
+    calls through heliocentric_state_grid), then every cell is sized with the
+    batched Lambert solver.
+
+    Parameters
+    ----------
+    departure_body : CelestialBody
+        The body departed from.
+    arrival_body : CelestialBody
+        The body arrived at.
+    departure_window : tuple[np.datetime64, np.datetime64]
+        The first and last departure dates.
+    arrival_window : tuple[np.datetime64, np.datetime64]
+        The first and last arrival dates.
+    n_departure : int, optional
+        The number of departure dates, by default 200
+    n_arrival : int, optional
+        The number of arrival dates, by default 200
+    departure_altitude : float, optional
+        Altitude in m of a circular parking orbit to depart from. If None,
+        the departure impulse is the hyperbolic excess speed.
+    arrival_altitude : float, optional
+        Altitude in m of a circular orbit to be captured into. If None, the
+        arrival impulse is the hyperbolic excess speed.
+    prograde : bool, optional
+        Whether the transfers are prograde, by default True
+
+    Returns
+    -------
+    PorkchopGrid
+        The transfer costs.
+    '''
+    departure_start, departure_end = (datetime64_to_jd(t) for t in departure_window)
+    arrival_start, arrival_end = (datetime64_to_jd(t) for t in arrival_window)
+
+    departure_jd = np.linspace(departure_start, departure_end, n_departure)
+    arrival_jd = np.linspace(arrival_start, arrival_end, n_arrival)
+
+    departure_state = heliocentric_state_grid(
+        departure_body.ephemeris_id, departure_start, departure_end, n_departure)
+    arrival_state = heliocentric_state_grid(
+        arrival_body.ephemeris_id, arrival_start, arrival_end, n_arrival)
+
+    tof = (arrival_jd[np.newaxis, :] - departure_jd[:, np.newaxis]) * 86400
+
+    v1, v2 = lambert(departure_state[:, np.newaxis, :3], arrival_state[np.newaxis, :, :3],
+                     tof, CelestialBody.sun().mu, prograde)
+
+    v_inf_departure = np.linalg.norm(v1 - departure_state[:, np.newaxis, 3:], axis=-1)
+    v_inf_arrival = np.linalg.norm(v2 - arrival_state[np.newaxis, :, 3:], axis=-1)
+
+    departure_dv = v_inf_departure if departure_altitude is None else hyperbolic_impulse(
+        v_inf_departure, departure_body.mu, departure_body.radius + departure_altitude)
+    arrival_dv = v_inf_arrival if arrival_altitude is None else hyperbolic_impulse(
+        v_inf_arrival, arrival_body.mu, arrival_body.radius + arrival_altitude)
+
+    return PorkchopGrid(departure_body, arrival_body, departure_jd, arrival_jd,
+                        v_inf_departure, v_inf_arrival, departure_dv, arrival_dv)
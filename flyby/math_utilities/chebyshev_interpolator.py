@@ -0,0 +1,209 @@
+from numba import njit
+import numpy as np
+
+
+@njit
+def locate_record(jd_start: float, jd_step: float, n_records: int, jd_eval: float):
+    '''
+    Return the index of the record covering the specified julian date and the
+    normalized time within that record, in [-1, 1].
+
+    Times outside of the table are clamped to its ends.
+
+    Parameters
+    ----------
+    jd_start : float
+        The julian date at which the first record starts
+    jd_step : float
+        The length of each record in days
+    n_records : int
+        The number of records in the table
+    jd_eval : float
+        The julian date at which to evaluate the table
+    '''
+    x = (jd_eval - jd_start) / jd_step
+
+    if x <= 0.0:
+        return 0, -1.0
+
+    if x >= n_records:
+        return n_records - 1, 1.0
+
+    i = int(x)
+    return i, 2.0 * (x - i) - 1.0
+
+
+@njit
+def chebyshev_numba(coefficients: np.ndarray, jd_start: float, jd_step: float,
+                    jd_eval: float) -> np.ndarray:
+    '''
+    Evaluate a piecewise Chebyshev series and its time derivative at the
+    specified julian date in a single pass of the recurrence.
+
+    Parameters
+    ----------
+    coefficients : np.ndarray
+        The Chebyshev coefficients, of shape (n_records, 3, n_coefficients)
+    jd_start : float
+        The julian date at which the first record starts
+    jd_step : float
+        The length of each record in days
+    jd_eval : float
+        The julian date at which to evaluate the series
+
+    Returns
+    -------
+    np.ndarray
+        The value and its derivative with respect to time in seconds, as
+        [x y z dx dy dz]
+    '''
+    n_records, n_components, n_coefficients = coefficients.shape
+    i, s = locate_record(jd_start, jd_step, n_records, jd_eval)
+
+    state = np.zeros(2 * n_components)
+
+    # T_k(s) and dT_k/ds by forward recurrence
+    t_prev, t = 1.0, s
+    dt_prev, dt = 0.0, 1.0
+
+    for c in range(n_components):
+        state[c] = coefficients[i, c, 0]
+
+    for k in range(1, n_coefficients):
+        if k > 1:
+            t_prev, t = t, 2.0 * s * t - t_prev
+            dt_prev, dt = dt, 2.0 * t_prev + 2.0 * s * dt - dt_prev
+
+        for c in range(n_components):
+            state[c] += coefficients[i, c, k] * t
+            state[n_components + c] += coefficients[i, c, k] * dt
+
+    # ds/dt over one record of jd_step days
+    rate = 2.0 / (jd_step * 86400)
+    for c in range(n_components):
+        state[n_components + c] *= rate
+
+    return state
+
+
+@njit
+def chebyshev_many_numba(coefficients: np.ndarray, jd_start: float, jd_step: float,
+                         jd_eval: np.ndarray) -> np.ndarray:
+    '''
+    Evaluate a piecewise Chebyshev series and its time derivative at several
+    julian dates, see chebyshev_numba.
+
+    Returns
+    -------
+    np.ndarray
+        The values and derivatives, of shape (len(jd_eval), 6)
+    '''
+    states = np.empty((jd_eval.shape[0], 2 * coefficients.shape[1]))
+    for j in range(jd_eval.shape[0]):
+        states[j] = chebyshev_numba(coefficients, jd_start, jd_step, jd_eval[j])
+    return states
+
+
+def record_span(jd_start: float, jd_step: float, n_records: int,
+                start_time: float, end_time: float) -> "tuple[int, int]":
+    '''
+    Returns the indices of the first and last records of a uniform table
+    covering a time span, clipped to the table.
+    '''
+    first = int(np.clip(np.floor((start_time - jd_start) / jd_step), 0, n_records - 1))
+    last = int(np.clip(np.floor((end_time - jd_start) / jd_step), first, n_records - 1))
+    return first, last
+
+
+class ChebyshevInterpolant:
+    '''
+    Piecewise Chebyshev series over uniform records, as stored in JPL SPK
+    (type 2) ephemeris segments.
+
+    Position and velocity are obtained from a single evaluation of the series.
+    '''
+
+    def __init__(self, jd_start: float, jd_step: float, coefficients: np.ndarray,
+                 derivative: bool = False):
+        '''
+        :param jd_start: The julian date at which the first record starts
+        :param jd_step: The length of each record in days
+        :param coefficients: The coefficients, of shape (n_records, 3, n_coefficients)
+        :param derivative: Whether calling the interpolant returns the time derivative
+        '''
+        self.jd_start = jd_start
+        self.jd_step = jd_step
+        self.coefficients = np.ascontiguousarray(coefficients)
+        self.derivative = derivative
+
+    def __call__(self, jd_eval: float):
+        state = self.state(jd_eval) if np.ndim(jd_eval) == 0 else self.states(jd_eval)
+        return state[..., 3:] if self.derivative else state[..., :3]
+
+    def state(self, jd_eval: float) -> np.ndarray:
+        '''
+        Returns the value and its derivative per second at the specified julian date.
+        '''
+        return chebyshev_numba(self.coefficients, self.jd_start, self.jd_step, jd_eval)
+
+    def states(self, jd_eval: np.ndarray) -> np.ndarray:
+        '''
+        Returns the values and derivatives per second at several julian
+        dates, as an array of shape (len(jd_eval), 6).
+        '''
+        return chebyshev_many_numba(self.coefficients, self.jd_start, self.jd_step,
+                                    np.ascontiguousarray(jd_eval, dtype=np.float64))
+
+    @property
+    def end_time(self) -> float:
+        '''
+        The julian date at which the last record ends.
+        '''
+        return self.jd_start + self.jd_step * len(self.coefficients)
+
+    def span(self, start_time: float, end_time: float) -> "ChebyshevInterpolant":
+        '''
+        Returns an interpolant sharing the records which cover a time span.
+        '''
+        first, last = record_span(self.jd_start, self.jd_step, len(self.coefficients),
+                                  start_time, end_time)
+        return ChebyshevInterpolant(self.jd_start + first * self.jd_step, self.jd_step,
+                                    self.coefficients[first:last + 1], self.derivative)
+
+    def differentiate(self) -> "ChebyshevInterpolant":
+        '''
+        Returns an interpolant for the time derivative sharing the same coefficients.
+        '''
+        return ChebyshevInterpolant(self.jd_start, self.jd_step, self.coefficients, True)
+
+    def chebyshev_table(self) -> tuple:
+        '''
+        Returns (jd_start, jd_step, coefficients) describing this interpolant.
+        '''
+        return self.jd_start, self.jd_step, self.coefficients
+
+    @classmethod
+    def from_segment(cls, segment, start_time: float, end_time: float,
+                     scale: float = 1.0) -> "ChebyshevInterpolant":
+        '''
+        Extracts the records of a jplephem SPK segment covering a time span.
+
+        Parameters
+        ----------
+        segment : jplephem.spk.Segment
+            A type 2 segment, e.g. de440[0, 3]
+        start_time : float
+            The start of the span in Julian days
+        end_time : float
+            The end of the span in Julian days
+        scale : float, optional
+            Factor applied to the coefficients, e.g. 1e3 for km to m
+        '''
+        initial_epoch, interval_length, coefficients = segment.load_array()
+        first, last = record_span(initial_epoch, interval_length, coefficients.shape[1],
+                                  start_time, end_time)
+
+        # (3, n, n_coefficients) -> (n, 3, n_coefficients)
+        records = np.transpose(coefficients[:, first:last + 1], (1, 0, 2)) * scale
+
+        return cls(initial_epoch + first * interval_length, interval_length, records)
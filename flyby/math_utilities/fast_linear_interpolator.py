@@ -2,6 +2,15 @@ from numba import njit
 import numpy as np
 
 
+# Policies for evaluation times outside of the nodes
+CLAMP = 0
+EXTRAPOLATE = 1
+NAN = 2
+RAISE = 3
+
+OUT_OF_RANGE_POLICIES = {"clamp": CLAMP, "extrapolate": EXTRAPOLATE, "nan": NAN, "raise": RAISE}
+
+
 @njit
 def lerp_numba(arr: np.ndarray, jd: np.ndarray, jd_eval: float) -> np.ndarray:
     '''
@@ -36,14 +45,122 @@ def lerp_numba(arr: np.ndarray, jd: np.ndarray, jd_eval: float) -> np.ndarray:
     return arr[i - 1] + (arr[i] - arr[i - 1]) * (jd_eval - jd[i - 1]) / (jd[i] - jd[i - 1])
 
 
+@njit
+def lerp_many_numba(arr: np.ndarray, jd: np.ndarray, jd_eval: np.ndarray,
+                    out_of_range: int) -> np.ndarray:
+    '''
+    Return the linear interpolation of the array at several julian dates
+
+    The interval of the previous evaluation is kept as a cursor and checked
+    first, then its successor, before falling back to a binary search, so
+    sorted evaluation times cost O(1) each.
+
+    Parameters
+    ----------
+    arr : np.ndarray
+        The array to interpolate, of shape (n, m)
+    jd : np.ndarray
+        The increasing julian dates corresponding to the values in arr
+    jd_eval : np.ndarray
+        The julian dates at which to evaluate the interpolation, of shape (N,)
+    out_of_range : int
+        What to do with julian dates outside of jd: CLAMP to the end values,
+        EXTRAPOLATE the end intervals, return NAN or RAISE a ValueError
+
+    Returns
+    -------
+    np.ndarray
+        The interpolated array, of shape (N, m)
+    '''
+    n, m = arr.shape
+    result = np.empty((jd_eval.shape[0], m))
+    cursor = 0
+
+    for k in range(jd_eval.shape[0]):
+        t = jd_eval[k]
+
+        if not jd[0] <= t <= jd[n - 1]:
+            if out_of_range == RAISE:
+                raise ValueError("Evaluation time outside of the interpolant")
+            if out_of_range == NAN or np.isnan(t):
+                result[k] = np.nan
+                continue
+            if out_of_range == CLAMP:
+                result[k] = arr[0] if t < jd[0] else arr[n - 1]
+                continue
+
+        # Interval [jd[cursor], jd[cursor + 1]] containing t
+        if n == 1:
+            result[k] = arr[0]
+            continue
+        if not jd[cursor] <= t < jd[cursor + 1]:
+            if cursor + 2 < n and jd[cursor + 1] <= t < jd[cursor + 2]:
+                cursor += 1
+            else:
+                cursor = min(max(np.searchsorted(jd, t, side="right") - 1, 0), n - 2)
+
+        dt = t - jd[cursor]
+        step = jd[cursor + 1] - jd[cursor]
+        for c in range(m):
+            result[k, c] = arr[cursor, c] + (arr[cursor + 1, c] - arr[cursor, c]) * dt / step
+
+    return result
+
+
 class FastLerp:
     '''
-    Limitation: can only evaluate at a single time
+    Linear interpolation between nodes, at one time or at an array of times.
+
+    Times outside of the nodes are handled according to out_of_range:
+    - clamp: the value at the nearest end
+    - extrapolate: the line through the end interval
+    - nan: NaN
+    - raise: a ValueError
     '''
 
-    def __init__(self, jd: np.ndarray, arr: np.ndarray):
-        self.arr = arr.T
-        self.jd = jd
+    def __init__(self, jd: np.ndarray, arr: np.ndarray, out_of_range: str = "clamp"):
+        if out_of_range not in OUT_OF_RANGE_POLICIES:
+            raise ValueError(f"Unknown out of range policy: {out_of_range}")
+
+        self.arr = np.ascontiguousarray(arr.T, dtype=np.float64)
+        self.jd = np.ascontiguousarray(jd, dtype=np.float64)
+        self.out_of_range = out_of_range
+
+    def __call__(self, jd_eval: np.ndarray) -> np.ndarray:
+        '''
+        Returns the values at a julian date, of shape (3,), or at an array of
+        julian dates, of shape (N, 3).
+        '''
+        policy = OUT_OF_RANGE_POLICIES[self.out_of_range]
+
+        if np.ndim(jd_eval) == 0:
+            if policy == CLAMP:
+                return lerp_numba(self.arr, self.jd, jd_eval)
+            return lerp_many_numba(self.arr, self.jd, np.array([jd_eval], dtype=np.float64),
+                                   policy)[0]
+
+        jd_eval = np.asarray(jd_eval, dtype=np.float64)
+        values = lerp_many_numba(self.arr, self.jd, np.ascontiguousarray(jd_eval.reshape(-1)),
+                                 policy)
+        return values.reshape(jd_eval.shape + (self.arr.shape[1],))
+
+    def chebyshev_table(self) -> tuple:
+        '''
+        Returns the interpolant as degree 1 Chebyshev records,
+        (jd_start, jd_step, coefficients), see ChebyshevInterpolant.
+
+        Only interpolants sampled on a uniform grid can be converted.
+        '''
+        if len(self.jd) < 2:
+            raise ValueError("Interpolant needs at least two nodes")
+
+        step = (self.jd[-1] - self.jd[0]) / (len(self.jd) - 1)
+        if not np.allclose(np.diff(self.jd), step, rtol=1e-6, atol=0):
+            raise ValueError("Interpolant is not sampled on a uniform grid")
+
+        # On each interval, a + (b - a) * f == (a + b) / 2 + (b - a) / 2 * s
+        coefficients = np.empty((len(self.jd) - 1, self.arr.shape[1], 2))
+        coefficients[:, :, 0] = (self.arr[1:] + self.arr[:-1]) / 2
+        coefficients[:, :, 1] = (self.arr[1:] - self.arr[:-1]) / 2
 
-    def __call__(self, jd_eval: float):
-        return lerp_numba(self.arr, self.jd, jd_eval)
+        return self.jd[0], step, coefficients
@@ -0,0 +1,97 @@
+'''
+Piecewise cubic Hermite interpolation of positions and velocities on a
+uniform grid, with the node spacing chosen from a bound on the error.
+
+A cubic Hermite segment is a degree 3 polynomial, so the interpolant is
+stored as degree 3 Chebyshev records and evaluated by ChebyshevInterpolant
+and n_body_rates like the DE440 records themselves.
+'''
+import numpy as np
+
+from flyby.math_utilities.chebyshev_interpolator import ChebyshevInterpolant
+
+
+def hermite_interpolant(jd_start: float, jd_step: float, positions: np.ndarray,
+                        velocities: np.ndarray) -> ChebyshevInterpolant:
+    '''
+    Returns the piecewise cubic Hermite interpolant through positions and
+    velocities sampled on a uniform grid.
+
+    Parameters
+    ----------
+    jd_start : float
+        The julian date of the first node
+    jd_step : float
+        The spacing of the nodes in days
+    positions : np.ndarray
+        The positions at the nodes, of shape (n, 3)
+    velocities : np.ndarray
+        The time derivatives of the positions per second, of shape (n, 3)
+
+    Returns
+    -------
+    ChebyshevInterpolant
+        The interpolant, with n - 1 records of 4 coefficients
+    '''
+    if len(positions) < 2:
+        raise ValueError("Interpolant needs at least two nodes")
+
+    # Derivatives with respect to s in [-1, 1] over each record
+    derivatives = velocities * (jd_step * 86400 / 2)
+
+    # Matching p(-1), p(1), p'(-1) and p'(1) with c0 T0 + c1 T1 + c2 T2 + c3 T3
+    mean = (positions[1:] + positions[:-1]) / 2
+    half_difference = (positions[1:] - positions[:-1]) / 2
+    mean_derivative = (derivatives[1:] + derivatives[:-1]) / 2
+    half_derivative_difference = (derivatives[1:] - derivatives[:-1]) / 2
+
+    coefficients = np.empty((len(positions) - 1, positions.shape[1], 4))
+    coefficients[:, :, 2] = half_derivative_difference / 4
+    coefficients[:, :, 3] = (mean_derivative - half_difference) / 8
+    coefficients[:, :, 0] = mean - coefficients[:, :, 2]
+    coefficients[:, :, 1] = half_difference - coefficients[:, :, 3]
+
+    return ChebyshevInterpolant(jd_start, jd_step, coefficients)
+
+
+def hermite_node_spacing(source: ChebyshevInterpolant, start_time: float, end_time: float,
+                         tolerance: float, safety: float = 2.0) -> float:
+    '''
+    Returns the node spacing in days at which a cubic Hermite interpolant of
+    a source meets a position error bound over a time span.
+
+    The error of a cubic Hermite segment of length h is at most h^4 / 384
+    times the maximum fourth derivative. That is estimated by finite
+    differences of the source on a pilot grid at most a quarter of its
+    record length apart, so it follows the dynamics of each body as the
+    DE440 records do.
+
+    Parameters
+    ----------
+    source : ChebyshevInterpolant
+        The interpolant to resample, e.g. the DE440 records of a body
+    start_time : float
+        The start of the span in Julian days
+    end_time : float
+        The end of the span in Julian days
+    tolerance : float
+        The maximum position error, in the units of the source
+    safety : float, optional
+        Factor applied to the estimated fourth derivative, by default 2
+    '''
+    span = end_time - start_time
+    n = max(int(np.ceil(4 * span / source.jd_step)), 4) + 1
+    pilot_step = span / (n - 1)
+    if pilot_step <= 0:
+        return source.jd_step
+    t_jd = start_time + pilot_step * np.arange(n)
+
+    positions = source.states(t_jd)[:, :3]
+    fourth_difference = positions[4:] - 4 * positions[3:-1] + 6 * positions[2:-2] \
+        - 4 * positions[1:-3] + positions[:-4]
+    fourth_derivative = safety * np.linalg.norm(fourth_difference, axis=1).max() \
+        / (pilot_step * 86400)**4
+
+    if fourth_derivative == 0:
+        return span
+    return (384 * tolerance / fourth_derivative)**0.25 / 86400
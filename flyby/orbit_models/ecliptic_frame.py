@@ -1,17 +1,6 @@
 import numpy as np
-from scipy.spatial.transform import Rotation as R
 
-
-def obliquity_of_ecliptic(jd: np.ndarray) -> np.ndarray:
-    '''
-    Returns the obliquity of the ecliptic at the given Julian date.
-    '''
-    # See https://en.wikipedia.org/wiki/Obliquity_of_the_ecliptic
-    T = (jd - 2451545) / 36525
-
-    e = 23.43929111 - 46.8150*T/3600 - 0.00059*T**2/3600 + 0.001813*T**3/3600
-
-    return np.radians(e)
+from flyby.orbit_models.frames import obliquity_of_ecliptic, ecliptic_from_icrs
 
 
 def ecliptic_from_J2000(jd: np.ndarray) -> np.ndarray:
@@ -29,6 +18,4 @@ def ecliptic_from_J2000(jd: np.ndarray) -> np.ndarray:
     jd : float
         The Julian date at which to compute the rotation.
     '''
-    e = obliquity_of_ecliptic(jd)
-
-    return R.from_euler('x', -e, degrees=False).as_matrix()
+    return ecliptic_from_icrs(jd)
@@ -0,0 +1,159 @@
+'''
+Transformations between the reference frames used across flyby:
+- ICRS: axes aligned with J2000, as used by the ephemeris and simulations
+- ecliptic: the x axis towards the vernal equinox and the z axis normal to
+  the ecliptic of date, a rotation of the ICRS about x by the obliquity
+- body centred: either of the above with the origin at a celestial body
+
+Vectors are given as arrays of shape (..., 3), or states of shape (..., 6)
+of which the positions and velocities are both rotated, along with epochs
+broadcastable against them. Rotations are built in closed form for all
+epochs at once.
+'''
+from functools import lru_cache
+
+import numpy as np
+
+from flyby.solar_system_model.celestial_body import CelestialBody, ephemeris_source
+
+
+def obliquity_of_ecliptic(jd: np.ndarray) -> np.ndarray:
+    '''
+    Returns the obliquity of the ecliptic at the given Julian date.
+    '''
+    # See https://en.wikipedia.org/wiki/Obliquity_of_the_ecliptic
+    T = (jd - 2451545) / 36525
+
+    e = 23.43929111 - 46.8150*T/3600 - 0.00059*T**2/3600 + 0.001813*T**3/3600
+
+    return np.radians(e)
+
+
+@lru_cache(maxsize=4096)
+def _ecliptic_from_icrs_at(jd: float) -> np.ndarray:
+    # Memoized rotation at a single epoch, e.g. one animation frame
+    C = _ecliptic_from_icrs(np.float64(jd))
+    C.flags.writeable = False
+    return C
+
+
+def _ecliptic_from_icrs(jd: np.ndarray) -> np.ndarray:
+    e = obliquity_of_ecliptic(jd)
+    cos_e, sin_e = np.cos(e), np.sin(e)
+
+    C = np.zeros(np.shape(jd) + (3, 3))
+    C[..., 0, 0] = 1
+    C[..., 1, 1] = cos_e
+    C[..., 1, 2] = sin_e
+    C[..., 2, 1] = -sin_e
+    C[..., 2, 2] = cos_e
+    return C
+
+
+def ecliptic_from_icrs(jd: np.ndarray) -> np.ndarray:
+    '''
+    Returns the rotation matrices from the ICRS to the ecliptic frame.
+
+    Parameters
+    ----------
+    jd : np.ndarray
+        The Julian dates, a float or an array of shape (...)
+
+    Returns
+    -------
+    np.ndarray
+        The rotations, of shape (..., 3, 3). Those of single epochs are
+        memoized and read-only.
+    '''
+    if np.ndim(jd) == 0:
+        return _ecliptic_from_icrs_at(float(jd))
+    return _ecliptic_from_icrs(np.asarray(jd, dtype=np.float64))
+
+
+def icrs_from_ecliptic(jd: np.ndarray) -> np.ndarray:
+    '''
+    Returns the rotation matrices from the ecliptic frame to the ICRS, see
+    ecliptic_from_icrs.
+    '''
+    return np.swapaxes(ecliptic_from_icrs(jd), -1, -2)
+
+
+def rotate(C: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+    '''
+    Applies rotations of shape (..., 3, 3) to vectors of shape (..., 3), or
+    to both halves of states of shape (..., 6).
+    '''
+    vectors = np.asarray(vectors, dtype=np.float64)
+    if vectors.shape[-1] == 6:
+        halves = vectors.reshape(vectors.shape[:-1] + (2, 3))
+        return np.einsum('...ij,...j->...i', C[..., np.newaxis, :, :], halves).reshape(vectors.shape)
+
+    return np.einsum('...ij,...j->...i', C, vectors)
+
+
+def icrs_to_ecliptic(vectors: np.ndarray, jd: np.ndarray) -> np.ndarray:
+    '''
+    Rotates vectors or states from the ICRS to the ecliptic frame, each at
+    its own epoch.
+
+    Parameters
+    ----------
+    vectors : np.ndarray
+        Vectors of shape (..., 3) or states of shape (..., 6)
+    jd : np.ndarray
+        The Julian dates of the vectors, of shape (...)
+    '''
+    return rotate(ecliptic_from_icrs(jd), vectors)
+
+
+def ecliptic_to_icrs(vectors: np.ndarray, jd: np.ndarray) -> np.ndarray:
+    '''
+    Rotates vectors or states from the ecliptic frame to the ICRS, see
+    icrs_to_ecliptic.
+    '''
+    return rotate(icrs_from_ecliptic(jd), vectors)
+
+
+def body_state(body: CelestialBody, jd: np.ndarray) -> np.ndarray:
+    '''
+    Returns the ICRS states of a body at several epochs, of shape (..., 6),
+    relative to the solar system barycenter.
+    '''
+    jd = np.asarray(jd, dtype=np.float64)
+    times = jd.reshape(-1)
+    states = ephemeris_source(body.ephemeris_id, times.min(), times.max()).states(times)
+    return states.reshape(jd.shape + (6,))
+
+
+def icrs_to_body_centred(vectors: np.ndarray, jd: np.ndarray, body: CelestialBody,
+                         ecliptic: bool = False) -> np.ndarray:
+    '''
+    Expresses barycentric ICRS positions or states relative to a body, in
+    the ICRS or ecliptic frame.
+
+    Parameters
+    ----------
+    vectors : np.ndarray
+        Positions of shape (..., 3) or states of shape (..., 6)
+    jd : np.ndarray
+        The Julian dates of the vectors, of shape (...)
+    body : CelestialBody
+        The body at the origin of the new frame
+    ecliptic : bool, optional
+        Whether to also rotate to the ecliptic frame, by default False
+    '''
+    vectors = np.asarray(vectors, dtype=np.float64)
+    relative = vectors - body_state(body, jd)[..., :vectors.shape[-1]]
+    return icrs_to_ecliptic(relative, jd) if ecliptic else relative
+
+
+def body_centred_to_icrs(vectors: np.ndarray, jd: np.ndarray, body: CelestialBody,
+                         ecliptic: bool = False) -> np.ndarray:
+    '''
+    Expresses positions or states relative to a body as barycentric ICRS,
+    the inverse of icrs_to_body_centred.
+    '''
+    vectors = np.asarray(vectors, dtype=np.float64)
+    if ecliptic:
+        vectors = ecliptic_to_icrs(vectors, jd)
+    return vectors + body_state(body, jd)[..., :vectors.shape[-1]]
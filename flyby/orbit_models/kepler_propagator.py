@@ -0,0 +1,187 @@
+'''
+Batched two-body propagation with universal variables.
+
+The universal anomaly chi is solved from the universal Kepler equation with
+the Laguerre-Conway iteration, which converges for elliptic, parabolic and
+hyperbolic orbits alike, and the state follows from the Lagrange f and g
+coefficients. See Vallado, Fundamentals of Astrodynamics and Applications,
+Algorithm 8, and Curtis, Orbital Mechanics for Engineering Students,
+Section 3.7.
+'''
+from numba import njit
+import numpy as np
+
+
+@njit
+def _stumpff(z: float) -> "tuple[float, float]":
+    # Stumpff functions C(z) and S(z). The closed forms cancel badly for
+    # small z, where the series are used instead.
+    if z > 0.1:
+        s = np.sqrt(z)
+        return (1 - np.cos(s)) / z, (s - np.sin(s)) / s**3
+    if z < -0.1:
+        s = np.sqrt(-z)
+        return (np.cosh(s) - 1) / -z, (np.sinh(s) - s) / s**3
+
+    C = 1.0
+    S = 1.0
+    c_term = 1.0
+    s_term = 1.0
+    for k in range(1, 7):
+        c_term *= -z / ((2 * k + 1) * (2 * k + 2))
+        s_term *= -z / ((2 * k + 2) * (2 * k + 3))
+        C += c_term
+        S += s_term
+    return C / 2, S / 6
+
+
+@njit
+def kepler_propagate_numba(states: np.ndarray, dt: np.ndarray, mu: np.ndarray,
+                           tol: float, max_iterations: int) -> np.ndarray:
+    '''
+    Propagates each row of states along its two-body orbit.
+
+    Rows which do not converge are set to NaN.
+
+    Parameters
+    ----------
+    states : np.ndarray
+        The initial states as [x, y, z, vx, vy, vz], of shape (N, 6)
+    dt : np.ndarray
+        The times to propagate by in seconds, of shape (N,)
+    mu : np.ndarray
+        The gravitational parameters of the central bodies, of shape (N,)
+    tol : float
+        Relative convergence tolerance on the universal anomaly
+    max_iterations : int
+        The maximum number of Laguerre-Conway iterations
+
+    Returns
+    -------
+    np.ndarray
+        The propagated states, of shape (N, 6)
+    '''
+    n = states.shape[0]
+    result = np.empty((n, 6))
+
+    for j in range(n):
+        r0 = states[j, :3]
+        v0 = states[j, 3:]
+        sqrt_mu = np.sqrt(mu[j])
+
+        r0_norm = np.sqrt(r0[0]**2 + r0[1]**2 + r0[2]**2)
+        v0_squared = v0[0]**2 + v0[1]**2 + v0[2]**2
+        sigma0 = (r0[0] * v0[0] + r0[1] * v0[1] + r0[2] * v0[2]) / sqrt_mu
+
+        # Reciprocal of the semi-major axis
+        alpha = 2 / r0_norm - v0_squared / mu[j]
+
+        t = dt[j]
+        if alpha > 1e-15:
+            # Whole revolutions of an ellipse change nothing
+            period = 2 * np.pi / (sqrt_mu * alpha**1.5)
+            t = np.fmod(t, period)
+
+        # Initial guess
+        if alpha > 1e-15:
+            chi = sqrt_mu * t * alpha
+        elif alpha < -1e-15 and t != 0:
+            a = 1 / alpha
+            chi = np.sign(t) * np.sqrt(-a) * np.log(
+                -2 * mu[j] * alpha * t /
+                (sigma0 * sqrt_mu + np.sign(t) * np.sqrt(-mu[j] * a) * (1 - r0_norm * alpha)))
+            if not np.isfinite(chi):
+                chi = sqrt_mu * t / r0_norm
+        else:
+            chi = sqrt_mu * t / r0_norm
+
+        converged = t == 0
+
+        # Laguerre-Conway iterations on F(chi) = sqrt(mu) (t(chi) - t)
+        for _ in range(max_iterations):
+            if converged:
+                break
+
+            z = alpha * chi**2
+            C, S = _stumpff(z)
+            U0 = 1 - z * C
+            U1 = chi * (1 - z * S)
+            U2 = chi**2 * C
+            U3 = chi**3 * S
+
+            F = r0_norm * U1 + sigma0 * U2 + U3 - sqrt_mu * t
+            dF = r0_norm * U0 + sigma0 * U1 + U2
+            d2F = (1 - alpha * r0_norm) * U1 + sigma0 * U0
+
+            root = np.sqrt(np.abs(16 * dF**2 - 20 * F * d2F))
+            delta = 5 * F / (dF + np.sign(dF) * root)
+
+            chi -= delta
+
+            # Far out on hyperbolas the terms of F are large and cancel, so
+            # chi may stall at a level set by their rounding errors
+            scale = np.abs(r0_norm * U1) + np.abs(sigma0 * U2) + np.abs(U3)
+            converged = np.abs(delta) <= tol * max(np.abs(chi), 1.0) or np.abs(F) <= tol * scale
+
+        if not converged:
+            result[j] = np.nan
+            continue
+
+        z = alpha * chi**2
+        C, S = _stumpff(z)
+        U0 = 1 - z * C
+        U1 = chi * (1 - z * S)
+        U2 = chi**2 * C
+        r_norm = r0_norm * U0 + sigma0 * U1 + U2
+
+        f = 1 - U2 / r0_norm
+        g = (r0_norm * U1 + sigma0 * U2) / sqrt_mu
+        f_dot = -sqrt_mu * U1 / (r_norm * r0_norm)
+        g_dot = 1 - U2 / r_norm
+
+        for c in range(3):
+            result[j, c] = f * r0[c] + g * v0[c]
+            result[j, 3 + c] = f_dot * r0[c] + g_dot * v0[c]
+
+    return result
+
+
+def propagate_kepler(states: np.ndarray, dt: np.ndarray, mu: float,
+                     tol: float = 1e-12, max_iterations: int = 50) -> np.ndarray:
+    '''
+    Propagates two-body states analytically, for whole arrays of orbits and
+    times in one call.
+
+    Inputs are broadcast against each other, so e.g. one state can be
+    propagated to many times, or many states to one time.
+
+    Parameters
+    ----------
+    states : np.ndarray
+        The initial states relative to the central body, of shape (..., 6),
+        as [x, y, z, vx, vy, vz] in [m, m, m, m/s, m/s, m/s]
+    dt : np.ndarray
+        The times to propagate by in seconds, of shape (...); may be negative
+    mu : float
+        The gravitational parameter of the central body in m^3/s^2, or an
+        array of shape (...)
+    tol : float, optional
+        Relative convergence tolerance, by default 1e-12
+    max_iterations : int, optional
+        The maximum number of iterations per state, by default 50
+
+    Returns
+    -------
+    np.ndarray
+        The propagated states, of shape (..., 6)
+    '''
+    states = np.asarray(states, dtype=np.float64)
+    dt = np.asarray(dt, dtype=np.float64)
+    mu = np.asarray(mu, dtype=np.float64)
+
+    shape = np.broadcast_shapes(states.shape[:-1], dt.shape, mu.shape)
+    states = np.require(np.broadcast_to(states, shape + (6,)).reshape(-1, 6), requirements="CW")
+    dt = np.require(np.broadcast_to(dt, shape).reshape(-1), requirements="CW")
+    mu = np.require(np.broadcast_to(mu, shape).reshape(-1), requirements="CW")
+
+    return kepler_propagate_numba(states, dt, mu, tol, max_iterations).reshape(shape + (6,))
@@ -1,8 +1,33 @@
+import math
+from functools import lru_cache
+
 import numpy as np
 import matplotlib.pyplot as plt
 
+from flyby.orbit_models.kepler_propagator import propagate_kepler
+
+
+@lru_cache(maxsize=16)
+def _unit_circle(n: int) -> "tuple[np.ndarray, np.ndarray]":
+    # Cosines and sines of n true anomalies evenly spaced around an orbit
+    nu = np.linspace(0, 2*np.pi, n)
+    cos_nu, sin_nu = np.cos(nu), np.sin(nu)
+    cos_nu.flags.writeable = False
+    sin_nu.flags.writeable = False
+    return cos_nu, sin_nu
+
 
 class KeplerianOrbit:
+    '''
+    A Keplerian orbit, without a position along it.
+
+    The perifocal to inertial rotation and the semi-latus rectum are computed
+    on first use and kept until an element is changed, so evaluating many
+    points of the same orbit costs no further trigonometry of the elements.
+    '''
+
+    __slots__ = ("a", "e", "i", "raan", "arg_perigee", "_dcm", "_state_dcm", "_semi_latus_rectum")
+
     def __init__(self, a, e, i, raan, arg_perigee) -> None:
         self.a = a
         self.e = e
@@ -10,9 +35,43 @@ class KeplerianOrbit:
         self.raan = raan
         self.arg_perigee = arg_perigee
 
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name[0] != "_":
+            # Derived quantities are stale once an element changes
+            object.__setattr__(self, "_dcm", None)
+            object.__setattr__(self, "_state_dcm", None)
+            object.__setattr__(self, "_semi_latus_rectum", None)
+
     def __str__(self) -> str:
         return f'KeplerianOrbit(a={self.a}, e={self.e}, i={self.i}, raan={self.raan}, arg_perigee={self.arg_perigee})'
 
+    @property
+    def dcm(self) -> np.ndarray:
+        '''
+        The 3x3 rotation from the perifocal frame to the inertial frame.
+        '''
+        if self._dcm is None:
+            # The elements are scalars, for which math is much cheaper than numpy
+            cos_raan, sin_raan = math.cos(self.raan), math.sin(self.raan)
+            cos_w, sin_w = math.cos(self.arg_perigee), math.sin(self.arg_perigee)
+            cos_i, sin_i = math.cos(self.i), math.sin(self.i)
+
+            self._dcm = np.array([
+                [cos_raan*cos_w - sin_raan*sin_w*cos_i, -cos_raan*sin_w - sin_raan*cos_w*cos_i,
+                 sin_raan*sin_i],
+                [sin_raan*cos_w + cos_raan*sin_w*cos_i, -sin_raan*sin_w + cos_raan*cos_w*cos_i,
+                 -cos_raan*sin_i],
+                [sin_w*sin_i, cos_w*sin_i, cos_i]
+            ])
+        return self._dcm
+
+    @property
+    def semi_latus_rectum(self) -> float:
+        if self._semi_latus_rectum is None:
+            self._semi_latus_rectum = self.a*(1-self.e**2)
+        return self._semi_latus_rectum
+
     def get_state_space_point(self, nu: float) -> np.ndarray:
         '''
         Return a point in state space corresponding to a certain true anomaly.
@@ -27,29 +86,8 @@ class KeplerianOrbit:
         np.ndarray
             A 3x1 array of the position in state space.
         '''
-        e = self.e
-        a = self.a
-        i = self.i
-        raan = self.raan
-        arg_perigee = self.arg_perigee
-
-        # Calculate the radius
-        r = a*(1-e**2)/(1+e*np.cos(nu))
-
-        # Calculate the position in the perifocal frame
-        rp = r*np.vstack((np.cos(nu), np.sin(nu), np.zeros(len(nu))))
-
-        # Transform to inertial frame
-        C = np.array([
-            [np.cos(raan)*np.cos(arg_perigee)-np.sin(raan)*np.sin(arg_perigee)*np.cos(i), -np.cos(raan)
-             * np.sin(arg_perigee)-np.sin(raan)*np.cos(arg_perigee)*np.cos(i), np.sin(raan)*np.sin(i)],
-            [np.sin(raan)*np.cos(arg_perigee)+np.cos(raan)*np.sin(arg_perigee)*np.cos(i), -np.sin(raan)
-             * np.sin(arg_perigee)+np.cos(raan)*np.cos(arg_perigee)*np.cos(i), -np.cos(raan)*np.sin(i)],
-            [np.sin(arg_perigee)*np.sin(i),
-             np.cos(arg_perigee)*np.sin(i), np.cos(i)]
-        ])
-
-        return C @ rp
+        nu = np.atleast_1d(nu)
+        return self._position(np.cos(nu), np.sin(nu))
 
     def get_state_space_velocity(self, nu: float, mu: float) -> np.ndarray:
         '''
@@ -67,30 +105,79 @@ class KeplerianOrbit:
         np.ndarray
             A 3x1 array of the velocity in state space.
         '''
-        e = self.e
-        a = self.a
-        i = self.i
-        raan = self.raan
-        arg_perigee = self.arg_perigee
+        nu = np.atleast_1d(nu)
+        return self._velocity(np.cos(nu), np.sin(nu), mu)
 
+    def get_state(self, nu: float, mu: float) -> np.ndarray:
+        '''
+        Return the position and velocity in state space corresponding to a
+        certain true anomaly, sharing one evaluation of its sine and cosine.
+
+        Parameters
+        ----------
+        nu: float
+            True anomaly in radians
+        mu: float
+            Gravitational parameter of the central body in m^3/s^2
+
+        Returns
+        -------
+        np.ndarray
+            A 6xN array of the positions and velocities in state space.
+        '''
+        nu = np.atleast_1d(nu)
+        cos_nu, sin_nu = np.cos(nu), np.sin(nu)
+
+        r = self.semi_latus_rectum/(1+self.e*cos_nu)
+        v_partial = math.sqrt(mu/self.semi_latus_rectum)
+
+        # Both perifocal vectors are rotated by one product with a block
+        # diagonal of the first two columns of the dcm
+        if self._state_dcm is None:
+            self._state_dcm = np.zeros((6, 4))
+            self._state_dcm[:3, :2] = self.dcm[:, :2]
+            self._state_dcm[3:, 2:] = self.dcm[:, :2]
+
+        return self._state_dcm @ np.vstack((r*cos_nu, r*sin_nu,
+                                            -v_partial*sin_nu, v_partial*(self.e+cos_nu)))
+
+    def _position(self, cos_nu: np.ndarray, sin_nu: np.ndarray) -> np.ndarray:
+        # Calculate the radius
+        r = self.semi_latus_rectum/(1+self.e*cos_nu)
+
+        # Combine the perifocal x and y directions, the first two columns of the dcm
+        C = self.dcm
+        return C[:, 0:1]*(r*cos_nu) + C[:, 1:2]*(r*sin_nu)
+
+    def _velocity(self, cos_nu: np.ndarray, sin_nu: np.ndarray, mu: float) -> np.ndarray:
         # Calculate the magnitude of the velocity
-        v_partial = np.sqrt(mu/(a*(1 - e**2)))
+        v_partial = math.sqrt(mu/self.semi_latus_rectum)
 
-        # Calculate the velocity in the perifocal frame
-        vp = v_partial * \
-            np.vstack((-np.sin(nu), e+np.cos(nu), np.zeros(len(nu))))
+        C = self.dcm
+        return C[:, 0:1]*(-v_partial*sin_nu) + C[:, 1:2]*(v_partial*(self.e+cos_nu))
 
-        # Transform to inertial frame
-        C = np.array([
-            [np.cos(raan)*np.cos(arg_perigee)-np.sin(raan)*np.sin(arg_perigee)*np.cos(i), -np.cos(raan)
-             * np.sin(arg_perigee)-np.sin(raan)*np.cos(arg_perigee)*np.cos(i), np.sin(raan)*np.sin(i)],
-            [np.sin(raan)*np.cos(arg_perigee)+np.cos(raan)*np.sin(arg_perigee)*np.cos(i), -np.sin(raan)
-             * np.sin(arg_perigee)+np.cos(raan)*np.cos(arg_perigee)*np.cos(i), -np.cos(raan)*np.sin(i)],
-            [np.sin(arg_perigee)*np.sin(i),
-             np.cos(arg_perigee)*np.sin(i), np.cos(i)]
-        ])
+    def propagate(self, nu_0: float, dt: np.ndarray, mu: float) -> np.ndarray:
+        '''
+        Return states in state space a set of times after passing a certain
+        true anomaly, without numerical integration.
 
-        return C @ vp
+        Parameters
+        ----------
+        nu_0: float
+            True anomaly in radians at the initial time
+        dt: np.ndarray
+            Times after the initial time in seconds
+        mu: float
+            Gravitational parameter of the central body in m^3/s^2
+
+        Returns
+        -------
+        np.ndarray
+            A 6xN array of the positions and velocities in state space.
+        '''
+        state = self.get_state(nu_0, mu)[:, 0]
+
+        return propagate_kepler(state, np.atleast_1d(dt), mu).T
 
     def get_state_space_orbit(self, n: float) -> np.ndarray:
         """
@@ -107,7 +194,7 @@ class KeplerianOrbit:
             A 3xN array of positions in state space.
 
         """
-        return self.get_state_space_point(np.linspace(0, 2*np.pi, n))
+        return self._position(*_unit_circle(n))
 
     def plot(self):
         state_space_orbit = self.get_state_space_orbit(1000)
@@ -146,7 +233,7 @@ class KeplerianOrbit:
         plt.show()
 
     @classmethod
-    def from_state(cls, r: np.ndarray, v: np.ndarray, mu: float):
+    def from_state(cls, r: np.ndarray, v: np.ndarray, mu: float, tol: float = 1e-11):
         '''
         Fits the osculating Keplerian orbit to the given state.
 
@@ -158,28 +245,216 @@ class KeplerianOrbit:
             Velocity vector in meters per second expressed in J2000 about the central body.
         mu: float
             gravitational parameter of the central body in meters cubed per second squared.
+        tol: float
+            Eccentricity, and sine of the inclination, below which the orbit
+            is treated as circular and equatorial.
         '''
-        # From Curtis Orbital Mechanics Section 4.3
-        r_norm = np.linalg.norm(r)
-        v_norm = np.linalg.norm(v)
+        # Same conventions as KeplerianOrbitArray.from_states, which handles
+        # many states; for a single one, scalar math avoids numpy's per call
+        # overhead
+        x, y, z = (float(c) for c in r)
+        vx, vy, vz = (float(c) for c in v)
+
+        r_norm = math.sqrt(x*x + y*y + z*z)
+        v_squared = vx*vx + vy*vy + vz*vz
+        rv = x*vx + y*vy + z*vz
+
+        hx, hy, hz = y*vz - z*vy, z*vx - x*vz, x*vy - y*vx
+        h_norm = math.sqrt(hx*hx + hy*hy + hz*hz)
+        i = math.acos(max(-1.0, min(1.0, hz/h_norm)))
+
+        # Node line, or the x axis for equatorial orbits
+        n_norm = math.hypot(hx, hy)
+        if n_norm <= tol*h_norm:
+            nx, ny, raan = 1.0, 0.0, 0.0
+        else:
+            nx, ny, raan = -hy/n_norm, hx/n_norm, math.atan2(hx, -hy)
+
+        # Eccentricity vector, or the node line for circular orbits
+        radial = (v_squared - mu/r_norm)/mu
+        tangential = rv/mu
+        ex, ey, ez = radial*x - tangential*vx, radial*y - tangential*vy, radial*z - tangential*vz
+        e = math.sqrt(ex*ex + ey*ey + ez*ez)
+        if e <= tol:
+            ex, ey, ez = nx, ny, 0.0
+        else:
+            ex, ey, ez = ex/e, ey/e, ez/e
+
+        # Angle from the node to the perigee in the orbital plane, about h
+        arg_perigee = math.atan2(((ny*ez)*hx - (nx*ez)*hy + (nx*ey - ny*ex)*hz)/h_norm,
+                                 nx*ex + ny*ey)
 
-        v_r = np.dot(r, v)/r_norm
-        h = np.cross(r, v)
+        # energy (specific mechanical energy)
+        energy = v_squared/2 - mu/r_norm
 
-        h_norm = np.linalg.norm(h)
-        i = np.arccos(h[2]/h_norm)
-        n = np.cross(np.array([0, 0, 1]), h)
+        a = -mu/(2*energy)  # semi-major axis
 
-        raan = np.arctan2(n[1], n[0])  # this makes it quadrant aware
+        return cls(a, e, i, raan, arg_perigee)
 
-        e = (1/mu)*((v_norm**2 - mu/r_norm)*r - r_norm*v_r*v)
 
-        arg_perigee = np.arctan2(
-            e[2]/np.sin(i), e[0]*np.cos(raan) + e[1]*np.sin(raan))  # this makes it quadrant aware
+class KeplerianOrbitArray:
+    '''
+    Keplerian elements of many orbits, or of one orbit at many times, stored
+    as one array per element.
+
+    Conversions to and from states are vectorized over all orbits. For
+    equatorial orbits, where the node is undefined, raan is 0 and angles are
+    measured from the x axis. For circular orbits, where the perigee is
+    undefined, arg_perigee is 0 and nu is measured from the node.
+    '''
+
+    def __init__(self, a: np.ndarray, e: np.ndarray, i: np.ndarray, raan: np.ndarray,
+                 arg_perigee: np.ndarray, nu: np.ndarray) -> None:
+        '''
+        :param a: Semi-major axes in meters, negative for hyperbolic orbits
+        :param e: Eccentricities
+        :param i: Inclinations in radians
+        :param raan: Right ascensions of the ascending node in radians
+        :param arg_perigee: Arguments of perigee in radians
+        :param nu: True anomalies in radians
+        '''
+        # At least 1-d, so that a single orbit can be indexed as one of many
+        self.a, self.e, self.i, self.raan, self.arg_perigee, self.nu = np.broadcast_arrays(
+            *(np.atleast_1d(np.asarray(element, dtype=np.float64))
+              for element in (a, e, i, raan, arg_perigee, nu)))
+
+    def __len__(self) -> int:
+        return len(self.a)
+
+    def __getitem__(self, index) -> "KeplerianOrbit | KeplerianOrbitArray":
+        '''
+        Returns the orbit at an integer index, or the orbits selected by a
+        slice or mask.
+        '''
+        if np.ndim(self.a[index]) == 0:
+            return KeplerianOrbit(float(self.a[index]), float(self.e[index]), float(self.i[index]),
+                                  float(self.raan[index]), float(self.arg_perigee[index]))
+
+        return KeplerianOrbitArray(self.a[index], self.e[index], self.i[index],
+                                   self.raan[index], self.arg_perigee[index], self.nu[index])
+
+    def __str__(self) -> str:
+        return f'KeplerianOrbitArray({self.a.shape})'
+
+    @property
+    def semi_latus_rectum(self) -> np.ndarray:
+        return self.a * (1 - self.e**2)
+
+    @classmethod
+    def from_states(cls, states: np.ndarray, mu: float, tol: float = 1e-11):
+        '''
+        Fits the osculating Keplerian orbits to states.
+
+        Parameters
+        ----------
+        states: np.ndarray
+            States of shape (..., 6) as [x, y, z, vx, vy, vz] in
+            [m, m, m, m/s, m/s, m/s], expressed in J2000 about the central
+            body. For a solve_ivp solution, pass sol.y.T. A single state of
+            shape (6,) gives one orbit, of elements of shape (1,).
+        mu: float
+            gravitational parameter of the central body in meters cubed per second squared.
+        tol: float
+            Eccentricity, and sine of the inclination, below which orbits
+            are treated as circular and equatorial.
+        '''
+        # From Curtis Orbital Mechanics Section 4.3, with the angles measured
+        # by atan2 within the orbital plane so that none divides by sin(i).
+        # Works on component arrays, which numpy handles much faster than
+        # small trailing axes.
+        states = np.asarray(states, dtype=np.float64)
+        x, y, z, vx, vy, vz = np.moveaxis(states, -1, 0)
+
+        r_norm = np.sqrt(x**2 + y**2 + z**2)
+        v_squared = vx**2 + vy**2 + vz**2
+        rv = x*vx + y*vy + z*vz
+
+        hx = y*vz - z*vy
+        hy = z*vx - x*vz
+        hz = x*vy - y*vx
+        h_norm = np.sqrt(hx**2 + hy**2 + hz**2)
+        i = np.arccos(np.clip(hz / h_norm, -1, 1))
+
+        # Node line, or the x axis for equatorial orbits
+        n_norm = np.hypot(hx, hy)
+        equatorial = n_norm <= tol * h_norm
+        n_safe = np.where(equatorial, 1, n_norm)
+        nx = np.where(equatorial, 1, -hy / n_safe)
+        ny = np.where(equatorial, 0, hx / n_safe)
+        raan = np.where(equatorial, 0, np.arctan2(hx, -hy))
+
+        # Eccentricity vector, or the node line for circular orbits
+        radial = (v_squared - mu/r_norm) / mu
+        tangential = rv / mu
+        ex = radial*x - tangential*vx
+        ey = radial*y - tangential*vy
+        ez = radial*z - tangential*vz
+        e = np.sqrt(ex**2 + ey**2 + ez**2)
+        circular = e <= tol
+        e_safe = np.where(circular, 1, e)
+        ex = np.where(circular, nx, ex / e_safe)
+        ey = np.where(circular, ny, ey / e_safe)
+        ez = np.where(circular, 0, ez / e_safe)
+
+        def angle(ax, ay, az, bx, by, bz):
+            # Angle from direction a to direction b in the orbital plane, about h
+            sine = ((ay*bz - az*by)*hx + (az*bx - ax*bz)*hy + (ax*by - ay*bx)*hz) / h_norm
+            return np.arctan2(sine, ax*bx + ay*by + az*bz)
+
+        arg_perigee = angle(nx, ny, 0, ex, ey, ez)
+        nu = angle(ex, ey, ez, x, y, z)
 
         # energy (specific mechanical energy)
-        energy = (np.linalg.norm(v)**2)/2 - mu/np.linalg.norm(r)
+        energy = v_squared/2 - mu/r_norm
 
         a = -mu/(2*energy)  # semi-major axis
 
-        return cls(a, np.linalg.norm(e), i, raan, arg_perigee)
+        return cls(a, e, i, raan, arg_perigee, nu)
+
+    def to_states(self, mu: float) -> np.ndarray:
+        '''
+        Returns the states at the true anomalies nu, of shape (..., 6).
+
+        Parameters
+        ----------
+        mu: float
+            Gravitational parameter of the central body in m^3/s^2
+        '''
+        p = self.semi_latus_rectum
+        cos_nu = np.cos(self.nu)
+        sin_nu = np.sin(self.nu)
+
+        r = p / (1 + self.e * cos_nu)
+        v_partial = np.sqrt(mu / p)
+
+        # Position and velocity in the perifocal frame
+        rp_x, rp_y = r * cos_nu, r * sin_nu
+        vp_x, vp_y = -v_partial * sin_nu, v_partial * (self.e + cos_nu)
+
+        # Only the first two columns of the rotation are needed
+        C = self.perifocal_to_inertial()
+        C_x, C_y = C[..., 0], C[..., 1]
+
+        return np.concatenate((C_x * rp_x[..., np.newaxis] + C_y * rp_y[..., np.newaxis],
+                               C_x * vp_x[..., np.newaxis] + C_y * vp_y[..., np.newaxis]), axis=-1)
+
+    def perifocal_to_inertial(self) -> np.ndarray:
+        '''
+        Returns the rotation matrices from the perifocal frames to the
+        inertial frame, of shape (..., 3, 3).
+        '''
+        cos_raan, sin_raan = np.cos(self.raan), np.sin(self.raan)
+        cos_w, sin_w = np.cos(self.arg_perigee), np.sin(self.arg_perigee)
+        cos_i, sin_i = np.cos(self.i), np.sin(self.i)
+
+        C = np.empty(self.a.shape + (3, 3))
+        C[..., 0, 0] = cos_raan*cos_w - sin_raan*sin_w*cos_i
+        C[..., 0, 1] = -cos_raan*sin_w - sin_raan*cos_w*cos_i
+        C[..., 0, 2] = sin_raan*sin_i
+        C[..., 1, 0] = sin_raan*cos_w + cos_raan*sin_w*cos_i
+        C[..., 1, 1] = -sin_raan*sin_w + cos_raan*cos_w*cos_i
+        C[..., 1, 2] = -cos_raan*sin_i
+        C[..., 2, 0] = sin_w*sin_i
+        C[..., 2, 1] = cos_w*sin_i
+        C[..., 2, 2] = cos_i
+        return C
@@ -0,0 +1,275 @@
+'''
+Batched solution of Lambert's problem: find the conic connecting two
+positions in a given time of flight.
+
+Uses the algorithm of Izzo (2015), "Revisiting Lambert's problem",
+restricted to single revolution (M = 0) transfers.
+'''
+from numba import njit
+import numpy as np
+
+from flyby.solar_system_model.celestial_body import CelestialBody
+
+
+@njit
+def _hyp2f1b(x: float) -> float:
+    # Hypergeometric function 2F1(3, 1, 5/2, x), see Battin
+    if x >= 1.0:
+        return np.inf
+
+    result = 1.0
+    term = 1.0
+    k = 0
+    while True:
+        term = term * (3 + k) * (1 + k) / (2.5 + k) * x / (k + 1)
+        previous = result
+        result += term
+        if result == previous:
+            return result
+        k += 1
+
+
+@njit
+def _compute_y(x: float, ll: float) -> float:
+    return np.sqrt(1 - ll**2 * (1 - x**2))
+
+
+@njit
+def _compute_psi(x: float, y: float, ll: float) -> float:
+    if -1 <= x < 1:
+        # Elliptic
+        return np.arccos(x * y + ll * (1 - x**2))
+    elif x > 1:
+        # Hyperbolic
+        return np.arcsinh((y - x * ll) * np.sqrt(x**2 - 1))
+    # Parabolic
+    return 0.0
+
+
+@njit
+def _time_of_flight(x: float, y: float, ll: float) -> float:
+    # Non-dimensional time of flight for M = 0
+    if np.sqrt(0.6) < x < np.sqrt(1.4):
+        # Series form near the parabola, where the closed form loses precision
+        eta = y - ll * x
+        s_1 = (1 - ll - x * eta) * 0.5
+        q = 4 / 3 * _hyp2f1b(s_1)
+        return (eta**3 * q + 4 * ll * eta) * 0.5
+
+    psi = _compute_psi(x, y, ll)
+    return (psi / np.sqrt(np.abs(1 - x**2)) - x + ll * y) / (1 - x**2)
+
+
+@njit
+def _find_x(ll: float, T: float, tol: float, max_iterations: int) -> float:
+    # Initial guess
+    T_0 = np.arccos(ll) + ll * np.sqrt(1 - ll**2)
+    T_1 = 2 * (1 - ll**3) / 3
+
+    # As in Izzo's reference implementation, which interpolates x = 0 at
+    # T_0 and x = 1 (parabolic) at T_1 between the two
+    if T >= T_0:
+        x = -(T - T_0) / (T - T_0 + 4)
+    elif T <= T_1:
+        x = 5 / 2 * T_1 / T * (T_1 - T) / (1 - ll**5) + 1
+    else:
+        x = (T / T_0)**(np.log(2) / np.log(T_1 / T_0)) - 1
+
+    # Householder iterations (quartic convergence)
+    for _ in range(max_iterations):
+        y = _compute_y(x, ll)
+        f = _time_of_flight(x, y, ll) - T
+        T_x = f + T
+
+        df = (3 * T_x * x - 2 + 2 * ll**3 * x / y) / (1 - x**2)
+        d2f = (3 * T_x + 5 * x * df + 2 * (1 - ll**2) * ll**3 / y**3) / (1 - x**2)
+        d3f = (7 * x * d2f + 8 * df - 6 * (1 - ll**2) * ll**5 * x / y**5) / (1 - x**2)
+
+        x_new = x - f * ((df**2 - f * d2f / 2) /
+                         (df * (df**2 - f * d2f) + d3f * f**2 / 6))
+
+        if abs(x_new - x) < tol:
+            return x_new
+        x = x_new
+
+    return np.nan
+
+
+@njit
+def lambert_numba(r1: np.ndarray, r2: np.ndarray, tof: np.ndarray, mu: float,
+                  prograde: bool, tol: float, max_iterations: int):
+    '''
+    Solves Lambert's problem for each row of r1, r2 and tof.
+
+    Rows without a solution (no convergence, or collinear positions for
+    which the transfer plane is undefined) are set to NaN.
+
+    Parameters
+    ----------
+    r1, r2 : np.ndarray
+        The initial and final positions, of shape (N, 3)
+    tof : np.ndarray
+        The times of flight in seconds, of shape (N,)
+    mu : float
+        The gravitational parameter of the central body
+    prograde : bool
+        Whether the transfers are prograde about the z axis
+    tol : float
+        Convergence tolerance on the Izzo x variable
+    max_iterations : int
+        The maximum number of Householder iterations
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray]
+        The initial and final velocities, each of shape (N, 3)
+    '''
+    n = r1.shape[0]
+    v1 = np.empty((n, 3))
+    v2 = np.empty((n, 3))
+
+    for j in range(n):
+        c = r2[j] - r1[j]
+        c_norm = np.sqrt(c[0]**2 + c[1]**2 + c[2]**2)
+        r1_norm = np.sqrt(r1[j, 0]**2 + r1[j, 1]**2 + r1[j, 2]**2)
+        r2_norm = np.sqrt(r2[j, 0]**2 + r2[j, 1]**2 + r2[j, 2]**2)
+
+        ir1 = r1[j] / r1_norm
+        ir2 = r2[j] / r2_norm
+        ih = np.cross(ir1, ir2)
+        ih_norm = np.sqrt(ih[0]**2 + ih[1]**2 + ih[2]**2)
+
+        if ih_norm < 1e-12 or tof[j] <= 0:
+            v1[j] = np.nan
+            v2[j] = np.nan
+            continue
+        ih = ih / ih_norm
+
+        s = (r1_norm + r2_norm + c_norm) / 2
+        ll = np.sqrt(max(0.0, 1 - c_norm / s))
+
+        if ih[2] < 0:
+            ll = -ll
+            it1 = np.cross(ir1, ih)
+            it2 = np.cross(ir2, ih)
+        else:
+            it1 = np.cross(ih, ir1)
+            it2 = np.cross(ih, ir2)
+
+        if not prograde:
+            ll = -ll
+            it1 = -it1
+            it2 = -it2
+
+        T = np.sqrt(2 * mu / s**3) * tof[j]
+        x = _find_x(ll, T, tol, max_iterations)
+        y = _compute_y(x, ll)
+
+        gamma = np.sqrt(mu * s / 2)
+        rho = (r1_norm - r2_norm) / c_norm
+        sigma = np.sqrt(1 - rho**2)
+
+        v_r1 = gamma * ((ll * y - x) - rho * (ll * y + x)) / r1_norm
+        v_r2 = -gamma * ((ll * y - x) + rho * (ll * y + x)) / r2_norm
+        v_t = gamma * sigma * (y + ll * x)
+
+        v1[j] = v_r1 * ir1 + v_t / r1_norm * it1
+        v2[j] = v_r2 * ir2 + v_t / r2_norm * it2
+
+    return v1, v2
+
+
+def lambert(r1: np.ndarray, r2: np.ndarray, tof: np.ndarray, mu: float,
+            prograde: bool = True, tol: float = 1e-10,
+            max_iterations: int = 35) -> "tuple[np.ndarray, np.ndarray]":
+    '''
+    Solves Lambert's problem for whole grids of transfers at once.
+
+    Inputs are broadcast against each other, so e.g. a single r1 can be
+    combined with many r2 and tof.
+
+    Parameters
+    ----------
+    r1 : np.ndarray
+        The initial positions in m, of shape (..., 3)
+    r2 : np.ndarray
+        The final positions in m, of shape (..., 3)
+    tof : np.ndarray
+        The times of flight in seconds, of shape (...)
+    mu : float
+        The gravitational parameter of the central body in m^3/s^2
+    prograde : bool, optional
+        Whether the transfers are prograde about the z axis, by default True
+    tol : float, optional
+        Convergence tolerance, by default 1e-10
+    max_iterations : int, optional
+        The maximum number of iterations per transfer, by default 35
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray]
+        The initial and final velocities in m/s, each of shape (..., 3).
+        Transfers without a solution are NaN.
+    '''
+    r1 = np.asarray(r1, dtype=np.float64)
+    r2 = np.asarray(r2, dtype=np.float64)
+    tof = np.asarray(tof, dtype=np.float64)
+
+    shape = np.broadcast_shapes(r1.shape[:-1], r2.shape[:-1], tof.shape)
+    # Always hand the kernel contiguous, writeable arrays, so that it is
+    # compiled once rather than for each layout the broadcasting produces
+    r1 = np.require(np.broadcast_to(r1, shape + (3,)).reshape(-1, 3), requirements="CW")
+    r2 = np.require(np.broadcast_to(r2, shape + (3,)).reshape(-1, 3), requirements="CW")
+    tof = np.require(np.broadcast_to(tof, shape).reshape(-1), requirements="CW")
+
+    v1, v2 = lambert_numba(r1, r2, tof, mu, prograde, tol, max_iterations)
+
+    return v1.reshape(shape + (3,)), v2.reshape(shape + (3,))
+
+
+def lambert_between_bodies(departure_body: CelestialBody, arrival_body: CelestialBody,
+                           departure_jd: np.ndarray, arrival_jd: np.ndarray,
+                           prograde: bool = True) -> tuple:
+    '''
+    Solves heliocentric Lambert transfers between two bodies, using their
+    DE440 states at the departure and arrival dates as endpoints.
+
+    Parameters
+    ----------
+    departure_body : CelestialBody
+        The body departed from.
+    arrival_body : CelestialBody
+        The body arrived at.
+    departure_jd : np.ndarray
+        The departure Julian dates, of shape (...)
+    arrival_jd : np.ndarray
+        The arrival Julian dates, broadcastable against departure_jd.
+    prograde : bool, optional
+        Whether the transfers are prograde, by default True
+
+    Returns
+    -------
+    tuple
+        (v1, v2, departure_state, arrival_state): the transfer velocities at
+        departure and arrival, shape (..., 3), and the states of the bodies,
+        shape (..., 6). All are heliocentric, aligned with J2000, in m and m/s.
+    '''
+    departure_jd, arrival_jd = np.broadcast_arrays(
+        np.asarray(departure_jd, dtype=np.float64), np.asarray(arrival_jd, dtype=np.float64))
+
+    sun = CelestialBody.sun()
+
+    def heliocentric_states(body, jd):
+        times = jd.reshape(-1)
+        start, end = times.min(), times.max()
+        states = body.ephemeris_source(start, end).states(times) - \
+            sun.ephemeris_source(start, end).states(times)
+        return states.reshape(jd.shape + (6,))
+
+    departure_state = heliocentric_states(departure_body, departure_jd)
+    arrival_state = heliocentric_states(arrival_body, arrival_jd)
+
+    v1, v2 = lambert(departure_state[..., :3], arrival_state[..., :3],
+                     (arrival_jd - departure_jd) * 86400, sun.mu, prograde)
+
+    return v1, v2, departure_state, arrival_state
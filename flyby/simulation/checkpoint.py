@@ -0,0 +1,154 @@
+'''
+Checkpoints of long simulations, to resume them after a crash or on a
+preemptible machine.
+
+A checkpoint is an .npz file holding the state of the native integrator
+between two calls of its kernel (see integrators.integrate) and a JSON
+description of the simulation: the spacecraft and its interacting bodies,
+the integrator settings, the span of the ephemeris interpolants and the
+rows of the trajectory file written so far. It is replaced atomically, so a
+crash while saving leaves the previous checkpoint intact.
+
+As the kernel restarts between calls whether or not the simulation is
+interrupted, a resumed simulation takes exactly the same steps.
+'''
+import json
+import os
+import time
+
+import numpy as np
+
+from flyby.solar_system_model.celestial_body import CelestialBody
+from flyby.solar_system_model.relational_tree import RelationalTreeNode
+from flyby.spacecraft_model.spacecraft import Spacecraft
+
+CHECKPOINT_FORMAT_VERSION = 1
+
+
+class Checkpointer:
+    '''
+    Saves the integrator states passed to it (see integrate's checkpoint)
+    once enough wall-clock or simulated time has passed since the last save.
+    '''
+
+    def __init__(self, path: str, config: dict, interval: float = 600.0,
+                 simulated_interval: float = None, writer=None,
+                 steps_per_call: int = 1000) -> None:
+        '''
+        :param path: The checkpoint file to write
+        :param config: The description of the simulation to save with each state
+        :param interval: The wall-clock time between checkpoints in seconds
+        :param simulated_interval: The simulated time between checkpoints in seconds,
+            checkpointing at whichever of the intervals passes first
+        :param writer: The TrajectoryWriter of the simulation, flushed before saving
+        :param steps_per_call: The number of integrator steps between opportunities
+            to checkpoint
+        '''
+        self.path: str = path
+        self.config: dict = config
+        self.interval: float = interval
+        self.simulated_interval: float = simulated_interval
+        self.writer = writer
+        self.steps_per_call: int = steps_per_call
+
+        self._last_time = time.monotonic()
+        self._last_t = None
+
+    def __call__(self, state: dict) -> None:
+        if self._last_t is None:
+            self._last_t = state["t"]
+
+        due = time.monotonic() - self._last_time >= self.interval
+        if self.simulated_interval is not None:
+            due = due or abs(state["t"] - self._last_t) >= self.simulated_interval
+
+        if due:
+            self.save(state)
+
+    def save(self, state: dict) -> None:
+        '''
+        Writes a checkpoint of a state, after the steps before it.
+        '''
+        config = dict(self.config)
+        if self.writer is not None:
+            self.writer.flush()
+            config["output"] = {"path": self.writer.path, "n_rows": self.writer.n_rows}
+
+        write_checkpoint(self.path, state, config)
+        self._last_time = time.monotonic()
+        self._last_t = state["t"]
+
+
+def write_checkpoint(path: str, state: dict, config: dict) -> None:
+    '''
+    Atomically writes an integrator state and the description of its
+    simulation to a checkpoint file.
+    '''
+    config = dict(config, version=CHECKPOINT_FORMAT_VERSION)
+
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as f:
+        np.savez(f, config=np.array(json.dumps(config)), **state)
+    os.replace(temporary, path)
+
+
+def read_checkpoint(path: str) -> "tuple[dict, dict]":
+    '''
+    Returns the integrator state and the description of the simulation
+    saved in a checkpoint file.
+    '''
+    with np.load(path) as data:
+        config = json.loads(str(data["config"]))
+        if config.get("version") != CHECKPOINT_FORMAT_VERSION:
+            raise ValueError(f"{path} has checkpoint format version {config.get('version')}, "
+                             f"expected {CHECKPOINT_FORMAT_VERSION}")
+        state = {name: data[name] for name in data.files if name != "config"}
+
+    return state, config
+
+
+def spacecraft_config(spacecraft: Spacecraft) -> dict:
+    '''
+    Describes a spacecraft and its interacting bodies, including their
+    RelationalTree parents, for spacecraft_from_config.
+    '''
+    bodies = []
+    for body in spacecraft.interacting_bodies:
+        parent = getattr(body, "parent", None)
+        bodies.append({
+            "name": body.name, "radius": body.radius, "mass": body.mass,
+            "color": body.color, "ephemeris_id": body.ephemeris_id,
+            "node": isinstance(body, RelationalTreeNode),
+            "parent": parent.ephemeris_id if parent is not None else None,
+        })
+
+    return {
+        "initial_state_icrs": [float(value) for value in spacecraft.initial_state_icrs],
+        "jd_0": spacecraft.jd_0,
+        "mass": spacecraft.mass,
+        "bodies": bodies,
+    }
+
+
+def spacecraft_from_config(config: dict) -> Spacecraft:
+    '''
+    Rebuilds a spacecraft described by spacecraft_config.
+    '''
+    spacecraft = Spacecraft(np.array(config["initial_state_icrs"]), config["jd_0"])
+    spacecraft.mass = config["mass"]
+
+    bodies = []
+    for description in config["bodies"]:
+        body = CelestialBody(description["name"], description["radius"], description["mass"],
+                             description["color"], description["ephemeris_id"])
+        bodies.append(RelationalTreeNode(body) if description["node"] else body)
+
+    by_id = {body.ephemeris_id: body for body in bodies}
+    for body, description in zip(bodies, config["bodies"]):
+        parent = by_id.get(description["parent"])
+        if description["node"] and parent is not None:
+            body.parent = parent
+            parent.children.append(body)
+
+    spacecraft.add_interacting_bodies(*bodies)
+    return spacecraft
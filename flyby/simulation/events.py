@@ -0,0 +1,248 @@
+'''
+Events located during a simulation, such as sphere of influence crossings,
+periapsis passages and impacts.
+
+Each event is a function of the spacecraft's state relative to one of the
+interacting bodies which changes sign at the event:
+- DISTANCE: the distance from the body minus a threshold, e.g. the body's
+  radius for impacts or its sphere of influence for crossings
+- RADIAL_VELOCITY: the dot product of the relative position and velocity,
+  which increases through zero at periapsis and decreases at apoapsis
+
+Events are evaluated in compiled code from the stacked ephemeris tables,
+either by the native integrators after every step or as solve_ivp events.
+'''
+from numba import njit
+import numpy as np
+
+from flyby.math_utilities.chebyshev_interpolator import chebyshev_numba
+from flyby.solar_system_model.celestial_body import CelestialBody
+from flyby.spacecraft_model.gravity import body_position
+
+
+DISTANCE = 0
+RADIAL_VELOCITY = 1
+
+
+class Event:
+    def __init__(self, body: CelestialBody, kind: int, threshold: float = 0.0,
+                 direction: float = 0, terminal: bool = False, name: str = None) -> None:
+        '''
+        :param body: The body the event is relative to. It must be one of the
+            spacecraft's interacting bodies.
+        :param kind: DISTANCE or RADIAL_VELOCITY
+        :param threshold: The distance in meters at which a DISTANCE event occurs
+        :param direction: The sign of the crossings to detect, or 0 for both.
+            -> e.g. -1 for entering a sphere and +1 for leaving it
+        :param terminal: Whether to stop the simulation at the first occurrence
+        :param name: A label for the event, by default derived from the body
+        '''
+        self.body: CelestialBody = body
+        self.kind: int = kind
+        self.threshold: float = threshold
+        self.direction: float = direction
+        self.terminal: bool = terminal
+        self.name: str = name or f"{body.name} event"
+
+    def __repr__(self):
+        return f"Event({self.name}, terminal={self.terminal})"
+
+    def solve_ivp_function(self, index: int, jd_0: float, tables: tuple):
+        '''
+        Returns the event as a function of (t, u) for solve_ivp, with its
+        terminal and direction attributes set.
+
+        Parameters
+        ----------
+        index : int
+            The index of the event's body in the stacked ephemeris tables
+        jd_0 : float
+            The Julian date at t = 0
+        tables : tuple
+            The stacked ephemeris tables, see stack_ephemeris_tables
+        '''
+        kind, threshold = self.kind, self.threshold
+
+        def function(t, u):
+            return event_value(kind, index, threshold, jd_0 + t/86400, u, -1, *tables)
+
+        function.terminal = self.terminal
+        function.direction = self.direction
+        return function
+
+    # Presets
+    @classmethod
+    def impact(cls, body: CelestialBody, terminal: bool = True):
+        return cls(body, DISTANCE, body.radius, -1, terminal, f"{body.name} impact")
+
+    @classmethod
+    def altitude(cls, body: CelestialBody, altitude: float, direction: float = 0,
+                 terminal: bool = False):
+        return cls(body, DISTANCE, body.radius + altitude, direction, terminal,
+                   f"{body.name} altitude {altitude:g} m")
+
+    @classmethod
+    def sphere_of_influence_entry(cls, body, jd: float, terminal: bool = False):
+        # body is a RelationalTreeNode, whose parent defines the sphere
+        return cls(body, DISTANCE, body.sphere_of_influence(jd), -1, terminal,
+                   f"{body.name} SOI entry")
+
+    @classmethod
+    def sphere_of_influence_exit(cls, body, jd: float, terminal: bool = False):
+        return cls(body, DISTANCE, body.sphere_of_influence(jd), 1, terminal,
+                   f"{body.name} SOI exit")
+
+    @classmethod
+    def periapsis(cls, body: CelestialBody, terminal: bool = False):
+        return cls(body, RADIAL_VELOCITY, 0.0, 1, terminal, f"{body.name} periapsis")
+
+    @classmethod
+    def apoapsis(cls, body: CelestialBody, terminal: bool = False):
+        return cls(body, RADIAL_VELOCITY, 0.0, -1, terminal, f"{body.name} apoapsis")
+
+
+def standard_events(bodies: list, jd: float) -> "list[Event]":
+    '''
+    Returns the events of interest for flybys of the given bodies: a
+    terminal impact with each, and entry into and exit from the sphere of
+    influence of each body with a parent in the RelationalTree.
+
+    Parameters
+    ----------
+    bodies : list[RelationalTreeNode]
+        The bodies, e.g. RelationalTree.solar_system().all_bodies
+    jd : float
+        The Julian date at which to size the spheres of influence
+    '''
+    events = []
+    for body in bodies:
+        events.append(Event.impact(body))
+        if getattr(body, "parent", None) is not None:
+            events.append(Event.sphere_of_influence_entry(body, jd))
+            events.append(Event.sphere_of_influence_exit(body, jd))
+    return events
+
+
+def sphere_of_influence_tables(bodies: "list[CelestialBody]", jd: float) -> tuple:
+    '''
+    Packs the RelationalTree of the bodies for switching central bodies in
+    the native integrators (see integrators.integrate).
+
+    Parameters
+    ----------
+    bodies : list[CelestialBody]
+        The bodies of the stacked ephemeris tables. Those which are not
+        RelationalTreeNodes, or whose parent is not among them, have no
+        sphere of influence to leave.
+    jd : float
+        The Julian date at which to size the spheres of influence
+
+    Returns
+    -------
+    tuple
+        (parents, radii): the index of the parent of each body or -1, and
+        the radius of its sphere of influence or infinity, of shape (n_bodies,)
+    '''
+    ephemeris_ids = [body.ephemeris_id for body in bodies]
+
+    parents = np.full(len(bodies), -1, dtype=np.int64)
+    radii = np.full(len(bodies), np.inf)
+    for b, body in enumerate(bodies):
+        parent = getattr(body, "parent", None)
+        if parent is not None and parent.ephemeris_id in ephemeris_ids:
+            parents[b] = ephemeris_ids.index(parent.ephemeris_id)
+            radii[b] = body.sphere_of_influence(jd)
+
+    return parents, radii
+
+
+def event_tables(events: "list[Event]", bodies: "list[CelestialBody]") -> tuple:
+    '''
+    Packs events into arrays for the native integrators.
+
+    Parameters
+    ----------
+    events : list[Event]
+        The events to pack
+    bodies : list[CelestialBody]
+        The bodies of the stacked ephemeris tables, matched to the events'
+        bodies by ephemeris ID
+
+    Returns
+    -------
+    tuple
+        (kinds, body_indices, thresholds, directions, terminal), each of
+        shape (n_events,)
+    '''
+    indices = event_body_indices(events, bodies)
+
+    kinds = np.array([event.kind for event in events], dtype=np.int64)
+    thresholds = np.array([event.threshold for event in events], dtype=np.float64)
+    directions = np.array([event.direction for event in events], dtype=np.float64)
+    terminal = np.array([event.terminal for event in events], dtype=np.bool_)
+
+    return kinds, indices, thresholds, directions, terminal
+
+
+def event_body_indices(events: "list[Event]", bodies: "list[CelestialBody]") -> np.ndarray:
+    '''
+    Returns the index in bodies of each event's body, matched by ephemeris ID.
+    '''
+    ephemeris_ids = [body.ephemeris_id for body in bodies]
+
+    indices = np.empty(len(events), dtype=np.int64)
+    for e, event in enumerate(events):
+        if event.body.ephemeris_id is None or event.body.ephemeris_id not in ephemeris_ids:
+            raise ValueError(
+                f"{event.body.name} is not one of the interacting bodies, needed for {event.name}")
+        indices[e] = ephemeris_ids.index(event.body.ephemeris_id)
+    return indices
+
+
+@njit
+def event_value(kind: int, b: int, threshold: float, t_jd: float, u: np.ndarray, central: int,
+                jd_start: np.ndarray, jd_step: np.ndarray, n_records: np.ndarray,
+                n_coefficients: np.ndarray, coefficients: np.ndarray, mu: np.ndarray) -> float:
+    '''
+    Returns the value of an event function, which changes sign at the event.
+
+    Parameters
+    ----------
+    kind : int
+        DISTANCE or RADIAL_VELOCITY
+    b : int
+        The index of the body in the stacked ephemeris tables
+    threshold : float
+        The distance of DISTANCE events in meters
+    t_jd : float
+        The Julian date of the state
+    u : np.ndarray
+        The ICRS state of the spacecraft [x y z vx vy vz]
+    central : int
+        The index of the body u is relative to, see central_body_rates_into,
+        or -1 if it is barycentric
+    jd_start, jd_step, n_records, n_coefficients, coefficients, mu : np.ndarray
+        The stacked ephemeris tables.
+    '''
+    if kind == RADIAL_VELOCITY:
+        state = np.zeros(6)
+        if b != central:
+            state = chebyshev_numba(coefficients[b, :n_records[b], :, :n_coefficients[b]],
+                                    jd_start[b], jd_step[b], t_jd)
+            if central >= 0:
+                state -= chebyshev_numba(
+                    coefficients[central, :n_records[central], :, :n_coefficients[central]],
+                    jd_start[central], jd_step[central], t_jd)
+        value = 0.0
+        for c in range(3):
+            value += (u[c] - state[c]) * (u[3 + c] - state[3 + c])
+        return value
+
+    x = y = z = 0.0
+    if b != central:
+        x, y, z = body_position(b, t_jd, jd_start, jd_step, n_records, n_coefficients, coefficients)
+        if central >= 0:
+            x_c, y_c, z_c = body_position(central, t_jd, jd_start, jd_step,
+                                          n_records, n_coefficients, coefficients)
+            x, y, z = x - x_c, y - y_c, z - z_c
+    return np.sqrt((u[0] - x)**2 + (u[1] - y)**2 + (u[2] - z)**2) - threshold
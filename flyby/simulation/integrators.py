@@ -0,0 +1,922 @@
+'''
+Compiled integrators for the motion of a spacecraft under the gravity of a
+stacked ephemeris table (see stack_ephemeris_tables).
+
+The whole step loop, including the gravity evaluation, runs in nopython
+mode, so no step crosses back into the interpreter. Available methods:
+- DOP853: the explicit Runge-Kutta 8(5,3) of Dormand and Prince, with the
+  same coefficients, error norm and step size control as SciPy's DOP853,
+  and optionally the same dense output
+- RKF78: the Runge-Kutta-Fehlberg 7(8), propagating the 8th order solution
+- Yoshida4: the fixed step, 4th order symplectic integrator of Yoshida,
+  which conserves energy over long arcs rather than meeting a tolerance
+
+Events (see flyby.simulation.events) are checked after every step and
+located by stepping the integrator itself to trial times, so they are as
+accurate as the steps. The kernel advances by at most a given number of
+steps per call and returns where it stopped, so the caller can report
+progress between calls without changing the steps taken.
+'''
+from numba import njit
+import numpy as np
+from scipy.integrate import OdeSolution
+from scipy.integrate._ivp import dop853_coefficients
+from scipy.integrate._ivp.rk import Dop853DenseOutput
+from scipy.optimize import OptimizeResult
+
+from flyby.math_utilities.chebyshev_interpolator import chebyshev_many_numba, chebyshev_numba
+from flyby.simulation.events import DISTANCE, event_value
+from flyby.simulation.profiling import phases
+from flyby.spacecraft_model.gravity import central_body_rates_into, n_body_rates_into
+
+
+# Methods
+DOP853 = 0
+RKF78 = 1
+YOSHIDA4 = 2
+
+# Kernel status codes, those of solve_ivp and STEP_LIMIT
+FINISHED = 0
+TERMINATED = 1
+STEP_LIMIT = 2
+STEP_TOO_SMALL = -1
+
+# Step size control, as in scipy.integrate.RK45 and DOP853
+SAFETY = 0.9
+MIN_FACTOR = 0.2
+MAX_FACTOR = 10.0
+
+N_STAGES_DOP853 = dop853_coefficients.N_STAGES
+A_DOP853 = np.ascontiguousarray(dop853_coefficients.A[:N_STAGES_DOP853, :N_STAGES_DOP853])
+B_DOP853 = np.ascontiguousarray(dop853_coefficients.B)
+C_DOP853 = np.ascontiguousarray(dop853_coefficients.C[:N_STAGES_DOP853])
+E3_DOP853 = np.ascontiguousarray(dop853_coefficients.E3)
+E5_DOP853 = np.ascontiguousarray(dop853_coefficients.E5)
+# The extra stages and coefficients of the dense output
+N_STAGES_EXTENDED_DOP853 = dop853_coefficients.N_STAGES_EXTENDED
+A_EXTRA_DOP853 = np.ascontiguousarray(dop853_coefficients.A[N_STAGES_DOP853 + 1:])
+C_EXTRA_DOP853 = np.ascontiguousarray(dop853_coefficients.C[N_STAGES_DOP853 + 1:])
+D_DOP853 = np.ascontiguousarray(dop853_coefficients.D)
+INTERPOLATOR_POWER_DOP853 = dop853_coefficients.INTERPOLATOR_POWER
+
+# Fehlberg, Classical Fifth-, Sixth-, Seventh-, and Eighth-Order Runge-Kutta
+# Formulas with Stepsize Control, NASA TR R-287, Table X
+N_STAGES_RKF78 = 13
+A_RKF78 = np.zeros((N_STAGES_RKF78, N_STAGES_RKF78))
+A_RKF78[1, :1] = [2/27]
+A_RKF78[2, :2] = [1/36, 1/12]
+A_RKF78[3, :3] = [1/24, 0, 1/8]
+A_RKF78[4, :4] = [5/12, 0, -25/16, 25/16]
+A_RKF78[5, :5] = [1/20, 0, 0, 1/4, 1/5]
+A_RKF78[6, :6] = [-25/108, 0, 0, 125/108, -65/27, 125/54]
+A_RKF78[7, :7] = [31/300, 0, 0, 0, 61/225, -2/9, 13/900]
+A_RKF78[8, :8] = [2, 0, 0, -53/6, 704/45, -107/9, 67/90, 3]
+A_RKF78[9, :9] = [-91/108, 0, 0, 23/108, -976/135, 311/54, -19/60, 17/6, -1/12]
+A_RKF78[10, :10] = [2383/4100, 0, 0, -341/164, 4496/1025, -301/82, 2133/4100,
+                    45/82, 45/164, 18/41]
+A_RKF78[11, :11] = [3/205, 0, 0, 0, 0, -6/41, -3/205, -3/41, 3/41, 6/41, 0]
+A_RKF78[12, :12] = [-1777/4100, 0, 0, -341/164, 4496/1025, -289/82, 2193/4100,
+                    51/82, 33/164, 12/41, 0, 1]
+B_RKF78 = np.array([0, 0, 0, 0, 0, 34/105, 9/35, 9/35, 9/280, 9/280, 0, 41/840, 41/840])
+C_RKF78 = np.array([0, 2/27, 1/9, 1/6, 5/12, 1/2, 5/6, 1/6, 2/3, 1/3, 1, 0, 1])
+# Difference between the 7th and 8th order solutions
+E_RKF78 = np.array([41/840, 0, 0, 0, 0, 0, 0, 0, 0, 0, 41/840, -41/840, -41/840])
+
+# Yoshida, Construction of higher order symplectic integrators (1990)
+_W1 = 1 / (2 - 2**(1/3))
+_W0 = -2**(1/3) / (2 - 2**(1/3))
+DRIFT_YOSHIDA4 = np.array([_W1 / 2, (_W0 + _W1) / 2, (_W0 + _W1) / 2, _W1 / 2])
+KICK_YOSHIDA4 = np.array([_W1, _W0, _W1])
+
+
+@njit
+def _rates(rates: np.ndarray, t: float, u: np.ndarray, jd_0: float, central: int,
+           jd_start: np.ndarray, jd_step: np.ndarray, n_records: np.ndarray,
+           n_coefficients: np.ndarray, coefficients: np.ndarray, mu: np.ndarray):
+    # Time is in seconds since jd_0, as for Spacecraft.get_rates, and states
+    # are relative to the central body if there is one
+    if central < 0:
+        n_body_rates_into(rates, jd_0 + t / 86400, u, jd_start, jd_step,
+                          n_records, n_coefficients, coefficients, mu)
+    else:
+        central_body_rates_into(rates, jd_0 + t / 86400, u, central, jd_start, jd_step,
+                                n_records, n_coefficients, coefficients, mu)
+
+
+@njit
+def _rms_norm(x: np.ndarray) -> float:
+    return np.sqrt(np.sum(x * x) / x.shape[0])
+
+
+@njit
+def initial_step(t: float, y: np.ndarray, f: np.ndarray, t_end: float, max_step: float,
+                 order: int, rtol: float, atol: float, jd_0: float, central: int,
+                 jd_start: np.ndarray, jd_step: np.ndarray, n_records: np.ndarray,
+                 n_coefficients: np.ndarray, coefficients: np.ndarray, mu: np.ndarray) -> float:
+    '''
+    Empirically selects the size of the first step, as
+    scipy.integrate._ivp.common.select_initial_step. See Hairer, Norsett
+    and Wanner, Solving Ordinary Differential Equations I, Section II.4.
+    '''
+    interval_length = np.abs(t_end - t)
+    if interval_length == 0.0:
+        return 0.0
+    direction = 1.0 if t_end > t else -1.0
+
+    scale = atol + np.abs(y) * rtol
+    d0 = _rms_norm(y / scale)
+    d1 = _rms_norm(f / scale)
+    if d0 < 1e-5 or d1 < 1e-5:
+        h0 = 1e-6
+    else:
+        h0 = 0.01 * d0 / d1
+    h0 = min(h0, interval_length)
+
+    f1 = np.empty_like(f)
+    _rates(f1, t + h0 * direction, y + h0 * direction * f, jd_0, central, jd_start, jd_step,
+           n_records, n_coefficients, coefficients, mu)
+    d2 = _rms_norm((f1 - f) / scale) / h0
+
+    if d1 <= 1e-15 and d2 <= 1e-15:
+        h1 = max(1e-6, h0 * 1e-3)
+    else:
+        h1 = (0.01 / max(d1, d2)) ** (1 / (order + 1))
+
+    return min(100 * h0, h1, interval_length, max_step)
+
+
+@njit
+def _rk_step(method: int, t: float, y: np.ndarray, h: float, K: np.ndarray, y_new: np.ndarray,
+             y_stage: np.ndarray, jd_0: float, central: int, jd_start: np.ndarray,
+             jd_step: np.ndarray, n_records: np.ndarray, n_coefficients: np.ndarray,
+             coefficients: np.ndarray, mu: np.ndarray):
+    # One step of an embedded pair from (t, y), following
+    # scipy.integrate._ivp.rk.rk_step. K[0] must hold the rates at (t, y);
+    # the other stages and the rates at (t + h, y_new) are written to K.
+    if method == DOP853:
+        A, B, C = A_DOP853, B_DOP853, C_DOP853
+        n_stages = N_STAGES_DOP853
+    else:
+        A, B, C = A_RKF78, B_RKF78, C_RKF78
+        n_stages = N_STAGES_RKF78
+    n_y = y.shape[0]
+
+    for s in range(1, n_stages):
+        for k in range(n_y):
+            dy = 0.0
+            for j in range(s):
+                dy += A[s, j] * K[j, k]
+            y_stage[k] = y[k] + h * dy
+        _rates(K[s], t + C[s] * h, y_stage, jd_0, central, jd_start, jd_step,
+               n_records, n_coefficients, coefficients, mu)
+
+    for k in range(n_y):
+        dy = 0.0
+        for j in range(B.shape[0]):
+            dy += B[j] * K[j, k]
+        y_new[k] = y[k] + h * dy
+
+    _rates(K[n_stages], t + h, y_new, jd_0, central, jd_start, jd_step,
+           n_records, n_coefficients, coefficients, mu)
+
+
+@njit
+def _dop853_dense_output(t: float, y: np.ndarray, h: float, y_new: np.ndarray, K: np.ndarray,
+                         F: np.ndarray, y_stage: np.ndarray, jd_0: float, central: int,
+                         jd_start: np.ndarray, jd_step: np.ndarray, n_records: np.ndarray,
+                         n_coefficients: np.ndarray, coefficients: np.ndarray, mu: np.ndarray):
+    # The interpolant of a DOP853 step from (t, y) to y_new, written to F as
+    # by scipy.integrate.DOP853._dense_output_impl. K must hold the stages of
+    # the step and has room for the extra stages.
+    n_y = y.shape[0]
+
+    for s in range(N_STAGES_DOP853 + 1, N_STAGES_EXTENDED_DOP853):
+        a = A_EXTRA_DOP853[s - N_STAGES_DOP853 - 1]
+        for k in range(n_y):
+            dy = 0.0
+            for j in range(s):
+                dy += a[j] * K[j, k]
+            y_stage[k] = y[k] + h * dy
+        _rates(K[s], t + C_EXTRA_DOP853[s - N_STAGES_DOP853 - 1] * h, y_stage, jd_0, central,
+               jd_start, jd_step, n_records, n_coefficients, coefficients, mu)
+
+    for k in range(n_y):
+        delta_y = y_new[k] - y[k]
+        F[0, k] = delta_y
+        F[1, k] = h * K[0, k] - delta_y
+        F[2, k] = 2 * delta_y - h * (K[N_STAGES_DOP853, k] + K[0, k])
+        for i in range(INTERPOLATOR_POWER_DOP853 - 3):
+            dy = 0.0
+            for j in range(N_STAGES_EXTENDED_DOP853):
+                dy += D_DOP853[i, j] * K[j, k]
+            F[3 + i, k] = h * dy
+
+
+@njit
+def _error_norm(method: int, h: float, y: np.ndarray, y_new: np.ndarray, K: np.ndarray,
+                rtol: float, atol: float) -> float:
+    # Scaled RMS norm of the local error estimate, as in scipy.integrate
+    n_y = y.shape[0]
+
+    if method == DOP853:
+        error_5 = 0.0
+        error_3 = 0.0
+        for k in range(n_y):
+            scale = atol + max(np.abs(y[k]), np.abs(y_new[k])) * rtol
+            e5 = 0.0
+            e3 = 0.0
+            for j in range(N_STAGES_DOP853 + 1):
+                e5 += E5_DOP853[j] * K[j, k]
+                e3 += E3_DOP853[j] * K[j, k]
+            error_5 += (e5 / scale)**2
+            error_3 += (e3 / scale)**2
+
+        if error_5 == 0 and error_3 == 0:
+            return 0.0
+        return np.abs(h) * error_5 / np.sqrt((error_5 + 0.01 * error_3) * n_y)
+
+    error = 0.0
+    for k in range(n_y):
+        scale = atol + max(np.abs(y[k]), np.abs(y_new[k])) * rtol
+        e = 0.0
+        for j in range(N_STAGES_RKF78):
+            e += E_RKF78[j] * K[j, k]
+        error += (h * e / scale)**2
+    return np.sqrt(error / n_y)
+
+
+@njit
+def _yoshida4_step(t: float, y: np.ndarray, h: float, y_new: np.ndarray, a: np.ndarray,
+                   jd_0: float, central: int, jd_start: np.ndarray, jd_step: np.ndarray,
+                   n_records: np.ndarray, n_coefficients: np.ndarray,
+                   coefficients: np.ndarray, mu: np.ndarray):
+    # Time is drifted along with the position, so that the ephemeris is
+    # sampled at consistent epochs
+    y_new[:] = y
+    t_stage = t
+    for stage in range(4):
+        c = DRIFT_YOSHIDA4[stage] * h
+        y_new[0] += c * y_new[3]
+        y_new[1] += c * y_new[4]
+        y_new[2] += c * y_new[5]
+        t_stage += c
+
+        if stage < 3:
+            _rates(a, t_stage, y_new, jd_0, central, jd_start, jd_step,
+                   n_records, n_coefficients, coefficients, mu)
+            d = KICK_YOSHIDA4[stage] * h
+            y_new[3] += d * a[3]
+            y_new[4] += d * a[4]
+            y_new[5] += d * a[5]
+
+
+@njit
+def _step(method: int, t: float, y: np.ndarray, h: float, K: np.ndarray, y_new: np.ndarray,
+          y_stage: np.ndarray, jd_0: float, central: int, jd_start: np.ndarray, jd_step: np.ndarray,
+          n_records: np.ndarray, n_coefficients: np.ndarray,
+          coefficients: np.ndarray, mu: np.ndarray) -> int:
+    # A single step of any method, returning the number of evaluations
+    if method == YOSHIDA4:
+        _yoshida4_step(t, y, h, y_new, y_stage, jd_0, central, jd_start, jd_step,
+                       n_records, n_coefficients, coefficients, mu)
+        return 3
+
+    _rk_step(method, t, y, h, K, y_new, y_stage, jd_0, central, jd_start, jd_step,
+             n_records, n_coefficients, coefficients, mu)
+    return N_STAGES_DOP853 if method == DOP853 else N_STAGES_RKF78
+
+
+@njit
+def _event_values(t: float, y: np.ndarray, g: np.ndarray, kinds: np.ndarray,
+                  bodies: np.ndarray, thresholds: np.ndarray, jd_0: float, central: int,
+                  jd_start: np.ndarray, jd_step: np.ndarray, n_records: np.ndarray,
+                  n_coefficients: np.ndarray, coefficients: np.ndarray, mu: np.ndarray):
+    for e in range(kinds.shape[0]):
+        g[e] = event_value(kinds[e], bodies[e], thresholds[e], jd_0 + t / 86400, y, central,
+                           jd_start, jd_step, n_records, n_coefficients, coefficients, mu)
+
+
+@njit
+def _locate_event(method: int, e: int, t: float, y: np.ndarray, t_new: float, g_old: float,
+                  g_new: float, K: np.ndarray, y_event: np.ndarray, y_stage: np.ndarray,
+                  kinds: np.ndarray, bodies: np.ndarray, thresholds: np.ndarray,
+                  jd_0: float, central: int, jd_start: np.ndarray, jd_step: np.ndarray,
+                  n_records: np.ndarray, n_coefficients: np.ndarray,
+                  coefficients: np.ndarray, mu: np.ndarray):
+    # Finds the time of event e within the step from t to t_new by the
+    # Illinois method, taking a step of the integrator from (t, y) to each
+    # trial time. K[0] must hold the rates at (t, y). Returns the time, the
+    # number of evaluations of the rates and that of the event function, and
+    # writes the state to y_event.
+    xtol = 4 * np.finfo(np.float64).eps * max(np.abs(t), np.abs(t_new))
+    a, b = t, t_new
+    g_a, g_b = g_old, g_new
+    t_event = t_new
+    y_event[:] = np.nan
+    side = 0
+    n_evaluations = 0
+    n_trials = 0
+
+    for _ in range(100):
+        if g_a == g_b:
+            break
+        c = (a * g_b - b * g_a) / (g_b - g_a)
+        if not min(a, b) < c < max(a, b):
+            c = (a + b) / 2
+
+        n_evaluations += _step(method, t, y, c - t, K, y_event, y_stage, jd_0, central,
+                               jd_start, jd_step, n_records, n_coefficients, coefficients, mu)
+        g_c = event_value(kinds[e], bodies[e], thresholds[e], jd_0 + c / 86400, y_event, central,
+                          jd_start, jd_step, n_records, n_coefficients, coefficients, mu)
+        t_event = c
+        n_trials += 1
+
+        if g_c == 0:
+            break
+        if (g_c > 0) == (g_b > 0):
+            b, g_b = c, g_c
+            if side == -1:
+                g_a /= 2
+            side = -1
+        else:
+            a, g_a = c, g_c
+            if side == 1:
+                g_b /= 2
+            side = 1
+
+        if np.abs(b - a) <= xtol:
+            break
+
+    return t_event, n_evaluations, n_trials
+
+
+@njit
+def integrate_numba(method: int, t: float, y: np.ndarray, t_end: float, h_abs: float,
+                    rtol: float, atol: float, max_step: float, max_steps: int,
+                    dense_output: bool, kinds: np.ndarray, bodies: np.ndarray, thresholds: np.ndarray,
+                    directions: np.ndarray, terminal: np.ndarray, jd_0: float, central: int,
+                    jd_start: np.ndarray, jd_step: np.ndarray, n_records: np.ndarray,
+                    n_coefficients: np.ndarray, coefficients: np.ndarray, mu: np.ndarray):
+    '''
+    Integrates from t towards t_end, taking at most max_steps steps and
+    returning early after a step in which events occur.
+
+    The adaptive methods follow scipy.integrate._ivp.rk.RungeKutta._step_impl.
+    Events are located as by solve_ivp: a sign change of an event function
+    between the ends of a step, in its direction, is an occurrence, and the
+    integration stops at the first occurrence of a terminal event.
+
+    Parameters
+    ----------
+    method : int
+        DOP853, RKF78 or YOSHIDA4
+    t : float
+        The initial time in seconds since jd_0
+    y : np.ndarray
+        The initial state, of shape (6,); overwritten with the final state
+    t_end : float
+        The time to integrate to in seconds since jd_0
+    h_abs : float
+        The size of the first step, or 0 to select it automatically; the
+        fixed step size of YOSHIDA4
+    rtol, atol : float
+        The relative and absolute tolerances of the adaptive methods
+    max_step : float
+        The maximum step size of the adaptive methods
+    max_steps : int
+        The maximum number of steps to take in this call
+    dense_output : bool
+        Whether to return the interpolants of the steps of DOP853, at the
+        cost of 3 evaluations per step
+    kinds, bodies, thresholds, directions, terminal : np.ndarray
+        The events, see event_tables
+    jd_0 : float
+        The Julian date at t = 0
+    central : int
+        The index of the body the states are relative to, integrating with
+        central_body_rates_into, or -1 to integrate barycentric states
+    jd_start, jd_step, n_records, n_coefficients, coefficients, mu : np.ndarray
+        The stacked ephemeris tables.
+
+    Returns
+    -------
+    tuple
+        (t, y, F, h_abs, n_evaluations, status, event_index, event_t, event_y,
+        n_rejected, event_evaluations): the times and states of the accepted
+        steps of shape (n,) and (n, 6), their interpolants as those of
+        scipy's Dop853DenseOutput of shape (n, 7, 6), or (0, 7, 6) without
+        dense output, the size of the next step, the number of evaluations
+        of the rates, FINISHED, TERMINATED, STEP_LIMIT or STEP_TOO_SMALL, the
+        index, time and state of the events which occurred, in order, the
+        number of rejected steps and the number of evaluations of each event
+        function.
+    '''
+    n_stages = N_STAGES_DOP853 if method == DOP853 else N_STAGES_RKF78
+    error_exponent = -1 / 8
+
+    direction = 1.0 if t_end >= t else -1.0
+    n_y = y.shape[0]
+    n_events = kinds.shape[0]
+
+    dense_output = dense_output and method == DOP853
+
+    # The rates at the start of the step are kept in K[0]
+    K = np.empty((N_STAGES_EXTENDED_DOP853 if dense_output else n_stages + 1, n_y))
+    K_event = np.empty((n_stages + 1, n_y))
+    n_evaluations = 0
+    if method != YOSHIDA4:
+        _rates(K[0], t, y, jd_0, central, jd_start, jd_step, n_records, n_coefficients,
+               coefficients, mu)
+        n_evaluations += 1
+
+        if h_abs <= 0:
+            h_abs = initial_step(t, y, K[0], t_end, max_step, 7, rtol, atol, jd_0, central,
+                                 jd_start, jd_step, n_records, n_coefficients, coefficients, mu)
+            n_evaluations += 1
+
+    t_out = np.empty(max_steps)
+    y_out = np.empty((max_steps, n_y))
+    F_out = np.empty((max_steps if dense_output else 0, INTERPOLATOR_POWER_DOP853, n_y))
+    n_out = 0
+    status = STEP_LIMIT
+
+    y_new = np.empty(n_y)
+    y_stage = np.empty(n_y)
+
+    g = np.empty(n_events)
+    g_new = np.empty(n_events)
+    _event_values(t, y, g, kinds, bodies, thresholds, jd_0, central, jd_start, jd_step,
+                  n_records, n_coefficients, coefficients, mu)
+    event_evaluations = np.ones(n_events, dtype=np.int64)
+    n_rejected = 0
+    event_index = np.empty(n_events, dtype=np.int64)
+    event_t = np.empty(n_events)
+    event_y = np.empty((n_events, n_y))
+    n_found = 0
+
+    while n_out < max_steps and n_found == 0:
+        if direction * (t - t_end) >= 0:
+            status = FINISHED
+            break
+
+        if method == YOSHIDA4:
+            if np.abs(t_end - t) <= h_abs:
+                t_new = t_end
+            else:
+                t_new = t + h_abs * direction
+            _yoshida4_step(t, y, t_new - t, y_new, y_stage, jd_0, central, jd_start, jd_step,
+                           n_records, n_coefficients, coefficients, mu)
+            n_evaluations += 3
+        else:
+            min_step = 10 * np.abs(np.nextafter(t, direction * np.inf) - t)
+            h_abs = min(max(h_abs, min_step), max_step)
+
+            step_accepted = False
+            step_rejected = False
+
+            while not step_accepted:
+                if h_abs < min_step:
+                    break
+
+                t_new = t + h_abs * direction
+                if direction * (t_new - t_end) > 0:
+                    t_new = t_end
+                h = t_new - t
+                h_abs = np.abs(h)
+
+                _rk_step(method, t, y, h, K, y_new, y_stage, jd_0, central, jd_start, jd_step,
+                         n_records, n_coefficients, coefficients, mu)
+                n_evaluations += n_stages
+                error_norm = _error_norm(method, h, y, y_new, K, rtol, atol)
+
+                if error_norm < 1:
+                    if error_norm == 0:
+                        factor = MAX_FACTOR
+                    else:
+                        factor = min(MAX_FACTOR, SAFETY * error_norm**error_exponent)
+                    if step_rejected:
+                        factor = min(1.0, factor)
+                    h_abs *= factor
+                    step_accepted = True
+                else:
+                    h_abs *= max(MIN_FACTOR, SAFETY * error_norm**error_exponent)
+                    step_rejected = True
+                    n_rejected += 1
+
+            if not step_accepted:
+                status = STEP_TOO_SMALL
+                break
+
+            if dense_output:
+                _dop853_dense_output(t, y, h, y_new, K, F_out[n_out], y_stage, jd_0, central,
+                                     jd_start, jd_step, n_records, n_coefficients,
+                                     coefficients, mu)
+                n_evaluations += 3
+
+        if n_events > 0:
+            _event_values(t_new, y_new, g_new, kinds, bodies, thresholds, jd_0, central, jd_start,
+                          jd_step, n_records, n_coefficients, coefficients, mu)
+            event_evaluations += 1
+
+            for e in range(n_events):
+                up = g[e] <= 0 and g_new[e] >= 0
+                down = g[e] >= 0 and g_new[e] <= 0
+                if g[e] == g_new[e] or not (
+                        (up and directions[e] >= 0) or (down and directions[e] <= 0)):
+                    continue
+
+                K_event[0] = K[0]
+                t_event, n, n_trials = _locate_event(
+                    method, e, t, y, t_new, g[e], g_new[e], K_event, event_y[n_found], y_stage,
+                    kinds, bodies, thresholds, jd_0, central, jd_start, jd_step, n_records,
+                    n_coefficients, coefficients, mu)
+                n_evaluations += n
+                event_evaluations[e] += n_trials
+
+                event_index[n_found] = e
+                event_t[n_found] = t_event
+                n_found += 1
+
+            # Sort in order of occurrence
+            for j in range(1, n_found):
+                k = j
+                while k > 0 and direction * (event_t[k - 1] - event_t[k]) > 0:
+                    event_index[k - 1], event_index[k] = event_index[k], event_index[k - 1]
+                    event_t[k - 1], event_t[k] = event_t[k], event_t[k - 1]
+                    y_stage[:] = event_y[k]
+                    event_y[k] = event_y[k - 1]
+                    event_y[k - 1] = y_stage
+                    k -= 1
+
+            # Drop the events after the first terminal one, and stop there
+            for j in range(n_found):
+                if terminal[event_index[j]]:
+                    n_found = j + 1
+                    t_new = event_t[j]
+                    y_new[:] = event_y[j]
+                    status = TERMINATED
+                    break
+
+            # Interpolate the step up to the terminal event instead
+            if status == TERMINATED and dense_output:
+                _rk_step(method, t, y, t_new - t, K, y_new, y_stage, jd_0, central, jd_start,
+                         jd_step, n_records, n_coefficients, coefficients, mu)
+                _dop853_dense_output(t, y, t_new - t, y_new, K, F_out[n_out], y_stage, jd_0,
+                                     central, jd_start, jd_step, n_records, n_coefficients,
+                                     coefficients, mu)
+                n_evaluations += n_stages + 3
+
+        t = t_new
+        y[:] = y_new
+        g[:] = g_new
+        if method != YOSHIDA4:
+            if status == TERMINATED:
+                _rates(K[0], t, y, jd_0, central, jd_start, jd_step,
+                       n_records, n_coefficients, coefficients, mu)
+            else:
+                K[0] = K[n_stages]
+
+        t_out[n_out] = t
+        y_out[n_out] = y
+        n_out += 1
+
+        if status == TERMINATED:
+            break
+
+    if status == STEP_LIMIT and direction * (t - t_end) >= 0:
+        status = FINISHED
+
+    return (t_out[:n_out], y_out[:n_out], F_out[:n_out], h_abs, n_evaluations, status,
+            event_index[:n_found], event_t[:n_found], event_y[:n_found], n_rejected,
+            event_evaluations)
+
+
+METHODS = ("DOP853", "RKF78", "Yoshida4")
+
+
+def integrate(tables: tuple, jd_0: float, y0: np.ndarray, duration: float,
+              method: str = "DOP853", rtol: float = 1e-8, atol: float = 1e-8,
+              step: float = None, max_step: float = np.inf, events: tuple = None,
+              steps_per_call: int = 10000, progress=None,
+              dense_output: bool = False, output=None, checkpoint=None,
+              resume: dict = None, force_model=None, segment: float = 86400.0,
+              central: int = -1, switching: tuple = None, profile=None) -> OptimizeResult:
+    '''
+    Integrates the motion of a spacecraft with a compiled integrator.
+
+    Parameters
+    ----------
+    tables : tuple
+        The stacked ephemeris tables, see stack_ephemeris_tables.
+    jd_0 : float
+        The Julian date of the initial state.
+    y0 : np.ndarray
+        The initial ICRS state, [x, y, z, vx, vy, vz] in [m, m, m, m/s, m/s, m/s].
+    duration : float
+        The time to integrate for in seconds; may be negative.
+    method : str, optional
+        One of METHODS, by default "DOP853"
+    rtol, atol : float, optional
+        The tolerances of the adaptive methods, by default 1e-8
+    step : float, optional
+        The step size of Yoshida4 in seconds, required for it.
+    max_step : float, optional
+        The maximum step size of the adaptive methods, by default unbounded
+    events : tuple, optional
+        The events to locate, as packed by event_tables.
+    steps_per_call : int, optional
+        The number of steps taken between calls to progress, by default 10000
+    progress : callable, optional
+        Called with the current time, the number of steps taken and the
+        number of evaluations of the rates in this call after every
+        steps_per_call steps, e.g. ProgressMonitor.update.
+    dense_output : bool, optional
+        Whether to return the interpolants of the steps as sol, as solve_ivp
+        does. Only DOP853 has them, for barycentric states; by default False
+    output : callable, optional
+        Called with the times and states of shape (n, 6) of the steps, from
+        the initial state on, after every steps_per_call steps, e.g. the
+        append of a TrajectoryWriter. The steps are then not kept, and t
+        and y only hold the initial and final states.
+    checkpoint : callable, optional
+        Called with the state of the integration, a dict of arrays, after
+        every steps_per_call steps, e.g. to save it with the checkpoint
+        module.
+    resume : dict, optional
+        A state passed to checkpoint by an earlier integration with the same
+        arguments, to continue from. The steps taken are identical to those
+        of an uninterrupted integration, as the kernel is restarted between
+        calls either way.
+    force_model : callable, optional
+        Called with the time and state at the start of every segment,
+        returning the stacked ephemeris tables to integrate the segment
+        with instead of tables, e.g. those of AdaptiveForceModel.tables.
+    segment : float, optional
+        The length of the segments of force_model in seconds, each ending on
+        a step; by default 86400
+    central : int, optional
+        The index of the body in the tables to integrate the state relative
+        to, see central_body_rates_into, or -1 to integrate the barycentric
+        state. Its interpolant must be at least quadratic, e.g. not a lerp.
+        The states passed in and returned are barycentric either way.
+    switching : tuple, optional
+        (parents, radii) as packed by sphere_of_influence_tables, to switch
+        the central body whenever the spacecraft leaves its sphere of
+        influence, for its parent, or enters that of one of its children.
+        The integrator restarts at every switch.
+    profile : Profile, optional
+        The profile to count the steps and evaluations in and to time the
+        kernel, force model, output and checkpoint phases in, see profiling.
+
+    Returns
+    -------
+    OptimizeResult
+        The solution with the same fields as that of solve_ivp: t, y of
+        shape (6, n), sol, t_events and y_events if there are events, nfev,
+        status, message and success. frames lists the time from which each
+        central body was used and its index, -1 for the barycentre. With
+        a profile, nlookups holds the interpolant lookups of each body.
+    '''
+    if method not in METHODS:
+        raise ValueError(f"Unknown integration method {method}, expected one of {METHODS}")
+    if method == "Yoshida4" and (step is None or step <= 0):
+        raise ValueError("Yoshida4 needs a positive step size")
+    if switching is not None and central < 0:
+        raise ValueError("Switching central bodies needs an initial central body")
+    if dense_output and central >= 0:
+        raise ValueError("Dense output is only available for barycentric states")
+
+    if events is None:
+        events = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0),
+                  np.empty(0), np.empty(0, dtype=np.bool_))
+        event_list = None
+    else:
+        event_list = [[] for _ in events[0]]
+    n_events = len(events[0])
+
+    tables = tuple(np.require(table, requirements="C") for table in tables)
+    centrals = [central]
+    if switching is not None:
+        parents = switching[0]
+        centrals = np.flatnonzero((parents >= 0) | np.isin(np.arange(len(parents)), parents))
+    if any(b >= 0 and tables[3][b] < 3 for b in centrals):
+        raise ValueError("Central bodies need interpolants of at least second degree")
+
+    y = np.require(y0, dtype=np.float64, requirements="CW").copy()
+    t = 0.0
+    h_abs = step if method == "Yoshida4" else 0.0
+
+    t_chunks = [np.array([t])]
+    y_chunks = [y[np.newaxis, :].copy()]
+    F_chunks = []
+    first = last = (t_chunks[0], y_chunks[0])
+    n_evaluations = n_steps = 0
+    status = STEP_LIMIT
+
+    if resume is None:
+        y -= _body_states(tables, central, jd_0, t)
+        frames = [(t, central)]
+        t_switch = np.nan
+    else:
+        t, h_abs, n_evaluations = float(resume["t"]), float(resume["h_abs"]), int(resume["nfev"])
+        y = np.array(resume["y"], dtype=np.float64)
+        central, t_switch = int(resume["central"]), float(resume["t_switch"])
+        frames = list(zip(resume["frames_t"], resume["frames_central"]))
+        t_chunks, y_chunks = [resume["steps_t"]], [resume["steps_y"]]
+        F_chunks = [resume["F"].reshape(-1, INTERPOLATOR_POWER_DOP853, 6)]
+        if output is not None:
+            t_chunks, y_chunks = [], []
+            last = (np.array([t]), (y + _body_states(tables, central, jd_0, t))[np.newaxis, :])
+        for e, t_event, y_event in zip(resume["event_index"], resume["event_t"], resume["event_y"]):
+            event_list[e].append((t_event, y_event))
+
+    n_resumed = n_evaluations
+
+    direction = 1.0 if duration >= 0 else -1.0
+    segment_end = t
+    segment_tables = tables
+
+    phase = phases(profile)
+    lookups = np.zeros(len(tables[5]), dtype=np.int64) if profile is not None else None
+
+    while status == STEP_LIMIT:
+        t_end = duration
+        if force_model is not None:
+            if direction * (t - segment_end) >= 0:
+                with phase("force model"):
+                    segment_tables = tuple(
+                        np.require(table, requirements="C")
+                        for table in force_model(t, y + _body_states(tables, central, jd_0, t)))
+                segment_end = t + direction * min(segment, abs(duration - t))
+            t_end = segment_end
+
+        # The sphere of influence crossings which switch the central body
+        # follow the caller's events
+        call_events, targets = events, None
+        if switching is not None:
+            call_events, targets = _switching_events(events, central, *switching)
+
+        with phase("kernel"):
+            (t_chunk, y_chunk, F_chunk, h_abs, n, status, event_index, event_t, event_y,
+             n_rejected, event_evaluations) = integrate_numba(
+                METHODS.index(method), t, y, t_end, h_abs, rtol, atol, max_step,
+                steps_per_call, dense_output, *call_events, jd_0, central, *segment_tables)
+
+        if profile is not None:
+            profile.count("rates_evaluations", n)
+            profile.count("steps_accepted", len(t_chunk))
+            profile.count("steps_rejected", n_rejected)
+            profile.count("event_evaluations", event_evaluations.sum())
+            lookups += _kernel_lookups(segment_tables[5], central, n, call_events[1],
+                                       event_evaluations)
+
+        # Carry on past the end of a segment
+        if status == FINISHED and direction * (duration - t_end) > 0:
+            status = STEP_LIMIT
+
+        if central >= 0:
+            y_chunk = y_chunk + _body_states(tables, central, jd_0, t_chunk)
+            event_y = event_y + _body_states(tables, central, jd_0, event_t)
+
+        n_evaluations += n
+        n_steps += len(t_chunk)
+        if output is not None:
+            with phase("output"):
+                output(np.concatenate(t_chunks + [t_chunk]),
+                       np.concatenate(y_chunks + [y_chunk]))
+            t_chunks, y_chunks = [], []
+            if len(t_chunk):
+                last = (t_chunk[-1:], y_chunk[-1:])
+        else:
+            t_chunks.append(t_chunk)
+            y_chunks.append(y_chunk)
+        F_chunks.append(F_chunk)
+        if len(t_chunk):
+            t = t_chunk[-1]
+
+        for e, t_event, y_event in zip(event_index, event_t, event_y):
+            # The occurrences at a switch are found again from its other
+            # side, up to the tolerance of their location
+            duplicate = np.abs(t_event - t_switch) <= 8 * np.finfo(np.float64).eps * max(
+                np.abs(t_switch), 1.0)
+            if e < n_events and not duplicate:
+                event_list[e].append((t_event, y_event))
+
+        # Restart relative to the next central body, unless it is the end
+        if status == TERMINATED and event_index[-1] >= n_events:
+            y_barycentric = y + _body_states(tables, central, jd_0, t)
+            central = targets[event_index[-1] - n_events]
+            y = y_barycentric - _body_states(tables, central, jd_0, t)
+            frames.append((t, central))
+            t_switch = t
+            if method != "Yoshida4":
+                h_abs = 0.0
+            status = STEP_LIMIT if direction * (duration - t) > 0 else FINISHED
+
+        if progress is not None:
+            progress(t, n_steps, n_evaluations - n_resumed)
+
+        if checkpoint is not None and status == STEP_LIMIT:
+            with phase("checkpoint"):
+                occurrences = [(e, t_event, y_event)
+                               for e, occurrences in enumerate(event_list or [])
+                               for t_event, y_event in occurrences]
+                checkpoint({
+                    "t": t, "y": y.copy(), "central": central, "h_abs": h_abs,
+                    "nfev": n_evaluations,
+                    "frames_t": np.array([t_frame for t_frame, _ in frames]),
+                    "frames_central": np.array([b for _, b in frames], dtype=np.int64),
+                    "t_switch": t_switch,
+                    "steps_t": np.concatenate(t_chunks) if t_chunks else np.empty(0),
+                    "steps_y": np.concatenate(y_chunks) if y_chunks else np.empty((0, 6)),
+                    "F": np.concatenate(F_chunks),
+                    "event_index": np.array([e for e, _, _ in occurrences], dtype=np.int64),
+                    "event_t": np.array([t_event for _, t_event, _ in occurrences]),
+                    "event_y": np.array([y_event for _, _, y_event in occurrences]
+                                        ).reshape(-1, 6),
+                })
+
+    if status == FINISHED:
+        message = "The solver successfully reached the end of the integration interval."
+    elif status == TERMINATED:
+        message = "A termination event occurred."
+    else:
+        message = "Required step size is less than spacing between numbers."
+
+    if event_list is None:
+        t_events = y_events = None
+    else:
+        t_events = [np.array([t for t, _ in occurrences]) for occurrences in event_list]
+        y_events = [np.array([y for _, y in occurrences]).reshape(-1, 6)
+                    for occurrences in event_list]
+
+    if output is not None:
+        t_chunks, y_chunks = zip(*((first, last) if last is not first else (first,)))
+    t, y = np.concatenate(t_chunks), np.concatenate(y_chunks).T
+
+    sol = None
+    if dense_output and method == "DOP853" and output is None and len(t) > 1:
+        F = np.concatenate(F_chunks)
+        sol = OdeSolution(t, [Dop853DenseOutput(t[k], t[k + 1], y[:, k], F[k])
+                              for k in range(len(F))])
+
+    return OptimizeResult(t=t, y=y, sol=sol, t_events=t_events, y_events=y_events, nfev=n_evaluations,
+                          njev=0, nlu=0, status=status, message=message,
+                          success=status >= 0, frames=frames, nlookups=lookups)
+
+
+def _kernel_lookups(mu: np.ndarray, central: int, n_evaluations: int, bodies: np.ndarray,
+                    event_evaluations: np.ndarray) -> np.ndarray:
+    # The interpolant lookups of each body in a call of integrate_numba, from
+    # its evaluations of the rates and of the event functions of bodies
+    lookups = np.where(mu != 0, n_evaluations, 0)
+    if central >= 0:
+        # Its position and acceleration
+        lookups[central] = 2 * n_evaluations
+
+    others = bodies != central
+    np.add.at(lookups, bodies[others], event_evaluations[others])
+    if central >= 0:
+        lookups[central] += event_evaluations[others].sum()
+    return lookups
+
+
+def _body_states(tables: tuple, b: int, jd_0: float, t) -> np.ndarray:
+    # The states of body b of the stacked tables at times in seconds since
+    # jd_0, of shape (6,) or (n, 6), or zeros for b = -1
+    if b < 0:
+        return np.zeros(np.shape(t) + (6,))
+
+    jd_start, jd_step, n_records, n_coefficients, coefficients, _ = tables
+    records = coefficients[b, :n_records[b], :, :n_coefficients[b]]
+    if np.ndim(t) == 0:
+        return chebyshev_numba(records, jd_start[b], jd_step[b], jd_0 + t / 86400)
+    return chebyshev_many_numba(records, jd_start[b], jd_step[b],
+                                np.ascontiguousarray(jd_0 + np.asarray(t) / 86400))
+
+
+def _switching_events(events: tuple, central: int, parents: np.ndarray,
+                      radii: np.ndarray) -> "tuple[tuple, np.ndarray]":
+    # Appends terminal events for leaving the sphere of influence of the
+    # central body and entering those of its children to packed events,
+    # returning them and the body to switch to at each
+    bodies, thresholds, directions, targets = [], [], [], []
+    if parents[central] >= 0:
+        bodies.append(central)
+        thresholds.append(radii[central])
+        directions.append(1.0)
+        targets.append(parents[central])
+    for child in np.flatnonzero(parents == central):
+        bodies.append(child)
+        thresholds.append(radii[child])
+        directions.append(-1.0)
+        targets.append(child)
+
+    n = len(bodies)
+    switching = (np.full(n, DISTANCE, dtype=np.int64), np.array(bodies, dtype=np.int64),
+                 np.array(thresholds, dtype=np.float64), np.array(directions),
+                 np.ones(n, dtype=np.bool_))
+    return (tuple(np.concatenate((a, b)) for a, b in zip(events, switching)),
+            np.array(targets, dtype=np.int64))
+
+
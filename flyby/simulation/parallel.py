@@ -0,0 +1,141 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+import os
+
+import numpy as np
+from scipy.integrate import solve_ivp
+from tqdm import tqdm
+
+from flyby.spacecraft_model.gravity import n_body_rates, stack_ephemeris_tables
+from flyby.spacecraft_model.spacecraft import Spacecraft
+from flyby.time_model.julian_day import datetime64_to_jd
+
+
+class SharedEphemerisTables:
+    '''
+    Stacked ephemeris tables (see stack_ephemeris_tables) copied into shared
+    memory, so that worker processes can use them without rebuilding the
+    interpolants or reading the ephemeris file.
+
+    The process which creates the tables owns the shared memory and must
+    call close() (or use the tables as a context manager) to release it.
+    '''
+
+    def __init__(self, tables: tuple):
+        self.blocks: "list[SharedMemory]" = []
+        self.descriptor: "list[tuple]" = []
+
+        for array in tables:
+            block = SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+
+            self.blocks.append(block)
+            self.descriptor.append((block.name, array.shape, array.dtype.str))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+    @staticmethod
+    def attach(descriptor: "list[tuple]") -> "tuple[tuple, list[SharedMemory]]":
+        '''
+        Maps the tables described by a descriptor into this process.
+
+        Returns the tables and the shared memory blocks backing them, which
+        must be kept alive for as long as the tables are used.
+        '''
+        blocks = [SharedMemory(name=name) for name, _, _ in descriptor]
+        tables = tuple(np.ndarray(shape, np.dtype(dtype), buffer=block.buf)
+                       for block, (_, shape, dtype) in zip(blocks, descriptor))
+        return tables, blocks
+
+
+# Per-worker state, set up once by _init_worker
+_worker_tables: tuple = None
+_worker_blocks: "list[SharedMemory]" = None
+
+
+def _init_worker(descriptor: "list[tuple]"):
+    global _worker_tables, _worker_blocks
+    _worker_tables, _worker_blocks = SharedEphemerisTables.attach(descriptor)
+
+
+def _propagate(job: tuple):
+    initial_state_icrs, jd_0, end_jd = job
+    tables = _worker_tables
+
+    def get_rates(t, u):
+        return n_body_rates(jd_0 + t/86400, u, *tables)
+
+    return solve_ivp(get_rates, (0, (end_jd - jd_0) * 86400),
+                     initial_state_icrs, method='DOP853', rtol=1e-8, atol=1e-8)
+
+
+def simulate_parallel(spacecraft: "list[Spacecraft]", end_time: np.datetime64,
+                      processes: int = None, chunksize: int = None,
+                      show_progress=True) -> list:
+    '''
+    Propagates independent spacecraft on a pool of worker processes.
+
+    The ephemeris tables covering every job are built once in this process
+    and handed to the workers through shared memory.
+
+    Parameters
+    ----------
+    spacecraft : list[Spacecraft]
+        The spacecraft to propagate. They may start at different epochs,
+        but must all interact with the same bodies.
+    end_time : np.datetime64
+        The epoch at which to stop propagating, either one for all
+        spacecraft or an array with one per spacecraft.
+    processes : int, optional
+        The number of worker processes, by default os.cpu_count()
+    chunksize : int, optional
+        The number of jobs sent to a worker at a time, by default chosen
+        to give each worker about four chunks.
+    show_progress : bool, optional
+        Whether to display a progress bar, by default True
+
+    Returns
+    -------
+    list
+        The solve_ivp solution of each spacecraft, in the order given.
+    '''
+    if len(spacecraft) == 0:
+        return []
+
+    bodies = spacecraft[0].interacting_bodies
+    ephemeris_ids = [body.ephemeris_id for body in bodies]
+    for s in spacecraft:
+        if [body.ephemeris_id for body in s.interacting_bodies] != ephemeris_ids:
+            raise ValueError(
+                "All spacecraft must interact with the same bodies")
+
+    end_jd = np.broadcast_to(datetime64_to_jd(np.asarray(end_time)), (len(spacecraft),))
+    jobs = [(s.initial_state_icrs, s.jd_0, jd) for s, jd in zip(spacecraft, end_jd)]
+
+    # Build ephemeris interpolants once, spanning every job
+    for body in bodies:
+        body.construct_interpolant(min(s.jd_0 for s in spacecraft), end_jd.max())
+
+    processes = processes or os.cpu_count()
+    chunksize = chunksize or max(1, len(jobs) // (4 * processes))
+
+    with SharedEphemerisTables(stack_ephemeris_tables(bodies)) as shared, \
+            ProcessPoolExecutor(processes, initializer=_init_worker,
+                                initargs=(shared.descriptor,)) as executor:
+        results = executor.map(_propagate, jobs, chunksize=chunksize)
+
+        if show_progress:
+            results = tqdm(results, total=len(jobs), unit="traj",
+                           desc=f"Propagating {len(jobs)} spacecraft on {processes} processes")
+
+        return list(results)
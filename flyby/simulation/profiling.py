@@ -0,0 +1,190 @@
+'''
+Opt-in instrumentation of the hot path of simulate().
+
+A Profile counts the work done by the propagations it is passed to, or
+which run inside a profiling() block: the evaluations of the rates, the
+accepted and rejected steps, the evaluations of the event functions and the
+lookups of each body's interpolant. It also times the phases of simulate():
+
+    interpolants, with a phase per body
+    integration, with the kernel, force model, output and checkpoint phases
+        of the native integrators nested in it
+    post-processing, closing the output and building the dense output
+
+Without a profile, simulate() only checks for one once per phase. The
+counts of the native integrators come from the compiled kernel, which
+counts steps and event evaluations whether profiled or not, and the lookups
+are derived from them between its calls. For solve_ivp the rejected steps
+are derived from the evaluations of the explicit Runge-Kutta methods, and
+not counted with events or other methods.
+
+A profile is exported with to_json(), or as folded stacks with folded(),
+the input of flamegraph.pl, inferno and speedscope:
+
+    with profiling() as profile:
+        simulate(spacecraft, end_time, integrator="native")
+    profile.write_folded("simulate.folded")
+
+Profiles are not thread-safe; give each thread its own.
+'''
+import contextlib
+import json
+import time
+
+import numpy as np
+
+COUNTERS = ("simulations", "rates_evaluations", "steps_accepted", "steps_rejected",
+            "event_evaluations")
+
+_NO_PHASE = contextlib.nullcontext()
+
+# The profiles of the enclosing profiling() blocks, innermost last
+_active: "list[Profile]" = []
+
+
+class _Phase:
+    # Times one phase of a profile, nested in the phases it is entered in
+
+    __slots__ = ("profile", "name", "start")
+
+    def __init__(self, profile: "Profile", name: str) -> None:
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        self.profile._stack.append(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        elapsed = time.perf_counter() - self.start
+        stack = self.profile._stack
+        timing = self.profile.phases.setdefault(";".join(stack), [0.0, 0])
+        timing[0] += elapsed
+        timing[1] += 1
+        stack.pop()
+
+
+class Profile:
+    '''
+    The counts and phase timings of one or more propagations.
+    '''
+
+    def __init__(self) -> None:
+        self.counters: "dict[str, int]" = dict.fromkeys(COUNTERS, 0)
+
+        # The interpolant lookups by body name
+        self.lookups: "dict[str, int]" = {}
+
+        # The total seconds and number of calls by phase path, the names of
+        # the enclosing phases and the phase joined by ";"
+        self.phases: "dict[str, list]" = {}
+        self._stack: "list[str]" = []
+
+    def __repr__(self):
+        return (f"Profile({self.counters['rates_evaluations']} evaluations, "
+                f"{self.counters['steps_accepted']} steps, {len(self.phases)} phases)")
+
+    def phase(self, name: str) -> _Phase:
+        '''
+        Returns a context manager timing a phase, nested in the phases
+        entered before it. Phases of the same path add up.
+        '''
+        return _Phase(self, name)
+
+    def count(self, counter: str, n: int = 1) -> None:
+        '''
+        Adds n to one of COUNTERS.
+        '''
+        self.counters[counter] += int(n)
+
+    def count_lookups(self, names: "list[str]", counts: np.ndarray) -> None:
+        '''
+        Adds the interpolant lookups of bodies, given by name.
+        '''
+        for name, n in zip(names, counts):
+            self.lookups[name] = self.lookups.get(name, 0) + int(n)
+
+    def self_times(self) -> "dict[str, float]":
+        '''
+        Returns the seconds spent in each phase outside of the phases nested
+        in it, by phase path.
+        '''
+        times = {path: timing[0] for path, timing in self.phases.items()}
+        for path, timing in self.phases.items():
+            parent = path.rpartition(";")[0]
+            if parent in times:
+                times[parent] -= timing[0]
+        return {path: max(seconds, 0.0) for path, seconds in times.items()}
+
+    def as_dict(self) -> dict:
+        '''
+        Returns the profile as a JSON serializable dict.
+        '''
+        self_times = self.self_times()
+        return {
+            "counters": dict(self.counters),
+            "lookups": dict(self.lookups),
+            "phases": {path: {"seconds": seconds, "self_seconds": self_times[path],
+                              "calls": calls}
+                       for path, (seconds, calls) in self.phases.items()},
+        }
+
+    def to_json(self, path: str = None, indent: int = 2) -> str:
+        '''
+        Returns the profile as JSON, also writing it to path if given.
+        '''
+        text = json.dumps(self.as_dict(), indent=indent)
+        if path is not None:
+            with open(path, "w") as f:
+                f.write(text)
+        return text
+
+    def folded(self) -> str:
+        '''
+        Returns the phases as folded stacks, one "phase;nested phase
+        microseconds" line per phase with its self time, e.g. for
+        flamegraph.pl.
+        '''
+        return "".join(f"{path} {round(seconds * 1e6)}\n"
+                       for path, seconds in self.self_times().items())
+
+    def write_folded(self, path: str) -> None:
+        '''
+        Writes the folded stacks of folded() to a file.
+        '''
+        with open(path, "w") as f:
+            f.write(self.folded())
+
+
+@contextlib.contextmanager
+def profiling(profile: Profile = None):
+    '''
+    Profiles the simulations run in the block which are not given a profile
+    of their own, yielding the Profile, a new one by default.
+    '''
+    profile = Profile() if profile is None else profile
+    _active.append(profile)
+    try:
+        yield profile
+    finally:
+        _active.remove(profile)
+
+
+def active_profile() -> Profile:
+    '''
+    Returns the profile of the innermost profiling() block, or None.
+    '''
+    return _active[-1] if _active else None
+
+
+def phases(profile: Profile):
+    '''
+    Returns the phase method of a profile, or a function returning a no-op
+    context manager for None.
+    '''
+    return _no_phase if profile is None else profile.phase
+
+
+def _no_phase(name: str):
+    return _NO_PHASE
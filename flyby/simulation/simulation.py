@@ -1,13 +1,25 @@
+import os
+
+import scipy.integrate
 from scipy.integrate import solve_ivp
 import numpy as np
 from matplotlib import pyplot as plt
-from tqdm import tqdm
-
-import cProfile
 
 from flyby.orbit_models.keplerian_orbit import KeplerianOrbit
+from flyby.simulation.checkpoint import (Checkpointer, read_checkpoint, spacecraft_config,
+                                         spacecraft_from_config)
+from flyby.simulation.events import (Event, event_body_indices, event_tables,
+                                     sphere_of_influence_tables)
+from flyby.simulation.integrators import integrate
+from flyby.simulation.profiling import Profile, active_profile, phases
+from flyby.simulation.telemetry import ProgressMonitor, TqdmSink
+from flyby.simulation.trajectory import Trajectory
+from flyby.simulation.trajectory_file import TrajectoryReader, TrajectoryWriter
 from flyby.solar_system_model.celestial_body import CelestialBody
-from flyby.solar_system_model.relational_tree import RelationalTree
+from flyby.solar_system_model.relational_tree import RelationalTree, sphere_of_influence_bodies
+from flyby.solar_system_model.jpl_ephemeris import de440
+from flyby.spacecraft_model.force_model import AdaptiveForceModel
+from flyby.spacecraft_model.gravity import n_body_rates, n_body_rates_batch, stack_ephemeris_tables
 from flyby.spacecraft_model.spacecraft import Spacecraft
 from flyby.time_model.julian_day import datetime64_to_jd, jd_to_datetime64
 from flyby.visualizers.solar_system_plot import zoom_axes_to_body, full_solar_system_plot
@@ -50,31 +62,431 @@ def generate_initial_conditions_from_cartesian(initial_state: np.ndarray,
     return spacecraft
 
 
-def simulate(spacecraft: Spacecraft, end_time: np.datetime64, show_progress=True):
+def simulate(spacecraft: Spacecraft, end_time: np.datetime64, show_progress=True,
+             integrator: str = "scipy", method: str = "DOP853", step: float = None,
+             events: "list[Event]" = None, dense_output: bool = False, output: str = None,
+             checkpoint: str = None, checkpoint_interval: float = 600.0,
+             checkpoint_simulated_interval: float = None, resume: bool = False,
+             force_model: AdaptiveForceModel = None, central_body=None,
+             telemetry: list = None, progress_interval: float = 1.0, profile: Profile = None):
+    '''
+    Propagates a spacecraft under the gravity of its interacting bodies.
+
+    Parameters
+    ----------
+    spacecraft : Spacecraft
+        The spacecraft to propagate.
+    end_time : np.datetime64
+        The epoch at which to stop propagating.
+    show_progress : bool, optional
+        Whether to display a progress bar, by default True
+    integrator : str, optional
+        "scipy" to integrate with solve_ivp, calling back into Python for
+        every evaluation of the rates, or "native" to run the whole step
+        loop compiled (see flyby.simulation.integrators). By default "scipy".
+    method : str, optional
+        The integration method, by default "DOP853". Any solve_ivp method
+        for the scipy integrator, or one of integrators.METHODS.
+    step : float, optional
+        The step size in seconds of the fixed step native methods.
+    events : list[Event], optional
+        Events to locate, relative to the interacting bodies, see
+        flyby.simulation.events. The simulation stops at the first
+        occurrence of a terminal event.
+    dense_output : bool, optional
+        Whether to also return the trajectory between the steps, by
+        default False
+    output : str, optional
+        A directory to write the steps to as a trajectory file, see
+        flyby.simulation.trajectory_file. The native integrator streams
+        them during the propagation instead of keeping them, so t and y
+        only hold the initial and final states; solve_ivp's are written
+        once it returns.
+    checkpoint : str, optional
+        A file to save checkpoints of the native integrator to, see
+        flyby.simulation.checkpoint.
+    checkpoint_interval : float, optional
+        The wall-clock time between checkpoints in seconds, by default 600
+    checkpoint_simulated_interval : float, optional
+        The simulated time between checkpoints in seconds, checkpointing at
+        whichever of the intervals passes first. By default only the
+        wall-clock time counts.
+    resume : bool, optional
+        Whether to continue from the checkpoint file if it exists, which
+        must be of the same simulation. The result is identical to that of
+        an uninterrupted simulation. By default False
+    force_model : AdaptiveForceModel, optional
+        Selects the interacting bodies whose gravity the native integrator
+        evaluates, a segment of the propagation at a time, see
+        flyby.spacecraft_model.force_model. By default all of them.
+    central_body : CelestialBody or str, optional
+        Integrates the state of the spacecraft relative to one of its
+        interacting bodies with the native integrator, rather than relative
+        to the barycentre, so that orbits about the body take far fewer
+        steps for the same tolerances. "auto" starts from the body in whose
+        sphere of influence the spacecraft is and switches whenever it
+        crosses into that of another (see RelationalTree). The states
+        returned are barycentric either way, and the dense output is built
+        from the steps. By default barycentric.
+    telemetry : list, optional
+        Callables to pass ProgressReports of the propagation to, e.g. a
+        LoggingSink, see flyby.simulation.telemetry. Without them and
+        without show_progress, the progress is not monitored at all.
+    progress_interval : float, optional
+        The minimum wall-clock time between progress reports in seconds,
+        by default 1
+    profile : Profile, optional
+        The profile to count the evaluations, steps and interpolant lookups
+        of the propagation in and to time its phases in, see
+        flyby.simulation.profiling. By default that of the enclosing
+        profiling() block, if any.
+
+    Returns
+    -------
+    OptimizeResult
+        The solution, with the times in seconds since spacecraft.jd_0 as t
+        and the ICRS states as y, of shape (6, n). If there are events,
+        t_events and y_events hold the times and states of the occurrences
+        of each. With dense_output, trajectory is a Trajectory which can be
+        evaluated at any epoch of the propagation. With output,
+        trajectory_file is a TrajectoryReader of the file written.
+    '''
+    if integrator not in ("scipy", "native"):
+        raise ValueError(f"Unknown integrator {integrator}, expected scipy or native")
+    if integrator == "native" and dense_output and output is not None:
+        raise ValueError("The native integrator does not keep the steps streamed to output, "
+                         "which dense output needs")
+    if checkpoint is not None and integrator != "native":
+        raise ValueError("Checkpoints are only supported by the native integrator")
+    if force_model is not None and integrator != "native":
+        raise ValueError("Force models are only supported by the native integrator")
+    if central_body is not None and integrator != "native":
+        raise ValueError("Central bodies are only supported by the native integrator")
+    if force_model is not None and checkpoint is not None:
+        raise ValueError("Simulations with a force model cannot be checkpointed, "
+                         "as resuming them would change the selection of bodies")
+
     end_jd = datetime64_to_jd(end_time)
 
+    config = {
+        "spacecraft": spacecraft_config(spacecraft),
+        "end_time": str(end_time),
+        "integrator": {"method": method, "rtol": 1e-8, "atol": 1e-8, "step": step},
+        "interpolant": {"start_time": spacecraft.jd_0, "end_time": end_jd},
+        "n_events": len(events) if events else 0,
+        "dense_output": dense_output,
+        "central_body": central_body if central_body is None or isinstance(central_body, str)
+        else central_body.ephemeris_id,
+    }
+
+    resume_state = saved = None
+    if checkpoint is not None and resume and os.path.exists(checkpoint):
+        resume_state, saved = read_checkpoint(checkpoint)
+        if any(saved[key] != config[key] for key in config):
+            raise ValueError(f"{checkpoint} is a checkpoint of a different simulation")
+
+    if profile is None:
+        profile = active_profile()
+    phase = phases(profile)
+    if profile is not None:
+        profile.count("simulations")
+
     # Build ephemeris interpolants
-    for body in spacecraft.interacting_bodies:
-        body.construct_interpolant(spacecraft.jd_0, end_jd)
+    with phase("interpolants"):
+        for body in spacecraft.interacting_bodies:
+            with phase(body.name):
+                body.construct_interpolant(spacecraft.jd_0, end_jd)
+        spacecraft.stack_ephemeris_tables()
 
     duration_seconds = (end_jd - spacecraft.jd_0) * 86400
 
+    sinks = list(telemetry or [])
     if show_progress:
-        pbar = tqdm(total=int(duration_seconds), unit="sec",
-                    desc=f"Propagating from JD {round(spacecraft.jd_0, 2)} to {round(end_jd, 2)}")
+        sinks.append(TqdmSink(duration_seconds, desc=f"Propagating from JD "
+                              f"{round(spacecraft.jd_0, 2)} to {round(end_jd, 2)}"))
+    monitor = None
+    if sinks:
+        monitor = ProgressMonitor(duration_seconds, sinks, progress_interval,
+                                  float(resume_state["t"]) if resume_state is not None else 0.0)
+
+    writer = None
+    if output is not None:
+        soi_bodies = [body for body in spacecraft.interacting_bodies
+                      if hasattr(body, "sphere_of_influence")]
+        writer = TrajectoryWriter(
+            output, spacecraft.jd_0, soi_bodies or None,
+            resume_rows=saved["output"]["n_rows"] if saved is not None and "output" in saved else None)
+
+    checkpointer = None
+    if checkpoint is not None:
+        checkpointer = Checkpointer(checkpoint, config, checkpoint_interval,
+                                    checkpoint_simulated_interval, writer)
+
+    select_tables = None
+    if force_model is not None:
+        def select_tables(t, y):
+            return force_model.tables(spacecraft.interacting_bodies, spacecraft.ephemeris_tables,
+                                      t, spacecraft.jd_0, y)
+
+    central, switching = -1, None
+    if central_body is not None:
+        central, switching = central_body_indices(spacecraft, central_body)
+
+    with phase("integration"):
+        if integrator == "native":
+            sol = integrate(spacecraft.ephemeris_tables, spacecraft.jd_0,
+                            spacecraft.initial_state_icrs, duration_seconds, method=method,
+                            rtol=1e-8, atol=1e-8, step=step,
+                            events=event_tables(events, spacecraft.interacting_bodies)
+                            if events else None,
+                            progress=monitor.update if monitor is not None else None,
+                            dense_output=dense_output and central < 0,
+                            output=writer.append if writer is not None else None,
+                            checkpoint=checkpointer, resume=resume_state,
+                            steps_per_call=checkpointer.steps_per_call if checkpointer else 10000,
+                            force_model=select_tables,
+                            segment=force_model.segment if force_model is not None else 86400.0,
+                            central=central, switching=switching, profile=profile)
+        else:
+            event_functions = []
+            if events:
+                indices = event_body_indices(events, spacecraft.interacting_bodies)
+                event_functions = [
+                    event.solve_ivp_function(index, spacecraft.jd_0, spacecraft.ephemeris_tables)
+                    for event, index in zip(events, indices)]
+
+            rates = spacecraft.get_rates if monitor is None else \
+                monitor.counting(spacecraft.get_rates)
+            if profile is not None:
+                event_functions = [_counting(function) for function in event_functions]
+            sol = solve_ivp(rates, (0, duration_seconds),
+                            spacecraft.initial_state_icrs, method=method, rtol=1e-8, atol=1e-8,
+                            events=event_functions or None, dense_output=dense_output)
+
+            if writer is not None:
+                with phase("output"):
+                    writer.append(sol.t, sol.y.T)
+
+    if profile is not None and integrator == "native":
+        profile.count_lookups([body.name for body in spacecraft.interacting_bodies],
+                              sol.nlookups)
+    elif profile is not None:
+        _count_scipy(profile, spacecraft.interacting_bodies, sol, method, events,
+                     event_functions, dense_output)
+
+    with phase("post-processing"):
+        # The native integrator has reported its counts after its last call
+        if monitor is not None and integrator == "scipy":
+            monitor.close(sol.t[-1], len(sol.t) - 1, sol.nfev)
+        elif monitor is not None:
+            monitor.close(sol.t[-1])
+
+        if writer is not None:
+            writer.close()
+            sol.trajectory_file = TrajectoryReader(output)
+
+        if dense_output:
+            sol.trajectory = dense_trajectory(sol, spacecraft)
+
+    return sol
+
+
+def _counting(function):
+    # Wraps an event function of solve_ivp to count its evaluations
+    def counted(t, u):
+        counted.n_evaluations += 1
+        return function(t, u)
+
+    counted.n_evaluations = 0
+    counted.terminal = function.terminal
+    counted.direction = function.direction
+    return counted
+
+
+def _count_scipy(profile: Profile, bodies: "list[CelestialBody]", sol, method: str,
+                 events: "list[Event]", event_functions: list, dense_output: bool) -> None:
+    # Counts a solve_ivp propagation in a profile. Every evaluation of the
+    # rates looks up every body, and every event function its own.
+    n_steps = len(sol.t) - 1
+    profile.count("rates_evaluations", sol.nfev)
+    profile.count("steps_accepted", n_steps)
+    lookups = np.full(len(bodies), sol.nfev)
+    if events:
+        for index, function in zip(event_body_indices(events, bodies), event_functions):
+            lookups[index] += function.n_evaluations
+        profile.count("event_evaluations", sum(f.n_evaluations for f in event_functions))
+    profile.count_lookups([body.name for body in bodies], lookups)
+
+    # An explicit Runge-Kutta method evaluates the rates twice to start, and
+    # n_stages times per attempted step, and DOP853 three times more for
+    # the dense output of a step. Dense output for events cannot be told
+    # apart.
+    n_stages = getattr(getattr(scipy.integrate, method, None), "n_stages", None)
+    if events or n_stages is None:
+        return
+    n_attempts = sol.nfev - 2 - (3 * n_steps if dense_output and method == "DOP853" else 0)
+    profile.count("steps_rejected", n_attempts // n_stages - n_steps)
+
+
+def resume_simulation(checkpoint: str, show_progress=True, events: "list[Event]" = None,
+                      **kwargs):
+    '''
+    Continues a simulation from its checkpoint file, rebuilding the
+    spacecraft and its interacting bodies.
+
+    Parameters
+    ----------
+    checkpoint : str
+        The checkpoint file, see simulate.
+    show_progress : bool, optional
+        Whether to display a progress bar, by default True
+    events : list[Event], optional
+        The events of the simulation, which cannot be saved. They must be
+        the same, relative to the bodies of the returned spacecraft.
+    kwargs
+        Other arguments of simulate, e.g. the checkpoint intervals.
+
+    Returns
+    -------
+    tuple[Spacecraft, OptimizeResult]
+        The spacecraft and the solution, see simulate.
+    '''
+    _, config = read_checkpoint(checkpoint)
+    spacecraft = spacecraft_from_config(config["spacecraft"])
+    settings = config["integrator"]
+
+    central_body = config["central_body"]
+    if central_body is not None and central_body != "auto":
+        central_body = next(body for body in spacecraft.interacting_bodies
+                            if body.ephemeris_id == central_body)
+
+    sol = simulate(spacecraft, np.datetime64(config["end_time"]), show_progress,
+                   integrator="native", method=settings["method"], step=settings["step"],
+                   events=events, dense_output=config["dense_output"],
+                   output=config["output"]["path"] if "output" in config else None,
+                   central_body=central_body, checkpoint=checkpoint, resume=True, **kwargs)
+    return spacecraft, sol
+
+
+def central_body_indices(spacecraft: Spacecraft, central_body) -> "tuple[int, tuple]":
+    '''
+    Returns the index of the initial central body of a simulation among the
+    interacting bodies, and the packed RelationalTree to switch central
+    bodies with if central_body is "auto", see integrators.integrate.
+    '''
+    bodies = spacecraft.interacting_bodies
+    ephemeris_ids = [body.ephemeris_id for body in bodies]
+
+    if central_body != "auto":
+        if central_body.ephemeris_id is None or central_body.ephemeris_id not in ephemeris_ids:
+            raise ValueError(f"{central_body.name} is not one of the interacting bodies")
+        return ephemeris_ids.index(central_body.ephemeris_id), None
+
+    parents, radii = sphere_of_influence_tables(bodies, spacecraft.jd_0)
+    nodes = [b for b, body in enumerate(bodies) if hasattr(body, "sphere_of_influence")]
+    if not nodes:
+        raise ValueError("Switching central bodies needs RelationalTreeNodes among the "
+                         "interacting bodies")
+
+    # Spheres of influence sized as for switching, the root's being infinite
+    soi_id = sphere_of_influence_bodies([bodies[b] for b in nodes], np.array([spacecraft.jd_0]),
+                                        spacecraft.initial_state_icrs[np.newaxis, :3],
+                                        radii[nodes])[0]
+    return ephemeris_ids.index(soi_id), (parents, radii)
+
+
+def dense_trajectory(sol, spacecraft: Spacecraft) -> Trajectory:
+    '''
+    Returns the Trajectory of a solution of simulate(), from the dense
+    output of the integrator if it has one convertible to a Trajectory, and
+    from the states and accelerations at its steps otherwise.
+    '''
+    if sol.sol is not None:
+        try:
+            return Trajectory.from_dense_output(sol.sol, spacecraft.jd_0)
+        except ValueError:
+            pass
+
+    accelerations = np.array([
+        n_body_rates(spacecraft.jd_0 + t/86400, y, *spacecraft.ephemeris_tables)[3:]
+        for t, y in zip(sol.t, sol.y.T)]).T
+    return Trajectory.from_states(sol.t, sol.y, accelerations, spacecraft.jd_0)
+
+
+def simulate_batch(initial_states: np.ndarray, body: CelestialBody,
+                   initial_time: np.datetime64, end_time: np.datetime64,
+                   show_progress=True) -> np.ndarray:
+    '''
+    Propagates N spacecraft together under the gravity of the solar system.
+
+    All trajectories share the integrator's time nodes, so the ephemeris is
+    evaluated once per node for the whole batch. Tolerances are tightened by
+    sqrt(N) so that every trajectory individually meets the error norm of
+    simulate().
+
+    Parameters
+    ----------
+    initial_states : np.ndarray
+        The initial states, of shape (N, 6), as [x, y, z, vx, vy, vz]
+        in [m, m, m, m/s, m/s, m/s], aligned with J2000.
+    body : CelestialBody
+        The body the initial states are relative to, or None if they are
+        relative to the solar system barycenter.
+    initial_time : np.datetime64
+        The epoch of the initial states.
+    end_time : np.datetime64
+        The epoch at which to stop propagating.
+    show_progress : bool, optional
+        Whether to display a progress bar, by default True
+
+    Returns
+    -------
+    np.ndarray
+        A structured array of N trajectories with the fields
+        - t: the times of the nodes in seconds since initial_time, shape (n_t,)
+        - y: the ICRS states at the nodes, shape (6, n_t)
+    '''
+    initial_jd = datetime64_to_jd(initial_time)
+    end_jd = datetime64_to_jd(end_time)
 
-    def progress(t, y):
-        pbar.update(int(t - pbar.n))
-        return 0
+    initial_states = np.atleast_2d(initial_states)
+    n = len(initial_states)
 
-    sol = solve_ivp(spacecraft.get_rates, (0, duration_seconds),
-                    spacecraft.initial_state_icrs, method='DOP853', rtol=1e-8, atol=1e-8,
-                    events=[progress] if show_progress else None)
+    if body is not None:
+        r, v = de440[0, body.ephemeris_id].compute_and_differentiate(initial_jd)
+        initial_states = initial_states + np.concatenate((r*1e3, v*1e3/86400))
 
+    # Build ephemeris interpolants once for the whole batch
+    bodies = RelationalTree.solar_system().all_bodies
+    for interacting_body in bodies:
+        interacting_body.construct_interpolant(initial_jd, end_jd)
+    tables = stack_ephemeris_tables(bodies)
+
+    def get_rates(t, u):
+        return n_body_rates_batch(initial_jd + t/86400, u, *tables)
+
+    duration_seconds = (end_jd - initial_jd) * 86400
+
+    monitor = None
     if show_progress:
-        pbar.close()
+        monitor = ProgressMonitor(duration_seconds, [TqdmSink(
+            duration_seconds, desc=f"Propagating {n} spacecraft from JD {round(initial_jd, 2)} "
+                                   f"to {round(end_jd, 2)}")])
+        get_rates = monitor.counting(get_rates)
 
-    return sol
+    tolerance = 1e-8 / np.sqrt(n)
+    sol = solve_ivp(get_rates, (0, duration_seconds),
+                    initial_states.reshape(-1), method='DOP853', rtol=tolerance, atol=tolerance)
+
+    if monitor is not None:
+        monitor.close(sol.t[-1], len(sol.t) - 1, sol.nfev)
+
+    n_t = len(sol.t)
+    trajectories = np.empty(n, dtype=[('t', 'f8', (n_t,)), ('y', 'f8', (6, n_t))])
+    trajectories['t'] = sol.t
+    trajectories['y'] = sol.y.reshape((n, 6, n_t))
+
+    return trajectories
 
 
 def earth_orbit_example():
@@ -89,21 +501,23 @@ def earth_orbit_example():
     spacecraft = generate_initial_conditions_from_keplerian(
         initial_orbit, parent_body, initial_time)
 
-    solution = simulate(spacecraft, np.datetime64(
-        'now') + np.timedelta64(10, 'D'))
+    # Integrated relative to the Earth, which takes far fewer steps
+    solution = simulate(spacecraft, np.datetime64('now') + np.timedelta64(10, 'D'),
+                        integrator="native", central_body="auto", dense_output=True)
 
-    jd = spacecraft.jd_0 + solution.t / 86400
+    # A smooth curve from the steps, sampled every minute
+    jd, states = solution.trajectory.resample(step=60)
 
     fig, ax = plt.subplots()
     full_solar_system_plot(ax, jd_to_datetime64(jd[0]))
-    plot_trajectory(solution.y[:3], ax, jd)
+    plot_trajectory(states[:, :3].T, ax, jd)
     zoom_axes_to_body(ax, parent_body, jd=jd[0])
     plt.show()
 
     fig = plt.figure()
     ax = fig.add_subplot(111, projection='3d')
 
-    plot_trajectory_about_body(parent_body, solution.y[:3], jd, ax=ax)
+    plot_trajectory_about_body(parent_body, states[:, :3].T, jd, ax=ax)
     plt.show()
 
 
@@ -127,18 +541,16 @@ def earth_escape_example(show_progress=True):
     # At departure
     full_solar_system_plot(plt.gca(), jd_to_datetime64(jd[0]))
     plot_trajectory(solution.y[:3], plt.gca(), jd, color="white")
-    plot_point(solution.y[:3, 0], plt.gca(), jd, color="white")
+    plot_point(solution.y[:3, 0], plt.gca(), jd[0], color="white")
 
     plt.subplot(122)
     # At arrival
     full_solar_system_plot(plt.gca(), jd_to_datetime64(jd[-1]))
     plot_trajectory(solution.y[:3], plt.gca(), jd, color="white")
-    plot_point(solution.y[:3, -1], plt.gca(), jd, color="white")
+    plot_point(solution.y[:3, -1], plt.gca(), jd[-1], color="white")
     plt.show()
 
 
 if __name__ == '__main__':
     earth_orbit_example()
-
-    # cProfile.run('earth_escape_example(False)')
     earth_escape_example()
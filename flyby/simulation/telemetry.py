@@ -0,0 +1,231 @@
+'''
+Progress and telemetry of running propagations.
+
+A ProgressMonitor is told how far a propagation has got by the integrator
+loop, between calls of the compiled kernel for the native integrators and
+from the rates function for solve_ivp, and passes a ProgressReport to its
+sinks at most once per interval of wall-clock time. Between reports an
+update costs a comparison against a deadline, and simulations without a
+monitor install no callbacks at all.
+
+Sinks are callables taking a ProgressReport, e.g. a TqdmSink to display a
+progress bar or a LoggingSink for batch runs. The last report of a
+propagation has final set, and its rates are over the whole run rather than
+over the interval since the previous report.
+'''
+import logging
+import time
+
+import numpy as np
+from tqdm import tqdm
+
+
+class ProgressReport:
+    '''
+    The progress of a propagation and its throughput.
+    '''
+
+    def __init__(self, t: float, duration: float, elapsed: float, steps: int,
+                 evaluations: int, steps_per_second: float, evaluations_per_second: float,
+                 days_per_second: float, final: bool = False) -> None:
+        '''
+        :param t: The time reached in seconds since the initial epoch
+        :param duration: The time to propagate for in seconds
+        :param elapsed: The wall-clock time since the start in seconds
+        :param steps: The number of steps taken, or None if the integrator
+            does not count them while running
+        :param evaluations: The number of evaluations of the rates
+        :param steps_per_second: The steps taken per second of wall-clock time
+        :param evaluations_per_second: The evaluations of the rates per second
+        :param days_per_second: The simulated days per second
+        :param final: Whether the propagation has ended
+        '''
+        self.t: float = t
+        self.duration: float = duration
+        self.elapsed: float = elapsed
+        self.steps: int = steps
+        self.evaluations: int = evaluations
+        self.steps_per_second: float = steps_per_second
+        self.evaluations_per_second: float = evaluations_per_second
+        self.days_per_second: float = days_per_second
+        self.final: bool = final
+
+    def __repr__(self):
+        return f"ProgressReport({100 * self.fraction:.1f}%, {report_rates(self)})"
+
+    @property
+    def fraction(self) -> float:
+        '''
+        The fraction of the duration propagated, in [0, 1].
+        '''
+        return abs(self.t / self.duration) if self.duration != 0 else 1.0
+
+    def as_dict(self) -> dict:
+        '''
+        Returns the report as a JSON serializable dict.
+        '''
+        return {name: (None if value is None else
+                       bool(value) if name == "final" else float(value))
+                for name, value in vars(self).items()}
+
+
+class ProgressMonitor:
+    '''
+    Reports the progress of a propagation to sinks, throttled by wall-clock
+    time. Use it as a context manager, or call close() once done.
+    '''
+
+    def __init__(self, duration: float, sinks: list = (), interval: float = 1.0,
+                 t_start: float = 0.0) -> None:
+        '''
+        :param duration: The time to propagate for in seconds
+        :param sinks: The callables to pass the ProgressReports to
+        :param interval: The minimum wall-clock time between reports in seconds
+        :param t_start: The time the propagation starts from in seconds,
+            e.g. that of a checkpoint it is resumed from
+        '''
+        self.duration: float = duration
+        self.sinks: list = list(sinks)
+        self.interval: float = interval
+
+        self._start = self._last_time = time.monotonic()
+        self._deadline = self._start + interval
+        self._t_start = self._last_t = self._t = t_start
+        self._last_steps = self._last_evaluations = 0
+        self._steps = None
+        self._evaluations = 0
+        self.closed: bool = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def update(self, t: float, steps: int = None, evaluations: int = 0) -> None:
+        '''
+        Records the progress, reporting it if the interval has passed.
+
+        Parameters
+        ----------
+        t : float
+            The time reached in seconds
+        steps : int, optional
+            The number of steps taken so far, if known
+        evaluations : int, optional
+            The number of evaluations of the rates so far
+        '''
+        self._t, self._steps, self._evaluations = t, steps, evaluations
+
+        now = time.monotonic()
+        if now >= self._deadline:
+            self._report(now, final=False)
+
+    def counting(self, rates):
+        '''
+        Wraps a rates function of (t, u), e.g. for solve_ivp, to update the
+        monitor with the evaluations. The clock is only read every 64
+        evaluations.
+        '''
+        def counted_rates(t, u):
+            self._evaluations += 1
+            self._t = t
+            if self._evaluations % 64 == 0 and time.monotonic() >= self._deadline:
+                self._report(time.monotonic(), final=False)
+            return rates(t, u)
+
+        return counted_rates
+
+    def close(self, t: float = None, steps: int = None, evaluations: int = None) -> ProgressReport:
+        '''
+        Reports the end of the propagation once, with the final counts if
+        given, and returns the report.
+        '''
+        if t is not None:
+            self._t = t
+        if steps is not None:
+            self._steps = steps
+        if evaluations is not None:
+            self._evaluations = evaluations
+
+        if self.closed:
+            return None
+        self.closed = True
+        return self._report(time.monotonic(), final=True)
+
+    def _report(self, now: float, final: bool) -> ProgressReport:
+        # Intermediate rates are over the interval since the last report,
+        # final ones over the whole run
+        if final:
+            since, t_since, steps_since, evaluations_since = self._start, self._t_start, 0, 0
+        else:
+            since, t_since = self._last_time, self._last_t
+            steps_since, evaluations_since = self._last_steps, self._last_evaluations
+        span = max(now - since, 1e-9)
+
+        report = ProgressReport(
+            self._t, self.duration, now - self._start, self._steps, self._evaluations,
+            np.nan if self._steps is None else (self._steps - steps_since) / span,
+            (self._evaluations - evaluations_since) / span,
+            abs(self._t - t_since) / 86400 / span, final)
+
+        self._last_time, self._last_t = now, self._t
+        self._last_steps, self._last_evaluations = self._steps or 0, self._evaluations
+        self._deadline = now + self.interval
+
+        for sink in self.sinks:
+            sink(report)
+        return report
+
+
+class TqdmSink:
+    '''
+    Displays ProgressReports as a progress bar in simulated days.
+    '''
+
+    def __init__(self, duration: float, desc: str = None) -> None:
+        '''
+        :param duration: The time to propagate for in seconds
+        :param desc: The description of the bar
+        '''
+        self.bar = tqdm(total=round(abs(duration) / 86400, 2), unit="d", desc=desc,
+                        bar_format="{l_bar}{bar}| {n:.2f}/{total:.2f} d "
+                                   "[{elapsed}<{remaining}{postfix}]")
+
+    def __call__(self, report: ProgressReport) -> None:
+        self.bar.n = round(abs(report.t) / 86400, 2)
+        self.bar.set_postfix_str(report_rates(report), refresh=True)
+        if report.final:
+            self.bar.close()
+
+
+class LoggingSink:
+    '''
+    Logs ProgressReports, e.g. from batch runs without a terminal.
+    '''
+
+    def __init__(self, logger: logging.Logger = None, level: int = logging.INFO,
+                 name: str = "propagation") -> None:
+        '''
+        :param logger: The logger, by default that of this module
+        :param level: The level to log at
+        :param name: A label for the propagation in the messages
+        '''
+        self.logger: logging.Logger = logger or logging.getLogger(__name__)
+        self.level: int = level
+        self.name: str = name
+
+    def __call__(self, report: ProgressReport) -> None:
+        self.logger.log(self.level, "%s %s: %.1f%%, %s", self.name,
+                        "done" if report.final else "running", 100 * report.fraction,
+                        report_rates(report))
+
+
+def report_rates(report: ProgressReport) -> str:
+    '''
+    Formats the rates of a report, leaving out the steps if not counted.
+    '''
+    rates = f"{report.evaluations_per_second:.3g} evals/s, {report.days_per_second:.3g} d/s"
+    if np.isnan(report.steps_per_second):
+        return rates
+    return f"{report.steps_per_second:.3g} steps/s, " + rates
@@ -0,0 +1,249 @@
+'''
+Dense trajectories: the state of a spacecraft at any epoch between the
+steps of a propagation, without propagating again.
+
+Each step is stored as a polynomial of the state in x = (t - t_k) / h_k over
+[0, 1], with the coefficients of all steps in one array. The polynomials are
+those of the integrator's own dense output when it has one, and quintic
+Hermite interpolants of the positions, velocities and accelerations at the
+steps otherwise, so the memory used grows with the number of steps and not
+with the number of samples taken.
+'''
+from numba import njit
+import numpy as np
+from scipy.integrate import OdeSolution
+
+from flyby.orbit_models.frames import icrs_to_body_centred
+from flyby.solar_system_model.celestial_body import CelestialBody
+
+
+@njit
+def trajectory_numba(t_nodes: np.ndarray, coefficients: np.ndarray,
+                     t_eval: np.ndarray) -> np.ndarray:
+    '''
+    Evaluates piecewise polynomials at several times.
+
+    The step of the previous evaluation is checked first, then its
+    successor, before falling back to a binary search, so sorted times cost
+    O(1) each.
+
+    Parameters
+    ----------
+    t_nodes : np.ndarray
+        The increasing times of the steps, of shape (n + 1,)
+    coefficients : np.ndarray
+        The power series in x = (t - t_k) / (t_k+1 - t_k) of each step, in
+        increasing powers, of shape (n, 6, degree + 1)
+    t_eval : np.ndarray
+        The times at which to evaluate, within the steps, of shape (N,)
+
+    Returns
+    -------
+    np.ndarray
+        The states, of shape (N, 6)
+    '''
+    n, m, n_coefficients = coefficients.shape
+    states = np.empty((t_eval.shape[0], m))
+    cursor = 0
+
+    for k in range(t_eval.shape[0]):
+        t = t_eval[k]
+        if not t_nodes[0] <= t <= t_nodes[n]:
+            raise ValueError("Evaluation time outside of the trajectory")
+
+        if not t_nodes[cursor] <= t < t_nodes[cursor + 1]:
+            if cursor + 2 <= n and t_nodes[cursor + 1] <= t < t_nodes[cursor + 2]:
+                cursor += 1
+            else:
+                cursor = min(max(np.searchsorted(t_nodes, t, side="right") - 1, 0), n - 1)
+
+        x = (t - t_nodes[cursor]) / (t_nodes[cursor + 1] - t_nodes[cursor])
+        for c in range(m):
+            value = coefficients[cursor, c, n_coefficients - 1]
+            for i in range(n_coefficients - 2, -1, -1):
+                value = value * x + coefficients[cursor, c, i]
+            states[k, c] = value
+
+    return states
+
+
+class Trajectory:
+    '''
+    A spacecraft's ICRS state [x, y, z, vx, vy, vz] over the span of a
+    propagation, evaluated at Julian dates.
+    '''
+
+    def __init__(self, jd_0: float, t: np.ndarray, coefficients: np.ndarray) -> None:
+        '''
+        :param jd_0: The Julian date at t = 0
+        :param t: The increasing times of the steps in seconds since jd_0, of shape (n + 1,)
+        :param coefficients: The power series in x = (t - t_k) / (t_k+1 - t_k) of
+            the state over each step, in increasing powers, of shape (n, 6, degree + 1)
+        '''
+        if len(t) < 2 or np.any(np.diff(t) <= 0):
+            raise ValueError("A trajectory needs at least one step, with increasing times")
+
+        self.jd_0: float = jd_0
+        self.t: np.ndarray = np.ascontiguousarray(t, dtype=np.float64)
+        self.coefficients: np.ndarray = np.ascontiguousarray(coefficients, dtype=np.float64)
+
+    def __repr__(self):
+        return f"Trajectory(JD {self.start_jd:.2f} to {self.end_jd:.2f}, {len(self.coefficients)} steps)"
+
+    @property
+    def start_jd(self) -> float:
+        return self.jd_0 + self.t[0] / 86400
+
+    @property
+    def end_jd(self) -> float:
+        return self.jd_0 + self.t[-1] / 86400
+
+    @property
+    def nbytes(self) -> int:
+        return self.t.nbytes + self.coefficients.nbytes
+
+    def states(self, jd: np.ndarray) -> np.ndarray:
+        '''
+        Returns the ICRS states at Julian dates of shape (...), as an array of
+        shape (..., 6). Raises a ValueError outside of the trajectory.
+        '''
+        jd = np.asarray(jd, dtype=np.float64)
+        return self.at((jd - self.jd_0) * 86400)
+
+    def at(self, t: np.ndarray) -> np.ndarray:
+        '''
+        Returns the ICRS states at times in seconds since jd_0 of shape (...),
+        as an array of shape (..., 6).
+
+        Julian dates only resolve about 50 microseconds, so times in seconds
+        are preferable to evaluate at the steps themselves.
+        '''
+        t = np.asarray(t, dtype=np.float64)
+        states = trajectory_numba(self.t, self.coefficients, np.ascontiguousarray(t.reshape(-1)))
+        return states.reshape(t.shape + (6,))
+
+    def __call__(self, jd: np.ndarray) -> np.ndarray:
+        return self.states(jd)
+
+    def resample(self, step: float = None, n: int = None) -> "tuple[np.ndarray, np.ndarray]":
+        '''
+        Returns the states on a uniform grid over the whole trajectory.
+
+        Parameters
+        ----------
+        step : float, optional
+            The spacing of the grid in seconds
+        n : int, optional
+            The number of points of the grid, used if step is not given
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray]
+            The Julian dates of the grid, of shape (n,), and the states, of
+            shape (n, 6)
+        '''
+        if step is not None:
+            t = np.arange(self.t[0], self.t[-1], step)
+            t = np.append(t, self.t[-1]) if t[-1] < self.t[-1] else t
+        elif n is not None:
+            t = np.linspace(self.t[0], self.t[-1], n)
+        else:
+            raise ValueError("Either step or n must be given")
+
+        return self.jd_0 + t / 86400, trajectory_numba(self.t, self.coefficients, t)
+
+    def relative_to(self, body: CelestialBody, jd: np.ndarray,
+                    ecliptic: bool = False) -> np.ndarray:
+        '''
+        Returns the states relative to a body at Julian dates, in the ICRS or
+        ecliptic frame, see frames.icrs_to_body_centred.
+        '''
+        return icrs_to_body_centred(self.states(jd), jd, body, ecliptic)
+
+    @classmethod
+    def from_dense_output(cls, solution: OdeSolution, jd_0: float) -> "Trajectory":
+        '''
+        Converts the dense output of solve_ivp (the sol of a solution
+        integrated with dense_output=True) of an explicit Runge-Kutta method.
+
+        Parameters
+        ----------
+        solution : OdeSolution
+            The dense output, of the DOP853, RK45 or RK23 method
+        jd_0 : float
+            The Julian date at t = 0
+        '''
+        interpolants = solution.interpolants
+        h = np.diff(solution.ts)
+        if np.any(h <= 0):
+            raise ValueError("Only forward propagations can be converted")
+
+        if all(hasattr(interpolant, "F") for interpolant in interpolants):
+            # DOP853: y_old + x (F0 + (1 - x) (F1 + x (F2 + (1 - x) ...)))
+            F = np.array([interpolant.F for interpolant in interpolants])
+            n_steps, n_F, m = F.shape
+            series = np.zeros((n_steps, m, n_F + 1))
+            for i in range(n_F):
+                series[:, :, 0] += F[:, n_F - 1 - i]
+                shifted = np.zeros_like(series)
+                shifted[:, :, 1:] = series[:, :, :-1]
+                series = shifted if i % 2 == 0 else series - shifted
+            series[:, :, 0] += np.array([interpolant.y_old for interpolant in interpolants])
+
+        elif all(hasattr(interpolant, "Q") for interpolant in interpolants):
+            # RK45, RK23: y_old + h Q [x, x^2, ...]
+            Q = np.array([interpolant.Q for interpolant in interpolants])
+            series = np.zeros((Q.shape[0], Q.shape[1], Q.shape[2] + 1))
+            series[:, :, 1:] = h[:, np.newaxis, np.newaxis] * Q
+            series[:, :, 0] = np.array([interpolant.y_old for interpolant in interpolants])
+
+        else:
+            raise ValueError("Only the dense output of explicit Runge-Kutta methods can be converted")
+
+        return cls(jd_0, solution.ts, series)
+
+    @classmethod
+    def from_states(cls, t: np.ndarray, y: np.ndarray, accelerations: np.ndarray,
+                    jd_0: float) -> "Trajectory":
+        '''
+        Interpolates the states at the steps of an integrator without dense
+        output: the positions with quintic Hermite polynomials matching the
+        positions, velocities and accelerations at both ends of each step,
+        and the velocities with their derivatives.
+
+        Parameters
+        ----------
+        t : np.ndarray
+            The times of the steps in seconds since jd_0, of shape (n + 1,)
+        y : np.ndarray
+            The ICRS states at the steps, of shape (6, n + 1)
+        accelerations : np.ndarray
+            The accelerations at the steps, of shape (3, n + 1)
+        jd_0 : float
+            The Julian date at t = 0
+        '''
+        t, unique = np.unique(t, return_index=True)
+        y, accelerations = y[:, unique].T, accelerations[:, unique].T
+
+        h = np.diff(t)[:, np.newaxis]
+        r0, r1 = y[:-1, :3], y[1:, :3]
+        v0, v1 = y[:-1, 3:] * h, y[1:, 3:] * h
+        a0, a1 = accelerations[:-1] * h**2, accelerations[1:] * h**2
+
+        series = np.zeros((len(h), 6, 6))
+        series[:, :3, 0] = r0
+        series[:, :3, 1] = v0
+        series[:, :3, 2] = a0 / 2
+
+        # The remaining cubic, quartic and quintic terms match the end of the step
+        R = r1 - r0 - v0 - a0 / 2
+        V = v1 - v0 - a0
+        A = a1 - a0
+        series[:, :3, 3] = 10 * R - 4 * V + A / 2
+        series[:, :3, 4] = -15 * R + 7 * V - A
+        series[:, :3, 5] = 6 * R - 3 * V + A / 2
+
+        # Velocities per second, of degree 4
+        series[:, 3:, :5] = series[:, :3, 1:] * np.arange(1, 6) / h[:, :, np.newaxis]
+
+        return cls(jd_0, t, series)
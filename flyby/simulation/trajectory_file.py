@@ -0,0 +1,216 @@
+'''
+Columnar, memory-mappable trajectory files, written while propagating.
+
+A trajectory file is a directory holding one raw little endian file per
+column, appended to in chunks, and a JSON header:
+- t.f8: the times of the steps in seconds since jd_0, float64 (n,)
+- state.f8: the barycentric ICRS states, float64 (n, 6)
+- body.i8: the ephemeris ID of the body in whose sphere of influence the
+  spacecraft is, int64 (n,), or -1 if unknown
+- header.json: the format, jd_0 and the number of rows written so far
+
+Times are stored relative to jd_0, as Julian dates only resolve about 50
+microseconds. The header is replaced after every chunk, so the file can be
+read while it is being written and up to the last chunk after a crash.
+'''
+import json
+import os
+
+import numpy as np
+
+from flyby.solar_system_model.relational_tree import sphere_of_influence_bodies
+
+MAGIC = "FLYBYTRJ"
+TRAJECTORY_FORMAT_VERSION = 1
+
+# Name, dtype and shape of a row of each column
+COLUMNS = (("t", "<f8", ()), ("state", "<f8", (6,)), ("body", "<i8", ()))
+
+_HEADER = "header.json"
+
+
+class TrajectoryWriter:
+    '''
+    Streams the steps of a propagation to a trajectory file.
+
+    Use it as a context manager, or call close() once done.
+    '''
+
+    def __init__(self, path: str, jd_0: float, bodies: list = None,
+                 chunk_size: int = 65536, resume_rows: int = None) -> None:
+        '''
+        :param path: The directory to write, created if needed. Existing
+            columns in it are overwritten.
+        :param jd_0: The Julian date at t = 0
+        :param bodies: The bodies whose spheres of influence to record,
+            RelationalTreeNodes as in RelationalTree.all_bodies. By default
+            the body column is -1.
+        :param chunk_size: The number of steps buffered between writes
+        :param resume_rows: Continue a file of which this many rows were written,
+            dropping any rows after them, instead of starting a new one
+        '''
+        self.path: str = os.path.abspath(path)
+        self.jd_0: float = jd_0
+        self.bodies: list = bodies
+        self.chunk_size: int = chunk_size
+        self.n_rows: int = 0
+
+        # The spheres of influence are sized once, as for events
+        self.radii = None if bodies is None else \
+            np.array([body.sphere_of_influence(jd_0) for body in bodies])
+
+        os.makedirs(self.path, exist_ok=True)
+        self._files = {name: open(os.path.join(self.path, f"{name}.{dtype[1:]}"),
+                                  "wb" if resume_rows is None else "r+b")
+                       for name, dtype, _ in COLUMNS}
+
+        if resume_rows is not None:
+            for name, dtype, shape in COLUMNS:
+                self._files[name].truncate(resume_rows * np.dtype(dtype).itemsize * int(np.prod(shape)))
+                self._files[name].seek(0, os.SEEK_END)
+            self.n_rows = resume_rows
+
+        self._t: "list[np.ndarray]" = []
+        self._y: "list[np.ndarray]" = []
+        self._n_buffered: int = 0
+        self._write_header(complete=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def append(self, t: np.ndarray, y: np.ndarray) -> None:
+        '''
+        Appends steps, writing them out once a chunk is buffered.
+
+        Parameters
+        ----------
+        t : np.ndarray
+            The times of the steps in seconds since jd_0, of shape (n,)
+        y : np.ndarray
+            The states at the steps, of shape (n, 6)
+        '''
+        self._t.append(np.array(t, dtype=np.float64).reshape(-1))
+        self._y.append(np.array(y, dtype=np.float64).reshape(-1, 6))
+        self._n_buffered += len(self._t[-1])
+
+        if self._n_buffered >= self.chunk_size:
+            self.flush()
+
+    def flush(self) -> None:
+        '''
+        Writes out the buffered steps and updates the header.
+        '''
+        if self._n_buffered == 0:
+            return
+
+        t, y = np.concatenate(self._t), np.concatenate(self._y)
+        self._t, self._y, self._n_buffered = [], [], 0
+
+        if self.bodies is None:
+            body = np.full(len(t), -1)
+        else:
+            body = sphere_of_influence_bodies(self.bodies, self.jd_0 + t / 86400, y[:, :3],
+                                              self.radii)
+
+        for (name, dtype, _), column in zip(COLUMNS, (t, y, body)):
+            self._files[name].write(np.ascontiguousarray(column, dtype=dtype).tobytes())
+            self._files[name].flush()
+
+        self.n_rows += len(t)
+        self._write_header(complete=False)
+
+    def close(self) -> None:
+        '''
+        Writes out the remaining steps and marks the file complete.
+        '''
+        if self._files is None:
+            return
+        self.flush()
+        for f in self._files.values():
+            f.close()
+        self._files = None
+        self._write_header(complete=True)
+
+    def _write_header(self, complete: bool) -> None:
+        header = {
+            "magic": MAGIC,
+            "version": TRAJECTORY_FORMAT_VERSION,
+            "jd_0": self.jd_0,
+            "n_rows": self.n_rows,
+            "complete": complete,
+            "columns": {name: {"dtype": dtype, "shape": list(shape)} for name, dtype, shape in COLUMNS},
+        }
+
+        # Replaced atomically, so that readers never see a partial header
+        temporary = os.path.join(self.path, _HEADER + ".tmp")
+        with open(temporary, "w") as f:
+            json.dump(header, f)
+        os.replace(temporary, os.path.join(self.path, _HEADER))
+
+
+class TrajectoryReader:
+    '''
+    A memory-mapped trajectory file, see TrajectoryWriter.
+    '''
+
+    def __init__(self, path: str) -> None:
+        self.path: str = os.path.abspath(path)
+
+        with open(os.path.join(self.path, _HEADER)) as f:
+            self.header: dict = json.load(f)
+        if self.header.get("magic") != MAGIC:
+            raise ValueError(f"{path} is not a trajectory file")
+        if self.header["version"] != TRAJECTORY_FORMAT_VERSION:
+            raise ValueError(f"{path} has trajectory format version {self.header['version']}, "
+                             f"expected {TRAJECTORY_FORMAT_VERSION}")
+
+        self.jd_0: float = self.header["jd_0"]
+        self.complete: bool = self.header["complete"]
+        n = self.header["n_rows"]
+
+        columns = {}
+        for name, dtype, shape in COLUMNS:
+            if n == 0:
+                columns[name] = np.empty((0,) + shape, dtype=dtype)
+                continue
+            columns[name] = np.memmap(os.path.join(self.path, f"{name}.{dtype[1:]}"),
+                                      dtype=dtype, mode="r", shape=(n,) + shape)
+
+        self.t: np.ndarray = columns["t"]
+        self.states: np.ndarray = columns["state"]
+        self.bodies: np.ndarray = columns["body"]
+
+    def __repr__(self):
+        return f"TrajectoryReader({self.path}, {len(self)} steps)"
+
+    def __len__(self):
+        return len(self.t)
+
+    @property
+    def t_jd(self) -> np.ndarray:
+        '''
+        The Julian dates of the steps.
+        '''
+        return self.jd_0 + self.t / 86400
+
+    def time_range(self, start_jd: float = None, end_jd: float = None) -> slice:
+        '''
+        Returns the slice of the steps between two Julian dates, inclusive.
+        '''
+        start = 0 if start_jd is None else \
+            np.searchsorted(self.t, (start_jd - self.jd_0) * 86400, side="left")
+        stop = len(self) if end_jd is None else \
+            np.searchsorted(self.t, (end_jd - self.jd_0) * 86400, side="right")
+        return slice(int(start), int(stop))
+
+    def read(self, start_jd: float = None, end_jd: float = None) -> "tuple[np.ndarray, np.ndarray, np.ndarray]":
+        '''
+        Returns the Julian dates, states and sphere of influence bodies of
+        the steps between two Julian dates, the states being a view of the
+        memory map of shape (n, 6).
+        '''
+        s = self.time_range(start_jd, end_jd)
+        return self.jd_0 + self.t[s] / 86400, self.states[s], self.bodies[s]
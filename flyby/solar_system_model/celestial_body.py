@@ -1,9 +1,36 @@
 from scipy.constants import G
+from flyby.math_utilities.chebyshev_interpolator import ChebyshevInterpolant
 from flyby.math_utilities.fast_linear_interpolator import FastLerp
+from flyby.math_utilities.hermite_interpolator import hermite_interpolant, hermite_node_spacing
+from flyby.solar_system_model.ephemeris_cache import active_ephemeris_cache
+from flyby.solar_system_model.interpolant_cache import interpolant_cache
 from flyby.solar_system_model.jpl_ephemeris import de440
 import numpy as np
 
 
+def ephemeris_source(ephemeris_id: int, start_time: float, end_time: float) -> ChebyshevInterpolant:
+    '''
+    Returns the Chebyshev records of a body's barycentric position in m
+    covering a time span, from the active ephemeris cache if it covers the
+    span and from DE440 otherwise.
+
+    Parameters
+    ----------
+    ephemeris_id : int
+        ID of the body in the JPL ephemeris file
+    start_time : float
+        The start of the span in Julian days
+    end_time : float
+        The end of the span in Julian days
+    '''
+    cache = active_ephemeris_cache()
+    if cache is not None and cache.covers(ephemeris_id, start_time, end_time):
+        return cache.interpolant(ephemeris_id, start_time, end_time)
+
+    return ChebyshevInterpolant.from_segment(
+        de440.segment(ephemeris_id), start_time, end_time, scale=1e3)
+
+
 class CelestialBody:
     def __init__(self, name: str, radius: float,
                  mass: float, color: int, ephemeris_id: int = None) -> None:
@@ -20,8 +47,8 @@ class CelestialBody:
         self.color: int = color
 
         self.ephemeris_id: int = ephemeris_id
-        self.position_interpolant: FastLerp = None
-        self.velocity_interpolant: FastLerp = None
+        self.position_interpolant: "FastLerp | ChebyshevInterpolant" = None
+        self.velocity_interpolant: "FastLerp | ChebyshevInterpolant" = None
 
     def __str__(self):
         return self.name
@@ -29,10 +56,12 @@ class CelestialBody:
     def __repr__(self):
         return f"CelestialBody({self.name}, {self.radius}, {self.mass}, {self.color}, {self.ephemeris_id})"
 
-    def construct_interpolant(self, start_time: float, end_time: float):
+    def construct_interpolant(self, start_time: float, end_time: float,
+                              method: str = "chebyshev", tolerance: float = 1e3,
+                              use_cache: bool = True):
         '''
-        Constructs a scipy.interpolate.interp1d object that interpolates the position and velocity of
-        the body at any time between start_time and end_time
+        Constructs interpolants for the position and velocity of the body at
+        any time between start_time and end_time
 
         Parameters
         ----------
@@ -40,20 +69,79 @@ class CelestialBody:
             The start time of the interpolation in Julian days
         end_time : float
             The end time of the interpolation in Julian days
-        n : int, optional
-            The number of points to use in the interpolation, by default 1000
+        method : str, optional
+            The interpolation backend, by default "chebyshev"
+            [chebyshev, hermite, lerp]
+            - chebyshev: evaluates the DE440 Chebyshev records directly
+            - hermite: cubic Hermite interpolation of DE440 positions and
+              velocities, with nodes spaced to meet tolerance for this body
+            - lerp: linear interpolation of DE440 sampled 10 times per day
+        tolerance : float, optional
+            The maximum position error of the hermite method in meters,
+            by default 1 km
+        use_cache : bool, optional
+            Whether to reuse and share interpolants through the process-wide
+            interpolant cache, by default True
         '''
-        n = int(end_time - start_time) * 10  # 10 steps per day
+        if use_cache:
+            key = self._interpolant_key(start_time, end_time, method, tolerance)
+            cached = interpolant_cache().get(key, start_time, end_time)
+            if cached is not None:
+                self.position_interpolant, self.velocity_interpolant = cached
+                return
+
+        if method == "chebyshev":
+            self.position_interpolant = self.ephemeris_source(start_time, end_time)
+            self.velocity_interpolant = self.position_interpolant.differentiate()
+
+        elif method == "hermite":
+            source = self.ephemeris_source(start_time, end_time)
+            spacing = hermite_node_spacing(source, start_time, end_time, tolerance)
+
+            # Whole records over the span, spaced exactly as they are evaluated
+            n = max(int(np.ceil((end_time - start_time) / spacing)), 1)
+            step = (end_time - start_time) / n if end_time > start_time \
+                else source.end_time - start_time
+            states = source.states(start_time + step * np.arange(n + 1))
+
+            self.position_interpolant = hermite_interpolant(
+                start_time, step, states[:, :3], states[:, 3:])
+            self.velocity_interpolant = self.position_interpolant.differentiate()
+
+        elif method == "lerp":
+            n = max(int(np.ceil((end_time - start_time) * 10)), 1) + 1  # 10 steps per day
+
+            t_jd = np.linspace(start_time, max(end_time, start_time + 0.1), n)
+
+            states = self.ephemeris_source(start_time, end_time).states(t_jd)
+
+            self.position_interpolant = FastLerp(
+                t_jd, states[:, :3].T)
+            self.velocity_interpolant = FastLerp(
+                t_jd, states[:, 3:].T)
+
+        else:
+            raise ValueError(f"Unknown interpolation method: {method}")
+
+        if use_cache:
+            interpolant_cache().put(key, self.position_interpolant, self.velocity_interpolant)
 
-        t_jd = np.linspace(start_time, end_time, n)
+    def _interpolant_key(self, start_time: float, end_time: float, method: str,
+                         tolerance: float) -> tuple:
+        # Interpolants from an ephemeris cache file are kept apart from those
+        # read from DE440, as they share its memory map
+        cache = active_ephemeris_cache()
+        source = cache.path if cache is not None and \
+            cache.covers(self.ephemeris_id, start_time, end_time) else None
 
-        position_arr, velocity_arr = de440[0, self.ephemeris_id].compute_and_differentiate(
-            t_jd)
+        return (self.ephemeris_id, method, tolerance if method == "hermite" else None, source)
 
-        self.position_interpolant = FastLerp(
-            t_jd, position_arr * 1e3)
-        self.velocity_interpolant = FastLerp(
-            t_jd, velocity_arr * 1e3 / 86400)
+    def ephemeris_source(self, start_time: float, end_time: float) -> ChebyshevInterpolant:
+        '''
+        Returns the Chebyshev records of the body's position in m covering a
+        time span, see ephemeris_source.
+        '''
+        return ephemeris_source(self.ephemeris_id, start_time, end_time)
 
     def get_position(self, time: float) -> np.ndarray:
         '''
@@ -62,12 +150,14 @@ class CelestialBody:
         Parameters
         ----------
         time : float
-            The time at which to get the position of the body in Julian days
+            The time at which to get the position of the body in Julian days,
+            or an array of N times
 
         Returns
         -------
         np.ndarray
-            The position of the body at the specified time in the ICRS frame
+            The position of the body at the specified time in the ICRS frame,
+            of shape (3,) or (N, 3)
         '''
         if self.position_interpolant is None:
             raise Exception(
@@ -81,18 +171,44 @@ class CelestialBody:
         Parameters
         ----------
         time : float
-            The time at which to get the velocity of the body in Julian days
+            The time at which to get the velocity of the body in Julian days,
+            or an array of N times
 
         Returns
         -------
         np.ndarray
-            The velocity of the body at the specified time in the ICRS frame
+            The velocity of the body at the specified time in the ICRS frame,
+            of shape (3,) or (N, 3)
         '''
         if self.velocity_interpolant is None:
             raise Exception(
                 "Interpolant has not been constructed for this body")
         return self.velocity_interpolant(time)
 
+    def get_state(self, time: float) -> np.ndarray:
+        '''
+        Returns the position and velocity of the body at the specified time
+        in [m, m, m, m/s, m/s, m/s] [ICRS]
+
+        With a Chebyshev interpolant, both come from a single evaluation.
+
+        Parameters
+        ----------
+        time : float
+            The time at which to get the state of the body in Julian days,
+            or an array of N times
+
+        Returns
+        -------
+        np.ndarray
+            The state of the body at the specified time in the ICRS frame,
+            of shape (6,) or (N, 6)
+        '''
+        if isinstance(self.position_interpolant, ChebyshevInterpolant):
+            return self.position_interpolant.state(time) if np.ndim(time) == 0 \
+                else self.position_interpolant.states(time)
+        return np.concatenate((self.get_position(time), self.get_velocity(time)), axis=-1)
+
     @property
     def mu(self) -> float:
         return self.mass * G
@@ -0,0 +1,188 @@
+'''
+Compact, memory-mappable excerpts of the DE440 ephemeris.
+
+A cache file holds the Chebyshev records of a few barycentric segments over
+a chosen date range, already scaled to meters. It is a few MB instead of the
+114 MB kernel and can be used without jplephem.
+
+File layout (little endian):
+- 8 bytes: MAGIC
+- uint32: format version
+- uint32: length of the JSON header in bytes
+- JSON header, padded so that the data starts on a 64 byte boundary
+- float64 data: the records of each body, at the offsets given in the header
+
+Create a cache with:
+python -m flyby.solar_system_model.ephemeris_cache OUTPUT START END
+'''
+import argparse
+import json
+import os
+import struct
+
+import numpy as np
+
+from flyby.math_utilities.chebyshev_interpolator import ChebyshevInterpolant
+from flyby.solar_system_model.jpl_ephemeris import de440, EphemerisProvider
+from flyby.time_model.julian_day import datetime64_to_jd
+
+MAGIC = b"FLYBYEPH"
+CACHE_FORMAT_VERSION = 1
+
+# Environment variable naming a cache file to use automatically
+EPHEMERIS_CACHE_VARIABLE = "FLYBY_EPHEMERIS_CACHE"
+
+_PREAMBLE = struct.Struct("<8sII")
+_ALIGNMENT = 64
+
+
+def write_ephemeris_cache(path: str, start_time: float, end_time: float,
+                          ephemeris_ids: "list[int]" = None,
+                          provider: EphemerisProvider = de440) -> None:
+    '''
+    Extracts the barycentric segments of several bodies over a time span into
+    a cache file.
+
+    Parameters
+    ----------
+    path : str
+        The file to write.
+    start_time : float
+        The start of the span in Julian days.
+    end_time : float
+        The end of the span in Julian days.
+    ephemeris_ids : list[int], optional
+        The bodies to extract, by default those of RelationalTree.solar_system().
+    provider : EphemerisProvider, optional
+        The ephemeris to extract from, by default DE440.
+    '''
+    if ephemeris_ids is None:
+        from flyby.solar_system_model.relational_tree import RelationalTree
+        ephemeris_ids = [body.ephemeris_id for body in RelationalTree.solar_system().all_bodies]
+
+    bodies = {}
+    arrays = []
+    offset = 0
+
+    for ephemeris_id in ephemeris_ids:
+        interpolant = ChebyshevInterpolant.from_segment(
+            provider.segment(ephemeris_id), start_time, end_time, scale=1e3)
+
+        bodies[str(ephemeris_id)] = {
+            "jd_start": interpolant.jd_start,
+            "jd_step": interpolant.jd_step,
+            "shape": list(interpolant.coefficients.shape),
+            "offset": offset,
+        }
+        arrays.append(interpolant.coefficients)
+        offset += interpolant.coefficients.size
+
+    header = json.dumps({
+        "version": CACHE_FORMAT_VERSION,
+        "source": os.path.basename(provider.path),
+        "start_time": start_time,
+        "end_time": end_time,
+        "units": "m",
+        "bodies": bodies,
+    }).encode("utf-8")
+
+    data_start = _PREAMBLE.size + len(header)
+    header += b" " * (-data_start % _ALIGNMENT)
+
+    with open(path, "wb") as f:
+        f.write(_PREAMBLE.pack(MAGIC, CACHE_FORMAT_VERSION, len(header)))
+        f.write(header)
+        for array in arrays:
+            f.write(np.ascontiguousarray(array, dtype="<f8").tobytes())
+
+
+class EphemerisCache:
+    '''
+    A memory-mapped ephemeris cache file, see write_ephemeris_cache.
+    '''
+
+    def __init__(self, path: str) -> None:
+        self.path = os.path.abspath(path)
+
+        with open(self.path, "rb") as f:
+            magic, version, header_length = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not an ephemeris cache file")
+            if version != CACHE_FORMAT_VERSION:
+                raise ValueError(
+                    f"{path} has cache format version {version}, expected {CACHE_FORMAT_VERSION}")
+            self.header: dict = json.loads(f.read(header_length))
+
+        self.data = np.memmap(self.path, dtype="<f8", mode="r",
+                              offset=_PREAMBLE.size + header_length)
+
+    def __repr__(self):
+        return f"EphemerisCache({self.path})"
+
+    @property
+    def ephemeris_ids(self) -> "list[int]":
+        return [int(ephemeris_id) for ephemeris_id in self.header["bodies"]]
+
+    def covers(self, ephemeris_id: int, start_time: float, end_time: float) -> bool:
+        '''
+        Whether the cache holds a body over the whole of a time span.
+        '''
+        body = self.header["bodies"].get(str(ephemeris_id))
+        if body is None:
+            return False
+
+        return body["jd_start"] <= start_time and \
+            end_time <= body["jd_start"] + body["jd_step"] * body["shape"][0]
+
+    def interpolant(self, ephemeris_id: int, start_time: float = None,
+                    end_time: float = None) -> ChebyshevInterpolant:
+        '''
+        Returns an interpolant of a body's position in m, backed by the memory
+        map, optionally restricted to the records covering a time span.
+        '''
+        body = self.header["bodies"][str(ephemeris_id)]
+        size = int(np.prod(body["shape"]))
+        coefficients = self.data[body["offset"]:body["offset"] + size].reshape(body["shape"])
+
+        interpolant = ChebyshevInterpolant(body["jd_start"], body["jd_step"], coefficients)
+        if start_time is None:
+            return interpolant
+        return interpolant.span(start_time, end_time)
+
+
+_active_cache: EphemerisCache = None
+
+
+def use_ephemeris_cache(path: str = None) -> EphemerisCache:
+    '''
+    Makes CelestialBody read ephemerides from a cache file whenever it covers
+    the requested span, or stops using a cache if path is None.
+    '''
+    global _active_cache
+    _active_cache = EphemerisCache(path) if path is not None else None
+    return _active_cache
+
+
+def active_ephemeris_cache() -> EphemerisCache:
+    '''
+    Returns the cache in use, loading the one named by FLYBY_EPHEMERIS_CACHE
+    on first use, or None.
+    '''
+    if _active_cache is None and os.environ.get(EPHEMERIS_CACHE_VARIABLE):
+        use_ephemeris_cache(os.environ[EPHEMERIS_CACHE_VARIABLE])
+    return _active_cache
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Extract the solar system barycenters from DE440 into a compact cache file.")
+    parser.add_argument("output", help="the cache file to write")
+    parser.add_argument("start", help="start date, e.g. 2020-01-01")
+    parser.add_argument("end", help="end date, e.g. 2060-01-01")
+    args = parser.parse_args()
+
+    write_ephemeris_cache(args.output,
+                          datetime64_to_jd(np.datetime64(args.start)),
+                          datetime64_to_jd(np.datetime64(args.end)))
+
+    print(f"Wrote {args.output} ({os.path.getsize(args.output) / 1e6:.2f} MB)")
@@ -0,0 +1,140 @@
+'''
+A process-wide cache of the interpolants built by
+CelestialBody.construct_interpolant.
+
+Every RelationalTree.solar_system() creates new bodies, and simulate()
+rebuilds their interpolants for every run. The cache shares them across
+bodies, spacecraft and simulations: an interpolant is reused for any span
+it covers, and the least recently used ones are evicted once they exceed a
+memory budget.
+
+The cached interpolants are shared and must not be modified.
+'''
+from collections import OrderedDict
+import threading
+
+import numpy as np
+
+from flyby.math_utilities.chebyshev_interpolator import ChebyshevInterpolant
+from flyby.math_utilities.fast_linear_interpolator import FastLerp
+
+
+class InterpolantCache:
+    '''
+    Position and velocity interpolants keyed on (body, method, resolution,
+    source), each covering a time span.
+    '''
+
+    def __init__(self, max_bytes: float = 256e6) -> None:
+        '''
+        :param max_bytes: The memory budget of the cached interpolants, by default 256 MB
+        '''
+        self.max_bytes: float = max_bytes
+        self.hits: int = 0
+        self.misses: int = 0
+
+        # (key, start, end) -> (position interpolant, velocity interpolant, nbytes),
+        # least recently used first
+        self._entries: OrderedDict = OrderedDict()
+        self._nbytes: int = 0
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"InterpolantCache({len(self._entries)} entries, {self._nbytes / 1e6:.1f} MB, " \
+            f"{self.hits} hits, {self.misses} misses)"
+
+    def get(self, key: tuple, start_time: float, end_time: float) -> tuple:
+        '''
+        Returns the position and velocity interpolants of a key covering a
+        time span, or None.
+
+        Chebyshev interpolants are restricted to the records of the span, so
+        that a long cached span does not enlarge the stacked ephemeris tables.
+        '''
+        with self._lock:
+            for entry, (position, velocity, _) in self._entries.items():
+                if entry[0] == key and entry[1] <= start_time and end_time <= entry[2]:
+                    self._entries.move_to_end(entry)
+                    self.hits += 1
+                    break
+            else:
+                self.misses += 1
+                return None
+
+        if isinstance(position, ChebyshevInterpolant):
+            position = position.span(start_time, end_time)
+            velocity = position.differentiate()
+        return position, velocity
+
+    def put(self, key: tuple, position, velocity) -> None:
+        '''
+        Adds the interpolants of a key, replacing those covering a part of
+        their span, and evicts the least recently used beyond the budget.
+        '''
+        start_time, end_time = interpolant_span(position)
+        nbytes = interpolant_nbytes(position)
+        if not isinstance(velocity, ChebyshevInterpolant) or \
+                velocity.coefficients is not position.coefficients:
+            nbytes += interpolant_nbytes(velocity)
+
+        with self._lock:
+            for entry in [entry for entry in self._entries
+                          if entry[0] == key and start_time <= entry[1] and entry[2] <= end_time]:
+                self._nbytes -= self._entries.pop(entry)[2]
+
+            self._entries[(key, start_time, end_time)] = (position, velocity, nbytes)
+            self._nbytes += nbytes
+
+            while self._nbytes > self.max_bytes and len(self._entries) > 1:
+                self._nbytes -= self._entries.popitem(last=False)[1][2]
+
+    def clear(self) -> None:
+        '''
+        Removes all interpolants and resets the counters.
+        '''
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        '''
+        Returns the number of hits, misses and entries, and the memory used
+        in bytes.
+        '''
+        return {"hits": self.hits, "misses": self.misses,
+                "entries": len(self._entries), "nbytes": self._nbytes}
+
+
+def interpolant_span(interpolant: "FastLerp | ChebyshevInterpolant") -> "tuple[float, float]":
+    '''
+    Returns the start and end of the span an interpolant covers in Julian days.
+    '''
+    if isinstance(interpolant, FastLerp):
+        return float(interpolant.jd[0]), float(interpolant.jd[-1])
+    return float(interpolant.jd_start), float(interpolant.end_time)
+
+
+def interpolant_nbytes(interpolant: "FastLerp | ChebyshevInterpolant") -> int:
+    '''
+    Returns the memory held by an interpolant in bytes, excluding memory maps.
+    '''
+    if isinstance(interpolant, FastLerp):
+        return interpolant.arr.nbytes + interpolant.jd.nbytes
+    array = interpolant.coefficients
+    while array is not None:
+        if isinstance(array, np.memmap):
+            return 0
+        array = getattr(array, "base", None)
+    return interpolant.coefficients.nbytes
+
+
+_interpolant_cache = InterpolantCache()
+
+
+def interpolant_cache() -> InterpolantCache:
+    '''
+    Returns the process-wide interpolant cache.
+    '''
+    return _interpolant_cache
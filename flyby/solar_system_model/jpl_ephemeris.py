@@ -1,18 +1,136 @@
 import os
+import threading
 import urllib.request
 from jplephem.spk import SPK
 
 DE440_URL = "https://naif.jpl.nasa.gov/pub/naif/generic_kernels/spk/planets/de440.bsp"
 
-# Download the DE440 ephemeris file if it is not already present
-filename = "de440.bsp"
-if not os.path.exists(filename):
-    print("Downloading DE440 ephemeris file (114 MB)...")
-    urllib.request.urlretrieve(DE440_URL, filename)
-    print("Done.")
+# Environment variable which overrides the location of the ephemeris file
+EPHEMERIS_PATH_VARIABLE = "FLYBY_EPHEMERIS_PATH"
 
-# Load the DE440 ephemeris file.
-# This is a binary file that contains the positions of the planets and
-# other solar system bodies.
 
-de440 = SPK.open('de440.bsp')
+def default_cache_directory() -> str:
+    '''
+    Returns the directory in which downloaded ephemeris files are stored.
+    '''
+    cache_home = os.environ.get(
+        "XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(cache_home, "flyby")
+
+
+class EphemerisProvider:
+    '''
+    Lazily opened JPL SPK ephemeris kernel.
+
+    Nothing is read until a segment is first requested. The kernel is then
+    opened through jplephem, which memory-maps the coefficient arrays, so
+    only the pages of the segments actually used are loaded and processes
+    using the same file share them through the page cache.
+
+    The file is located, in order of preference, from:
+    - the path given to the constructor or to configure()
+    - the FLYBY_EPHEMERIS_PATH environment variable
+    - the filename in the current directory, if it exists there
+    - the filename in the user cache directory, downloading it if needed
+
+    The resolved path is made absolute, so changing directory afterwards
+    has no effect.
+    '''
+
+    def __init__(self, filename: str = "de440.bsp", url: str = DE440_URL,
+                 path: str = None, download: bool = True) -> None:
+        '''
+        :param filename: Name of the ephemeris file
+        :param url: Where to download the ephemeris file from if it is missing
+        :param path: Explicit location of the ephemeris file
+        :param download: Whether a missing file may be downloaded
+        '''
+        self.filename = filename
+        self.url = url
+        self.download = download
+
+        self._path: str = path
+        self._kernel: SPK = None
+        self._pid: int = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        state = "open" if self._kernel is not None else "not opened"
+        return f"EphemerisProvider({self.filename}, {state})"
+
+    def configure(self, path: str = None, download: bool = None) -> None:
+        '''
+        Changes where the ephemeris file is read from, closing it if it is open.
+        '''
+        self.close()
+        self._path = path
+        if download is not None:
+            self.download = download
+
+    @property
+    def path(self) -> str:
+        '''
+        The absolute path of the ephemeris file.
+        '''
+        if self._path is None:
+            path = os.environ.get(EPHEMERIS_PATH_VARIABLE)
+            if path is None:
+                path = self.filename if os.path.exists(self.filename) \
+                    else os.path.join(default_cache_directory(), self.filename)
+            self._path = os.path.abspath(path)
+        return self._path
+
+    @property
+    def kernel(self) -> SPK:
+        '''
+        The opened SPK kernel, opening (and possibly downloading) it on first use.
+        '''
+        # A forked child must not share the parent's file offset, so it
+        # reopens the file; the mapped pages are still shared.
+        if self._kernel is None or self._pid != os.getpid():
+            with self._lock:
+                if self._kernel is None or self._pid != os.getpid():
+                    self._kernel = SPK.open(self._ensure_file())
+                    self._pid = os.getpid()
+        return self._kernel
+
+    def _ensure_file(self) -> str:
+        path = self.path
+        if not os.path.exists(path):
+            if not self.download:
+                raise FileNotFoundError(f"Ephemeris file not found: {path}")
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            print(f"Downloading {self.filename} ephemeris file to {path}...")
+            urllib.request.urlretrieve(self.url, path + ".part")
+            os.replace(path + ".part", path)
+            print("Done.")
+        return path
+
+    def segment(self, ephemeris_id: int):
+        '''
+        Returns the segment giving the position of a body relative to the
+        solar system barycenter, i.e. kernel[0, ephemeris_id].
+        '''
+        return self.kernel[0, ephemeris_id]
+
+    def __getitem__(self, key):
+        '''
+        Given (center, target) integers, return the matching segment.
+        '''
+        return self.kernel[key]
+
+    def close(self) -> None:
+        '''
+        Closes the kernel if it is open; it will be reopened on next use.
+        '''
+        with self._lock:
+            if self._kernel is not None and self._pid == os.getpid():
+                self._kernel.close()
+            self._kernel = None
+            self._pid = None
+
+
+# The DE440 ephemeris, containing the positions of the planets and other
+# solar system bodies. It is opened on first use.
+de440 = EphemerisProvider()
@@ -1,4 +1,6 @@
-from .celestial_body import CelestialBody
+import numpy as np
+
+from .celestial_body import CelestialBody, ephemeris_source
 
 
 class RelationalTreeNode(CelestialBody):
@@ -12,6 +14,62 @@ class RelationalTreeNode(CelestialBody):
         child.parent = self
         self.children.append(child)
 
+    def sphere_of_influence(self, jd: float) -> float:
+        '''
+        Returns the radius of the body's sphere of influence with respect to
+        its parent in meters, a (m / M)^(2/5) with a the semi-major axis of
+        its osculating orbit at the given Julian date. Infinite for the root.
+        '''
+        if self.parent is None:
+            return np.inf
+
+        # From the ephemeris cache if it covers jd, in m and m/s
+        state = ephemeris_source(self.ephemeris_id, jd, jd).state(jd)
+        state_parent = ephemeris_source(self.parent.ephemeris_id, jd, jd).state(jd)
+        r_rel = np.linalg.norm(state[:3] - state_parent[:3])
+        v_rel = np.linalg.norm(state[3:] - state_parent[3:])
+
+        a = 1 / (2 / r_rel - v_rel**2 / (self.mu + self.parent.mu))
+        return a * (self.mass / self.parent.mass)**0.4
+
+
+def sphere_of_influence_bodies(bodies: "list[RelationalTreeNode]", t_jd: np.ndarray,
+                               positions: np.ndarray, radii: np.ndarray = None) -> np.ndarray:
+    '''
+    Returns the ephemeris ID of the body in whose sphere of influence each
+    position is, the innermost one where spheres are nested. Positions
+    outside of all spheres get -1, which does not happen if the root of the
+    tree is among the bodies.
+
+    Parameters
+    ----------
+    bodies : list[RelationalTreeNode]
+        The candidate bodies, e.g. RelationalTree.solar_system().all_bodies
+    t_jd : np.ndarray
+        The Julian dates of the positions, of shape (n,)
+    positions : np.ndarray
+        Barycentric ICRS positions in meters, of shape (n, 3)
+    radii : np.ndarray, optional
+        The radii of the spheres of influence of the bodies, by default
+        computed at the first date
+    '''
+    if radii is None:
+        radii = np.array([body.sphere_of_influence(t_jd[0]) for body in bodies])
+
+    ids = np.full(len(t_jd), -1, dtype=np.int64)
+    innermost = np.full(len(t_jd), np.inf)
+
+    for body, radius in zip(bodies, radii):
+        if np.isinf(radius):
+            inside = np.isinf(innermost)
+        else:
+            r_body = ephemeris_source(body.ephemeris_id, t_jd.min(), t_jd.max()).states(t_jd)[:, :3]
+            inside = (np.linalg.norm(positions - r_body, axis=1) < radius) & (radius < innermost)
+        ids[inside] = body.ephemeris_id
+        innermost[inside] = radius
+
+    return ids
+
 
 class RelationalTree:
     def __init__(self, root_body: CelestialBody) -> None:
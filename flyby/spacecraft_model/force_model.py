@@ -0,0 +1,111 @@
+'''
+Adaptive selection of the bodies whose gravity is evaluated.
+
+Evaluating the gravity of every interacting body at every step is wasted on
+bodies whose pull is negligible, e.g. Neptune's in a low Earth orbit. The
+force model picks the bodies to include for a segment of the propagation at
+a time, from the state at its start, so that the accelerations omitted add
+up to at most a tolerance over the whole segment.
+
+Omitted bodies keep their tables but get a gravitational parameter of 0,
+which n_body_rates skips, so event and ephemeris lookups are unaffected.
+'''
+import numpy as np
+
+from flyby.solar_system_model.celestial_body import CelestialBody
+from flyby.solar_system_model.relational_tree import sphere_of_influence_bodies
+
+
+class AdaptiveForceModel:
+    def __init__(self, tolerance: float = 1e-9, segment: float = 86400.0) -> None:
+        '''
+        :param tolerance: The maximum sum of the omitted accelerations in m/s^2
+        :param segment: The simulated time in seconds for which a selection is used
+        '''
+        self.tolerance: float = tolerance
+        self.segment: float = segment
+
+        # The start time in seconds and active bodies of each segment
+        self.segments: "list[tuple[float, np.ndarray]]" = []
+
+        # The radii of the spheres of influence by ephemeris ID, sized once
+        # as for events
+        self._radii: "dict[int, float]" = {}
+
+    def __repr__(self):
+        return f"AdaptiveForceModel(tolerance={self.tolerance}, segment={self.segment})"
+
+    def active(self, bodies: "list[CelestialBody]", t_jd: float, u: np.ndarray) -> np.ndarray:
+        '''
+        Returns which bodies to include for a segment starting at a state.
+
+        The root of the RelationalTree and the bodies whose spheres of
+        influence contain the spacecraft are always included. The others are
+        omitted, weakest first, while the sum of bounds on their
+        accelerations over the segment stays within the tolerance: each body
+        is assumed to approach the spacecraft at their current relative
+        speed, plus the spacecraft's current acceleration.
+
+        Parameters
+        ----------
+        bodies : list[CelestialBody]
+            The interacting bodies, with their interpolants constructed
+        t_jd : float
+            The Julian date at the start of the segment
+        u : np.ndarray
+            The ICRS state of the spacecraft at the start of the segment
+
+        Returns
+        -------
+        np.ndarray
+            A boolean mask over the bodies
+        '''
+        states = np.array([body.get_state(t_jd) for body in bodies])
+        mu = np.array([body.mu for body in bodies])
+
+        r_rel = u[:3] - states[:, :3]
+        distance = np.linalg.norm(r_rel, axis=1)
+        speed = np.linalg.norm(u[3:] - states[:, 3:], axis=1)
+        acceleration = np.linalg.norm(np.sum(-mu[:, np.newaxis] * r_rel / distance[:, np.newaxis]**3, axis=0))
+
+        reach = speed * self.segment + acceleration * self.segment**2 / 2
+        closest = np.maximum(distance - reach, 0)
+        with np.errstate(divide="ignore"):
+            bound = np.where(closest > 0, mu / closest**2, np.inf)
+
+        required = np.zeros(len(bodies), dtype=np.bool_)
+        nodes = [body for body in bodies if hasattr(body, "sphere_of_influence")]
+        if nodes:
+            for body in nodes:
+                if body.ephemeris_id not in self._radii:
+                    self._radii[body.ephemeris_id] = body.sphere_of_influence(t_jd)
+            radii = np.array([self._radii[body.ephemeris_id] for body in nodes])
+            soi_id = sphere_of_influence_bodies(nodes, np.array([t_jd]), u[np.newaxis, :3], radii)[0]
+            node = next((body for body in nodes if body.ephemeris_id == soi_id), None)
+            while node is not None:
+                required |= np.array([body.ephemeris_id == node.ephemeris_id for body in bodies])
+                node = node.parent
+            required |= np.array([getattr(body, "parent", 0) is None for body in bodies])
+
+        active = np.ones(len(bodies), dtype=np.bool_)
+        omitted = 0.0
+        for b in np.argsort(bound):
+            if required[b]:
+                continue
+            if omitted + bound[b] > self.tolerance:
+                break
+            omitted += bound[b]
+            active[b] = False
+
+        return active
+
+    def tables(self, bodies: "list[CelestialBody]", tables: tuple, t: float, jd_0: float,
+               u: np.ndarray) -> tuple:
+        '''
+        Returns the stacked ephemeris tables (see stack_ephemeris_tables) of
+        the bodies for a segment starting t seconds after jd_0, with the
+        gravitational parameters of the omitted bodies set to 0.
+        '''
+        active = self.active(bodies, jd_0 + t / 86400, u)
+        self.segments.append((t, active))
+        return tables[:5] + (np.where(active, tables[5], 0.0),)
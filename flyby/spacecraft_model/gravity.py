@@ -1,7 +1,8 @@
+from numba import njit
 import numpy as np
 
+from flyby.math_utilities.chebyshev_interpolator import locate_record
 from flyby.solar_system_model.celestial_body import CelestialBody
-from flyby.solar_system_model.jpl_ephemeris import de440
 
 
 def gravity(icrs_state: np.ndarray, t_jd: float, body: CelestialBody):
@@ -23,3 +24,304 @@ def gravity(icrs_state: np.ndarray, t_jd: float, body: CelestialBody):
     r_rel = icrs_state[:3] - r_body
 
     return -body.mu * r_rel / np.linalg.norm(r_rel)**3
+
+
+def stack_ephemeris_tables(bodies: "list[CelestialBody]") -> tuple:
+    '''
+    Stacks the position interpolants of several bodies into arrays which can
+    be passed to n_body_rates.
+
+    Every interpolant is expressed as piecewise Chebyshev records over a
+    uniform grid (see ChebyshevInterpolant); linear interpolants become
+    degree 1 records. Grids and degrees may differ between bodies.
+
+    Parameters
+    ----------
+    bodies : list[CelestialBody]
+        The bodies to stack. Each must have had its interpolant constructed.
+
+    Returns
+    -------
+    tuple
+        (jd_start, jd_step, n_records, n_coefficients, coefficients, mu),
+        where coefficients is of shape
+        (n_bodies, max(n_records), 3, max(n_coefficients)) and padded with zeros.
+    '''
+    n_bodies = len(bodies)
+
+    jd_start = np.empty(n_bodies)
+    jd_step = np.empty(n_bodies)
+    n_records = np.empty(n_bodies, dtype=np.int64)
+    n_coefficients = np.empty(n_bodies, dtype=np.int64)
+    mu = np.empty(n_bodies)
+    tables = []
+
+    for b, body in enumerate(bodies):
+        if body.position_interpolant is None:
+            raise Exception(
+                f"Interpolant has not been constructed for {body.name}")
+
+        jd_start[b], jd_step[b], table = body.position_interpolant.chebyshev_table()
+        n_records[b], _, n_coefficients[b] = table.shape
+        mu[b] = body.mu
+        tables.append(table)
+
+    coefficients = np.zeros(
+        (n_bodies, n_records.max(), 3, n_coefficients.max()))
+    for b, table in enumerate(tables):
+        coefficients[b, :n_records[b], :, :n_coefficients[b]] = table
+
+    return jd_start, jd_step, n_records, n_coefficients, coefficients, mu
+
+
+@njit
+def body_position(b: int, t_jd: float, jd_start: np.ndarray, jd_step: np.ndarray,
+                  n_records: np.ndarray, n_coefficients: np.ndarray, coefficients: np.ndarray):
+    '''
+    Returns the position (x, y, z) of body b of a stacked ephemeris table at
+    the specified Julian date, clamped to the ends of its table.
+    '''
+    i, s = locate_record(jd_start[b], jd_step[b], n_records[b], t_jd)
+
+    # Chebyshev series by forward recurrence
+    x = coefficients[b, i, 0, 0]
+    y = coefficients[b, i, 1, 0]
+    z = coefficients[b, i, 2, 0]
+    t_prev, t = 1.0, s
+    for k in range(1, n_coefficients[b]):
+        if k > 1:
+            t_prev, t = t, 2.0 * s * t - t_prev
+        x += coefficients[b, i, 0, k] * t
+        y += coefficients[b, i, 1, k] * t
+        z += coefficients[b, i, 2, k] * t
+
+    return x, y, z
+
+
+@njit
+def body_acceleration(b: int, t_jd: float, jd_start: np.ndarray, jd_step: np.ndarray,
+                      n_records: np.ndarray, n_coefficients: np.ndarray, coefficients: np.ndarray):
+    '''
+    Returns the acceleration (ax, ay, az) in m/s^2 of body b of a stacked
+    ephemeris table at the specified Julian date, the second derivative of
+    its Chebyshev series, and 0 for linear interpolants.
+    '''
+    i, s = locate_record(jd_start[b], jd_step[b], n_records[b], t_jd)
+
+    # d^2T_k/ds^2 by forward recurrence, with T_k and dT_k/ds
+    ax = ay = az = 0.0
+    t_prev, t = 1.0, s
+    dt_prev, dt = 0.0, 1.0
+    ddt_prev, ddt = 0.0, 0.0
+    for k in range(2, n_coefficients[b]):
+        t_prev, t, dt_prev, dt, ddt_prev, ddt = (
+            t, 2.0 * s * t - t_prev,
+            dt, 2.0 * t + 2.0 * s * dt - dt_prev,
+            ddt, 4.0 * dt + 2.0 * s * ddt - ddt_prev)
+        ax += coefficients[b, i, 0, k] * ddt
+        ay += coefficients[b, i, 1, k] * ddt
+        az += coefficients[b, i, 2, k] * ddt
+
+    # (ds/dt)^2 over one record of jd_step days
+    rate = (2.0 / (jd_step[b] * 86400))**2
+    return ax * rate, ay * rate, az * rate
+
+
+@njit
+def n_body_rates(t_jd: float, u: np.ndarray, jd_start: np.ndarray, jd_step: np.ndarray,
+                 n_records: np.ndarray, n_coefficients: np.ndarray,
+                 coefficients: np.ndarray, mu: np.ndarray) -> np.ndarray:
+    '''
+    Returns the time derivative of the spacecraft state under the gravity of
+    all bodies in a stacked ephemeris table (see stack_ephemeris_tables).
+
+    Body positions are clamped to the ends of each table, matching
+    lerp_numba. The only allocation is the returned array.
+
+    Parameters
+    ----------
+    t_jd : float
+        The Julian date at which to evaluate the rates.
+    u : np.ndarray
+        The state of the spacecraft [x y z vx vy vz] in the ICRS frame,
+        given in units of [m, m, m, m/s, m/s, m/s].
+    jd_start, jd_step, n_records, n_coefficients, coefficients, mu : np.ndarray
+        The stacked ephemeris tables.
+
+    Returns
+    -------
+    np.ndarray
+        The time derivative of the state [vx vy vz ax ay az].
+    '''
+    rates = np.empty(6)
+    n_body_rates_into(rates, t_jd, u, jd_start, jd_step,
+                      n_records, n_coefficients, coefficients, mu)
+    return rates
+
+
+@njit
+def n_body_rates_into(rates: np.ndarray, t_jd: float, u: np.ndarray, jd_start: np.ndarray,
+                      jd_step: np.ndarray, n_records: np.ndarray, n_coefficients: np.ndarray,
+                      coefficients: np.ndarray, mu: np.ndarray):
+    '''
+    Writes the rates of n_body_rates into an existing array of shape (6,),
+    for integrators which evaluate them in their inner loop.
+
+    Bodies with a gravitational parameter of 0 are skipped without
+    evaluating their positions, see AdaptiveForceModel.
+    '''
+    ax = 0.0
+    ay = 0.0
+    az = 0.0
+
+    for b in range(mu.shape[0]):
+        if mu[b] == 0.0:
+            continue
+        x, y, z = body_position(b, t_jd, jd_start, jd_step,
+                                n_records, n_coefficients, coefficients)
+
+        dx = u[0] - x
+        dy = u[1] - y
+        dz = u[2] - z
+
+        r2 = dx * dx + dy * dy + dz * dz
+        g = mu[b] / (r2 * np.sqrt(r2))
+
+        ax -= g * dx
+        ay -= g * dy
+        az -= g * dz
+
+    rates[0] = u[3]
+    rates[1] = u[4]
+    rates[2] = u[5]
+    rates[3] = ax
+    rates[4] = ay
+    rates[5] = az
+
+
+@njit
+def central_body_rates_into(rates: np.ndarray, t_jd: float, u: np.ndarray, central: int,
+                            jd_start: np.ndarray, jd_step: np.ndarray, n_records: np.ndarray,
+                            n_coefficients: np.ndarray, coefficients: np.ndarray, mu: np.ndarray):
+    '''
+    Writes the time derivative of the spacecraft state relative to one of
+    the bodies, the central body, into an array of shape (6,).
+
+    The equations of motion are those of n_body_rates, less the
+    acceleration of the central body along its ephemeris (Cowell's method
+    in a body-centred frame). As the state is then of the size of the orbit
+    about the central body rather than about the barycentre, the
+    integrators resolve it far more finely.
+
+    Parameters
+    ----------
+    rates : np.ndarray
+        The array to write [vx vy vz ax ay az] to
+    t_jd : float
+        The Julian date at which to evaluate the rates.
+    u : np.ndarray
+        The state of the spacecraft relative to the central body, in the
+        ICRS axes and in units of [m, m, m, m/s, m/s, m/s].
+    central : int
+        The index of the central body in the stacked ephemeris tables
+    jd_start, jd_step, n_records, n_coefficients, coefficients, mu : np.ndarray
+        The stacked ephemeris tables.
+    '''
+    x_c, y_c, z_c = body_position(central, t_jd, jd_start, jd_step,
+                                  n_records, n_coefficients, coefficients)
+    ax_c, ay_c, az_c = body_acceleration(central, t_jd, jd_start, jd_step,
+                                         n_records, n_coefficients, coefficients)
+
+    ax = -ax_c
+    ay = -ay_c
+    az = -az_c
+
+    for b in range(mu.shape[0]):
+        if mu[b] == 0.0:
+            continue
+
+        # The offsets of the bodies are taken before adding the small
+        # relative position, which the central body's own term uses as is
+        dx = u[0]
+        dy = u[1]
+        dz = u[2]
+        if b != central:
+            x, y, z = body_position(b, t_jd, jd_start, jd_step,
+                                    n_records, n_coefficients, coefficients)
+            dx += x_c - x
+            dy += y_c - y
+            dz += z_c - z
+
+        r2 = dx * dx + dy * dy + dz * dz
+        g = mu[b] / (r2 * np.sqrt(r2))
+
+        ax -= g * dx
+        ay -= g * dy
+        az -= g * dz
+
+    rates[0] = u[3]
+    rates[1] = u[4]
+    rates[2] = u[5]
+    rates[3] = ax
+    rates[4] = ay
+    rates[5] = az
+
+
+@njit
+def n_body_rates_batch(t_jd: float, u: np.ndarray, jd_start: np.ndarray, jd_step: np.ndarray,
+                       n_records: np.ndarray, n_coefficients: np.ndarray,
+                       coefficients: np.ndarray, mu: np.ndarray) -> np.ndarray:
+    '''
+    Batched version of n_body_rates for N spacecraft sharing the same epoch.
+
+    The body positions are evaluated once and shared by all spacecraft.
+
+    Parameters
+    ----------
+    t_jd : float
+        The Julian date at which to evaluate the rates.
+    u : np.ndarray
+        The concatenated states of the spacecraft, of shape (6N,), each
+        [x y z vx vy vz] in the ICRS frame in units of [m, m, m, m/s, m/s, m/s].
+    jd_start, jd_step, n_records, n_coefficients, coefficients, mu : np.ndarray
+        The stacked ephemeris tables.
+
+    Returns
+    -------
+    np.ndarray
+        The concatenated time derivatives of the states, of shape (6N,).
+    '''
+    n_bodies = mu.shape[0]
+
+    positions = np.empty((n_bodies, 3))
+    for b in range(n_bodies):
+        positions[b, 0], positions[b, 1], positions[b, 2] = body_position(
+            b, t_jd, jd_start, jd_step, n_records, n_coefficients, coefficients)
+
+    rates = np.empty_like(u)
+
+    for j in range(0, u.shape[0], 6):
+        ax = 0.0
+        ay = 0.0
+        az = 0.0
+
+        for b in range(n_bodies):
+            dx = u[j] - positions[b, 0]
+            dy = u[j + 1] - positions[b, 1]
+            dz = u[j + 2] - positions[b, 2]
+
+            r2 = dx * dx + dy * dy + dz * dz
+            g = mu[b] / (r2 * np.sqrt(r2))
+
+            ax -= g * dx
+            ay -= g * dy
+            az -= g * dz
+
+        rates[j] = u[j + 3]
+        rates[j + 1] = u[j + 4]
+        rates[j + 2] = u[j + 5]
+        rates[j + 3] = ax
+        rates[j + 4] = ay
+        rates[j + 5] = az
+
+    return rates
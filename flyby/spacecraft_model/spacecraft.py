@@ -2,7 +2,7 @@ import numpy as np
 from flyby.solar_system_model.jpl_ephemeris import de440
 from scipy.spatial.transform import Rotation as R
 from flyby.solar_system_model.celestial_body import CelestialBody
-from flyby.spacecraft_model.gravity import gravity
+from flyby.spacecraft_model.gravity import n_body_rates, stack_ephemeris_tables
 from flyby.time_model.julian_day import jd_to_datetime64
 
 
@@ -23,16 +23,14 @@ class Spacecraft:
         self.mass: float = 1
 
         self.interacting_bodies: "list[CelestialBody]" = []
+        self.ephemeris_tables: tuple = None
 
     def state_planet(self, body: CelestialBody, jd: float):
         '''
         Returns the state of the spacecraft relative to the planet with the
         given ephemeris ID at the given Julian date.
         '''
-        r = body.get_position(jd)
-        v = body.get_velocity(jd)
-
-        return self.state_icrs - np.concatenate((r, v))
+        return self.state_icrs - body.get_state(jd)
 
     def add_interacting_bodies(self, *bodies: "list[CelestialBody]"):
         '''
@@ -40,6 +38,14 @@ class Spacecraft:
         interacts with.
         '''
         self.interacting_bodies.extend(bodies)
+        self.ephemeris_tables = None
+
+    def stack_ephemeris_tables(self):
+        '''
+        Stacks the interpolant tables of the interacting bodies for use by
+        get_rates. Must be called again whenever the interpolants are rebuilt.
+        '''
+        self.ephemeris_tables = stack_ephemeris_tables(self.interacting_bodies)
 
     def orbital_frame_rel_planet(self, body: CelestialBody, jd: float, u: np.ndarray) -> R:
         '''
@@ -61,11 +67,10 @@ class Spacecraft:
         u : np.ndarray
             The state of the spacecraft in the ICRS frame.
         '''
-        r = body.get_position(jd)
-        v = body.get_velocity(jd)
+        state_body = body.get_state(jd)
 
-        r_rel = u[:3] - r
-        v_rel = u[3:] - v
+        r_rel = u[:3] - state_body[:3]
+        v_rel = u[3:] - state_body[3:]
 
         # Compute the orbital frame
         x = v_rel / np.linalg.norm(v_rel)
@@ -105,10 +110,7 @@ class Spacecraft:
             state vector in ICRS frame
         '''
 
-        force = np.zeros(3)
-        t_jd = self.jd_0 + t/86400
-
-        for body in self.interacting_bodies:
-            force += gravity(u, t_jd, body) * self.mass
+        if self.ephemeris_tables is None:
+            self.stack_ephemeris_tables()
 
-        return np.concatenate((u[3:], force / self.mass))
+        return n_body_rates(self.jd_0 + t/86400, u, *self.ephemeris_tables)
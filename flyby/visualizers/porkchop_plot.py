@@ -0,0 +1,84 @@
+from matplotlib import pyplot as plt
+from matplotlib import dates as mdates
+import numpy as np
+from flyby.analysis.porkchop import porkchop, PorkchopGrid
+from flyby.solar_system_model.celestial_body import CelestialBody
+from flyby.time_model.julian_day import datetime64_to_jd
+
+
+def jd_to_date_number(jd: np.ndarray) -> np.ndarray:
+    '''
+    Converts Julian dates to matplotlib date numbers.
+    '''
+    return jd - datetime64_to_jd(np.datetime64(mdates.get_epoch()))
+
+
+def plot_porkchop(grid: PorkchopGrid, ax: plt.Axes, quantity: str = "c3",
+                  levels: np.ndarray = None, show_time_of_flight: bool = True,
+                  show_optimum: bool = True, cmap: str = "viridis"):
+    '''
+    Plots a porkchop grid as contours of a transfer cost against departure
+    and arrival dates.
+
+    Parameters
+    ----------
+    grid: PorkchopGrid
+        The grid to plot.
+    ax: plt.Axes
+        The axes on which to plot the grid.
+    quantity: str
+        The cost to plot, in km^2/s^2 for c3 and km/s otherwise.
+        [c3, v_inf_departure, v_inf_arrival, total_dv]
+    levels: np.ndarray
+        The contour levels, by default spaced up to four times the minimum.
+    show_time_of_flight: bool
+        Whether to overlay contours of the time of flight in days.
+    show_optimum: bool
+        Whether to mark the cheapest transfer.
+    cmap: str
+        The colormap of the cost contours.
+    '''
+    scale = 1e6 if quantity == "c3" else 1e3
+    values = getattr(grid, quantity) / scale
+
+    if levels is None:
+        minimum = np.nanmin(values)
+        levels = np.linspace(minimum, 4 * minimum, 13)
+
+    x = jd_to_date_number(grid.departure_jd)
+    y = jd_to_date_number(grid.arrival_jd)
+
+    contours = ax.contour(x, y, values.T, levels=levels, cmap=cmap, linewidths=1)
+    ax.clabel(contours, fontsize=7, fmt="%.1f")
+
+    if show_time_of_flight:
+        tof = ax.contour(x, y, grid.time_of_flight.T, colors="gray",
+                         linestyles="dotted", linewidths=0.7)
+        ax.clabel(tof, fontsize=7, fmt="%d d")
+
+    if show_optimum:
+        departure_jd, arrival_jd, value = grid.optimum(quantity)
+        ax.plot(jd_to_date_number(departure_jd), jd_to_date_number(arrival_jd), 'x',
+                color="red", label=f"{quantity} = {value / scale:.2f}")
+        ax.legend(loc="upper left")
+
+    ax.xaxis.set_major_formatter(mdates.DateFormatter("%Y-%m-%d"))
+    ax.yaxis.set_major_formatter(mdates.DateFormatter("%Y-%m-%d"))
+    ax.tick_params(axis="x", labelrotation=45)
+
+    ax.set_xlabel("Departure date")
+    ax.set_ylabel("Arrival date")
+    ax.set_title(f"{grid.departure_body} to {grid.arrival_body}: {quantity}", wrap=True)
+
+
+if __name__ == "__main__":
+    grid = porkchop(CelestialBody.earth(), CelestialBody.mars(),
+                    (np.datetime64("2026-08-01"), np.datetime64("2027-02-01")),
+                    (np.datetime64("2027-03-01"), np.datetime64("2028-03-01")))
+
+    plt.style.use('dark_background')  # dark mode
+    plt.figure(figsize=(8, 7))
+    plot_porkchop(grid, plt.gca())
+    plt.tight_layout()
+
+    plt.show()
@@ -4,7 +4,7 @@ import numpy as np
 from flyby.solar_system_model.celestial_body import CelestialBody
 from flyby.solar_system_model.jpl_ephemeris import de440
 from flyby.orbit_models.keplerian_orbit import KeplerianOrbit
-from flyby.orbit_models.ecliptic_frame import ecliptic_from_J2000
+from flyby.orbit_models.frames import ecliptic_from_icrs
 from flyby.time_model.julian_day import datetime64_to_jd
 from flyby.solar_system_model.relational_tree import RelationalTree
 
@@ -39,7 +39,7 @@ def plot_body(body: CelestialBody, jd: float, ax: plt.Axes, mu: float,
     r, v = de440[0, body.ephemeris_id].compute_and_differentiate(jd)
 
     if frame == "ecliptic":
-        C = ecliptic_from_J2000(jd)
+        C = ecliptic_from_icrs(jd)
     elif frame == "J2000":
         C = np.eye(3)
 
@@ -156,7 +156,7 @@ def zoom_axes_to_body(ax: plt.Axes, body: CelestialBody, jd: float, zoom: float
     '''
     r = de440[0, body.ephemeris_id].compute(jd) * 1e3
 
-    r = ecliptic_from_J2000(jd) @ r if ecliptic else r
+    r = ecliptic_from_icrs(jd) @ r if ecliptic else r
 
     diameter = 2 * body.radius
 
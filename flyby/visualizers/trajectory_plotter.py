@@ -1,10 +1,8 @@
 from matplotlib import pyplot as plt
 import numpy as np
 
-from flyby.orbit_models.ecliptic_frame import ecliptic_from_J2000
-import numpy as np
+from flyby.orbit_models.frames import body_state, icrs_to_ecliptic
 from flyby.solar_system_model.celestial_body import CelestialBody
-from flyby.solar_system_model.jpl_ephemeris import de440
 
 
 def plot_trajectory_about_body(body: CelestialBody, position: np.ndarray, jd: np.ndarray, ax: plt.Axes):
@@ -22,7 +20,7 @@ def plot_trajectory_about_body(body: CelestialBody, position: np.ndarray, jd: np
     ax : plt.Axes
         The axes to plot the trajectory on.
     '''
-    r_body = de440[0, body.ephemeris_id].compute(jd) * 1e3
+    r_body = body_state(body, jd)[..., :3].T
     r_rel = position - r_body
 
     ax.plot(r_rel[0], r_rel[1], r_rel[2])
@@ -52,12 +50,12 @@ def plot_trajectory(r: np.ndarray, ax: plt.Axes, jd: np.ndarray = None,
         The body to plot the trajectory about, by default None
     '''
     if rel_body is not None:
-        r_body = de440[0, rel_body.ephemeris_id].compute(jd) * 1e3
+        r_body = body_state(rel_body, jd)[:, :3].T
         r = r - r_body + (r_body[:, 0])[:, np.newaxis]
 
     if convert_to_ecliptic and jd is not None:
-        C = ecliptic_from_J2000(jd[0])
-        r = C @ r
+        # Each point is rotated with the ecliptic of its own epoch
+        r = icrs_to_ecliptic(r.T, jd).T
     elif convert_to_ecliptic and jd is None:
         raise ValueError(
             "jd must be specified if convert_to_ecliptic is True.")
@@ -69,11 +67,12 @@ def plot_point(r: np.ndarray, ax: plt.Axes, jd: np.ndarray = None,
                color: str = "orange",
                convert_to_ecliptic: bool = True) -> None:
     '''
-    Puts a marker at position r.
+    Puts a marker at position r, at Julian date jd.
     '''
     if convert_to_ecliptic and jd is not None:
-        C = ecliptic_from_J2000(jd[0])
-        r = C @ r
+        if np.ndim(r) == 1 and np.ndim(jd) > 0:
+            jd = jd[0]
+        r = icrs_to_ecliptic(np.transpose(r), jd).T
     elif convert_to_ecliptic and jd is None:
         raise ValueError(
             "jd must be specified if convert_to_ecliptic is True.")
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+from flyby.simulation.simulation import generate_initial_conditions_from_cartesian
+from flyby.solar_system_model.celestial_body import CelestialBody
+
+INITIAL_TIME = np.datetime64('2025-01-01')
+
+# A circular-ish low Earth orbit, relative to the Earth
+LEO_STATE = np.array([7e6, 0, 0, 0, 7.5e3, 0])
+
+
+@pytest.fixture
+def leo_spacecraft():
+    '''
+    A factory of spacecraft starting at INITIAL_TIME from a state relative
+    to the Earth, by default LEO_STATE. Called with the number of days to
+    simulate and optionally the state, it returns a new spacecraft and the
+    end time of the simulation.
+    '''
+    def make(days: int, state: np.ndarray = LEO_STATE):
+        spacecraft = generate_initial_conditions_from_cartesian(
+            np.asarray(state, dtype=np.float64), CelestialBody.earth(), INITIAL_TIME)
+        return spacecraft, INITIAL_TIME + np.timedelta64(days, 'D')
+
+    return make
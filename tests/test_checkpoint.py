@@ -0,0 +1,53 @@
+import os
+
+import numpy as np
+import pytest
+
+from flyby.simulation.checkpoint import Checkpointer
+from flyby.simulation.simulation import resume_simulation, simulate
+
+
+class Preempted(Exception):
+    pass
+
+
+def test_resume_is_identical(tmp_path, monkeypatch, leo_spacecraft):
+    state = np.array([7000e3, 0, 0, 0, 7.6e3, 0])
+    _, end_time = leo_spacecraft(20, state)
+    checkpoint = str(tmp_path / "run.npz")
+
+    def spacecraft():
+        return leo_spacecraft(20, state)[0]
+
+    expected = simulate(spacecraft(), end_time, show_progress=False, integrator="native",
+                        checkpoint=str(tmp_path / "uninterrupted.npz"), checkpoint_interval=0)
+    assert len(expected.t) > 3000
+
+    # Stop the run after its second checkpoint
+    save = Checkpointer.save
+    saves = []
+
+    def preempting_save(self, state):
+        save(self, state)
+        saves.append(state["t"])
+        if len(saves) == 2:
+            raise Preempted
+
+    monkeypatch.setattr(Checkpointer, "save", preempting_save)
+    with pytest.raises(Preempted):
+        simulate(spacecraft(), end_time, show_progress=False, integrator="native",
+                 output=str(tmp_path / "trajectory"), checkpoint=checkpoint, checkpoint_interval=0)
+    monkeypatch.setattr(Checkpointer, "save", save)
+    assert os.path.exists(checkpoint) and 0 < saves[-1] < expected.t[-1]
+
+    # Another simulation cannot be resumed from the checkpoint
+    with pytest.raises(ValueError):
+        simulate(*leo_spacecraft(20, state * 1.01), show_progress=False, integrator="native",
+                 checkpoint=checkpoint, resume=True)
+
+    _, solution = resume_simulation(checkpoint, show_progress=False)
+    reader = solution.trajectory_file
+    assert reader.complete
+    assert np.array_equal(reader.t, expected.t)
+    assert np.array_equal(reader.states, expected.y.T)
+    assert solution.nfev == expected.nfev
@@ -0,0 +1,50 @@
+import struct
+
+import numpy as np
+import pytest
+from pytest import approx
+
+from flyby.solar_system_model.celestial_body import CelestialBody
+from flyby.solar_system_model.ephemeris_cache import (CACHE_FORMAT_VERSION, MAGIC,
+                                                      EphemerisCache, use_ephemeris_cache,
+                                                      write_ephemeris_cache)
+
+
+def test_cache_round_trip(tmp_path):
+    path = str(tmp_path / "cache.flybyeph")
+    write_ephemeris_cache(path, 2457061.5, 2457461.5, ephemeris_ids=[3, 10])
+
+    cache = EphemerisCache(path)
+    assert cache.ephemeris_ids == [3, 10]
+    assert cache.covers(3, 2457100, 2457400)
+    assert not cache.covers(3, 2457000, 2457400)
+    assert not cache.covers(4, 2457100, 2457400)
+
+    earth = CelestialBody.earth()
+    earth.construct_interpolant(2457100, 2457400)
+    expected = [earth.get_state(jd) for jd in np.linspace(2457100, 2457400, 13)]
+
+    try:
+        cache = use_ephemeris_cache(path)
+        earth.construct_interpolant(2457100, 2457400)
+        assert np.shares_memory(earth.position_interpolant.coefficients, cache.data)
+
+        for jd, state in zip(np.linspace(2457100, 2457400, 13), expected):
+            assert earth.get_state(jd) == approx(state, rel=1e-15)
+    finally:
+        use_ephemeris_cache(None)
+
+
+def test_cache_version_check(tmp_path):
+    path = tmp_path / "not_a_cache.flybyeph"
+    path.write_bytes(b"x" * 64)
+
+    with pytest.raises(ValueError, match="not an ephemeris cache"):
+        EphemerisCache(str(path))
+
+    # A cache of another format version
+    path = tmp_path / "other_version.flybyeph"
+    path.write_bytes(MAGIC + struct.pack("<II", CACHE_FORMAT_VERSION + 1, 2) + b"{}")
+
+    with pytest.raises(ValueError, match=f"version {CACHE_FORMAT_VERSION + 1}"):
+        EphemerisCache(str(path))
@@ -0,0 +1,44 @@
+import numpy as np
+from pytest import approx
+from scipy.spatial.transform import Rotation as R
+
+from flyby.orbit_models.frames import (ecliptic_from_icrs, icrs_to_ecliptic, ecliptic_to_icrs,
+                                       icrs_to_body_centred, body_centred_to_icrs,
+                                       obliquity_of_ecliptic)
+from flyby.solar_system_model.celestial_body import CelestialBody
+
+
+def test_ecliptic_rotations():
+    jd = 2451545.0 + np.array([0, 20000, 40000])
+
+    C = ecliptic_from_icrs(jd)
+    assert C.shape == (3, 3, 3)
+    for C_k, jd_k in zip(C, jd):
+        expected = R.from_euler('x', -obliquity_of_ecliptic(jd_k)).as_matrix()
+        assert C_k == approx(expected)
+        assert ecliptic_from_icrs(jd_k) == approx(expected)
+
+    # Each vector is rotated at its own epoch, and states in both halves
+    rng = np.random.default_rng(0)
+    states = rng.normal(size=(3, 6))
+    rotated = icrs_to_ecliptic(states, jd)
+    assert rotated[1, 3:] == approx(C[1] @ states[1, 3:])
+    assert icrs_to_ecliptic(states[:, :3], jd) == approx(rotated[:, :3])
+    assert ecliptic_to_icrs(rotated, jd) == approx(states)
+
+    # A single epoch broadcasts over all vectors
+    assert icrs_to_ecliptic(states, jd[0]) == approx(states @ np.kron(np.eye(2), C[0]).T)
+
+
+def test_body_centred():
+    earth = CelestialBody.earth()
+    jd = 2460000.5 + np.arange(5.0)
+    offset = np.array([7000e3, 0, 0, 0, 7.5e3, 0])
+
+    states = body_centred_to_icrs(np.tile(offset, (5, 1)), jd, earth)
+    assert states[:, :3] == approx(np.array([earth.ephemeris_source(t, t).state(t)[:3]
+                                             for t in jd]) + offset[:3])
+
+    assert icrs_to_body_centred(states, jd, earth) == approx(np.tile(offset, (5, 1)), abs=1e-6)
+    assert icrs_to_body_centred(states[:, :3], jd, earth, ecliptic=True) == approx(
+        icrs_to_ecliptic(np.tile(offset[:3], (5, 1)), jd), abs=1e-6)
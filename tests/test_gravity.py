@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+from pytest import approx
+
+from flyby.solar_system_model.relational_tree import RelationalTree
+from flyby.spacecraft_model.gravity import (body_acceleration, central_body_rates_into, gravity,
+                                           n_body_rates, stack_ephemeris_tables)
+
+
+@pytest.mark.parametrize("method", ["chebyshev", "hermite", "lerp"])
+def test_n_body_rates_matches_gravity(method):
+    bodies = RelationalTree.solar_system().all_bodies
+    for body in bodies:
+        body.construct_interpolant(2457061.5, 2457161.5, method=method)
+
+    u = np.array([1.5e11, 2e10, -3e9, 1e3, 2.9e4, 5e2])
+    t_jd = 2457100.123
+
+    expected = sum(gravity(u, t_jd, body) for body in bodies)
+    rates = n_body_rates(t_jd, u, *stack_ephemeris_tables(bodies))
+
+    assert rates[:3] == approx(u[3:])
+    assert rates[3:] == approx(expected, rel=1e-10)
+
+
+def test_central_body_rates():
+    bodies = RelationalTree.solar_system().all_bodies
+    for body in bodies:
+        body.construct_interpolant(2457061.5, 2457161.5)
+    tables = stack_ephemeris_tables(bodies)
+    earth = [body.name for body in bodies].index("Earth")
+
+    t_jd = 2457100.123
+    u = np.array([7e6, 1e5, -3e5, 1e2, 7.5e3, 5e2])
+    state = bodies[earth].get_state(t_jd)
+
+    # The acceleration of the body along its ephemeris
+    h = 1e-3
+    expected = (bodies[earth].get_velocity(t_jd + h)
+                - bodies[earth].get_velocity(t_jd - h)) / (2 * h * 86400)
+    assert body_acceleration(earth, t_jd, *tables[:5]) == approx(expected, rel=1e-6)
+
+    rates = np.empty(6)
+    central_body_rates_into(rates, t_jd, u, earth, *tables)
+    barycentric = n_body_rates(t_jd, u + state, *tables)
+
+    assert rates[:3] == approx(u[3:])
+    assert rates[3:] == approx(barycentric[3:] - body_acceleration(earth, t_jd, *tables[:5]), rel=1e-9)
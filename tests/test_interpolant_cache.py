@@ -0,0 +1,54 @@
+import numpy as np
+from pytest import approx
+
+from flyby.solar_system_model.celestial_body import CelestialBody
+from flyby.solar_system_model.interpolant_cache import InterpolantCache, interpolant_cache
+from flyby.solar_system_model.relational_tree import RelationalTree
+
+
+def test_cache_reuses_covering_spans():
+    cache = interpolant_cache()
+    cache.clear()
+
+    start, end = 2457061.5, 2457161.5
+    for body in RelationalTree.solar_system().all_bodies:
+        body.construct_interpolant(start, end)
+    assert cache.stats()["misses"] == 9
+
+    # New bodies over a shorter span share the records
+    for body in RelationalTree.solar_system().all_bodies:
+        body.construct_interpolant(start + 10, end - 10)
+    assert cache.stats()["hits"] == 9
+
+    earth = CelestialBody.earth()
+    earth.construct_interpolant(start + 10, end - 10)
+    reference = CelestialBody.earth()
+    reference.construct_interpolant(start + 10, end - 10, use_cache=False)
+    assert not np.shares_memory(earth.position_interpolant.coefficients,
+                                reference.position_interpolant.coefficients)
+    assert earth.position_interpolant.coefficients.shape == \
+        reference.position_interpolant.coefficients.shape
+    for jd in np.linspace(start + 10, end - 10, 7):
+        assert earth.get_state(jd) == approx(reference.get_state(jd), rel=1e-15)
+
+    # Other methods and resolutions are separate entries
+    earth.construct_interpolant(start, end, method="hermite", tolerance=1e3)
+    earth.construct_interpolant(start, end, method="hermite", tolerance=1e2)
+    assert cache.stats()["entries"] == 11
+    cache.clear()
+
+
+def test_cache_evicts_least_recently_used():
+    cache = InterpolantCache(max_bytes=1.5e3)
+
+    for key in range(3):
+        earth = CelestialBody.earth()
+        earth.construct_interpolant(2457061.5 + key, 2457062.5 + key, method="lerp", use_cache=False)
+        cache.put(key, earth.position_interpolant, earth.velocity_interpolant)
+        if key == 1:
+            assert cache.get(0, 2457061.5, 2457062.5) is not None
+
+    assert cache.get(1, 2457062.5, 2457063.5) is None
+    assert cache.get(0, 2457061.5, 2457062.5) is not None
+    assert cache.get(2, 2457063.5, 2457064.5) is not None
+    assert cache.stats()["nbytes"] <= 1.5e3
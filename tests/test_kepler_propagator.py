@@ -0,0 +1,52 @@
+import numpy as np
+from pytest import approx
+from scipy.integrate import solve_ivp
+
+from flyby.orbit_models.kepler_propagator import propagate_kepler
+from flyby.orbit_models.keplerian_orbit import KeplerianOrbit
+from flyby.solar_system_model.celestial_body import CelestialBody
+
+
+def test_propagate_kepler_matches_integration():
+    mu = CelestialBody.sun().mu
+
+    def rates(t, u):
+        return np.concatenate((u[3:], -mu * u[:3] / np.linalg.norm(u[:3])**3))
+
+    # Elliptic, near parabolic and hyperbolic
+    states = np.array([[1.496e11, 1e9, 2e9, 1e3, v, 1e3] for v in (29e3, 42.1e3, 50e3)])
+    dt = np.array([-3e7, 1e5, 1e8])
+
+    propagated = propagate_kepler(states[:, np.newaxis], dt, mu)
+    assert propagated.shape == (3, 3, 6)
+
+    for state, row in zip(states, propagated):
+        for t, expected in zip(dt, row):
+            solution = solve_ivp(rates, (0, t), state, method='DOP853', rtol=1e-12, atol=1e-6)
+            assert solution.y[:, -1] == approx(expected, rel=1e-8)
+
+
+def test_propagate_kepler_round_trip():
+    mu = CelestialBody.earth().mu
+    rng = np.random.default_rng(0)
+    states = np.hstack((rng.normal(size=(1000, 3)) * 1e7, rng.normal(size=(1000, 3)) * 6e3))
+    dt = rng.uniform(-1e6, 1e6, 1000)
+
+    there = propagate_kepler(states, dt, mu)
+    back = propagate_kepler(there, -dt, mu)
+
+    assert not np.isnan(there).any()
+    assert back == approx(states, rel=1e-6, abs=1e-3)
+    assert np.cross(there[:, :3], there[:, 3:]) == approx(np.cross(states[:, :3], states[:, 3:]))
+
+
+def test_keplerian_orbit_propagate():
+    mu = CelestialBody.earth().mu
+    orbit = KeplerianOrbit(7000e3, 0.1, 0.5, 1.0, 2.0)
+    period = 2 * np.pi * np.sqrt(orbit.a**3 / mu)
+
+    states = orbit.propagate(0.3, np.array([0, period / 2, period]), mu)
+
+    assert states.shape == (6, 3)
+    assert states[:, 2] == approx(states[:, 0], rel=1e-9)
+    assert states[:3, 0] == approx(orbit.get_state_space_point(np.array([0.3]))[:, 0])
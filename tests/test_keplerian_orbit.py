@@ -1,4 +1,7 @@
-from flyby.orbit_models.keplerian_orbit import KeplerianOrbit
+import numpy as np
+from pytest import approx
+
+from flyby.orbit_models.keplerian_orbit import KeplerianOrbit, KeplerianOrbitArray
 from flyby.solar_system_model.celestial_body import CelestialBody
 from flyby.solar_system_model.jpl_ephemeris import de440
 
@@ -13,3 +16,72 @@ def test_earth_orbit():
     print(orbit)
 
     orbit.plot()
+
+
+def test_orbit_array_round_trip():
+    mu = CelestialBody.sun().mu
+    rng = np.random.default_rng(0)
+    states = np.hstack((rng.normal(size=(1000, 3)) * 1.5e11, rng.normal(size=(1000, 3)) * 30e3))
+
+    orbits = KeplerianOrbitArray.from_states(states, mu)
+
+    assert len(orbits) == 1000
+    assert (orbits.a < 0).any() and (orbits.a > 0).any()
+    assert orbits.to_states(mu) == approx(states, rel=1e-8)
+
+
+def test_orbit_array_singular_cases():
+    mu = CelestialBody.earth().mu
+    v = np.sqrt(mu / 7000e3)
+
+    # Circular equatorial, circular inclined, elliptic equatorial retrograde
+    states = np.array([
+        [0, 7000e3, 0, -v, 0, 0],
+        [0, 7000e3, 0, -v * np.cos(0.5), 0, v * np.sin(0.5)],
+        [0, -7000e3, 0, -1.1 * v, 0, 0],
+    ])
+
+    orbits = KeplerianOrbitArray.from_states(states, mu)
+
+    assert orbits.i == approx([0, 0.5, np.pi])
+    assert orbits.e == approx([0, 0, 0.21], abs=1e-12)
+    assert orbits.raan == approx([0, np.pi / 2, 0])
+    assert orbits.arg_perigee == approx([0, 0, np.pi / 2])
+    assert orbits.nu == approx([np.pi / 2, 0, 0], abs=1e-12)
+    assert orbits.to_states(mu) == approx(states, abs=1e-6)
+
+    orbit = KeplerianOrbit.from_state(states[2, :3], states[2, 3:], mu)
+    assert orbit.arg_perigee == approx(np.pi / 2)
+    assert isinstance(orbits[2], KeplerianOrbit)
+
+
+def test_orbit_matches_orbit_array():
+    mu = CelestialBody.sun().mu
+    rng = np.random.default_rng(1)
+    states = np.hstack((rng.normal(size=(20, 3)) * 1.5e11, rng.normal(size=(20, 3)) * 30e3))
+    orbits = KeplerianOrbitArray.from_states(states, mu)
+
+    for state, expected in zip(states, orbits.to_states(mu)):
+        orbit = KeplerianOrbit.from_state(state[:3], state[3:], mu)
+        nu = KeplerianOrbitArray.from_states(state, mu).nu
+
+        assert orbit.get_state(nu, mu)[:, 0] == approx(expected, rel=1e-8)
+
+    # Changing an element refreshes the cached rotation
+    orbit.raan += 1
+    assert orbit.get_state_space_point(0)[:, 0] == approx(KeplerianOrbitArray(
+        orbit.a, orbit.e, orbit.i, orbit.raan, orbit.arg_perigee, 0).to_states(mu)[0, :3])
+
+
+def test_orbit_array_of_single_state():
+    mu = CelestialBody.earth().mu
+    state = np.array([7000e3, 0, 0, 0, 7.6e3, 1e3])
+    orbits = KeplerianOrbitArray.from_states(state, mu)
+
+    assert len(orbits) == 1 and orbits.a.shape == (1,)
+    assert orbits.to_states(mu) == approx(state[np.newaxis, :])
+
+    orbit = orbits[0]
+    assert isinstance(orbit, KeplerianOrbit)
+    assert orbit.get_state(orbits.nu[0], mu)[:, 0] == approx(state)
+    assert len(orbits[:1]) == 1
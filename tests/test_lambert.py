@@ -0,0 +1,49 @@
+import numpy as np
+from pytest import approx
+
+from flyby.orbit_models.lambert import lambert, lambert_between_bodies
+from flyby.solar_system_model.celestial_body import CelestialBody
+
+
+def test_lambert_curtis_example():
+    # Curtis, Orbital Mechanics for Engineering Students, Example 5.2
+    r1 = np.array([5000e3, 10000e3, 2100e3])
+    r2 = np.array([-14600e3, 2500e3, 7000e3])
+
+    v1, v2 = lambert(r1, r2, 3600, 398600e9)
+
+    assert v1 == approx([-5992.5, 1925.4, 3245.6], abs=0.1)
+    assert v2 == approx([-3312.5, -4196.6, -385.29], abs=0.1)
+
+
+def test_lambert_grid_conserves_energy_and_momentum():
+    mu = CelestialBody.sun().mu
+    rng = np.random.default_rng(0)
+    r1 = rng.normal(size=(50, 1, 3)) * 1.5e11
+    r2 = rng.normal(size=(1, 40, 3)) * 2e11
+    tof = rng.uniform(30, 900, size=(50, 40)) * 86400
+
+    v1, v2 = lambert(r1, r2, tof, mu)
+    r1, r2 = np.broadcast_arrays(r1, r2)
+
+    assert v1.shape == (50, 40, 3)
+    assert not np.isnan(v1).any()
+
+    energy_1 = np.sum(v1**2, axis=-1) / 2 - mu / np.linalg.norm(r1, axis=-1)
+    energy_2 = np.sum(v2**2, axis=-1) / 2 - mu / np.linalg.norm(r2, axis=-1)
+    assert energy_1 == approx(energy_2, rel=1e-8)
+    assert np.cross(r1, v1) == approx(np.cross(r2, v2), rel=1e-8)
+
+
+def test_lambert_between_bodies():
+    departure_jd = 2460000.5 + np.arange(5)[:, np.newaxis]
+    arrival_jd = departure_jd.T + 250
+
+    v1, v2, earth_state, mars_state = lambert_between_bodies(
+        CelestialBody.earth(), CelestialBody.mars(), departure_jd, arrival_jd)
+
+    assert v1.shape == (5, 5, 3)
+    assert earth_state.shape == (5, 5, 6)
+
+    # Heliocentric orbital speeds are around 30 km/s for the Earth
+    assert np.linalg.norm(earth_state[..., 3:], axis=-1) == approx(30e3, rel=0.05)
@@ -0,0 +1,53 @@
+import pickle
+
+import numpy as np
+from pytest import approx
+
+from flyby.analysis.mga import MGAProblem, optimize_sequence, powered_flyby_dv, refine_with_simulation
+from flyby.analysis.porkchop import porkchop
+from flyby.solar_system_model.celestial_body import CelestialBody
+
+
+def test_powered_flyby_dv():
+    earth = CelestialBody.earth()
+    minimum_periapsis = earth.radius + 200e3
+
+    # A turn within reach of the gravity of the body is free
+    dv, periapsis = powered_flyby_dv(np.array([3e3, 0, 0]), np.array([0, 3e3, 0]),
+                                     earth.mu, minimum_periapsis)
+    assert dv == approx(0, abs=1e-6)
+    assert periapsis > minimum_periapsis
+
+    # Without a turn, the impulse is the change of speed at periapsis
+    dv, periapsis = powered_flyby_dv(np.array([[3e3, 0, 0]]), np.array([[4e3, 0, 0]]),
+                                     earth.mu, minimum_periapsis)
+    assert dv[0] == approx(np.sqrt(16e6 + 2 * earth.mu / periapsis[0]) -
+                           np.sqrt(9e6 + 2 * earth.mu / periapsis[0]))
+
+    # Reversing direction is out of reach, and costs more than the speed
+    dv, periapsis = powered_flyby_dv(np.array([10e3, 0, 0]), np.array([-10e3, 0, 0]),
+                                     earth.mu, minimum_periapsis)
+    assert periapsis == approx(minimum_periapsis)
+    assert dv > 10e3
+
+
+def test_single_leg_matches_porkchop():
+    earth = CelestialBody.earth()
+    mars = CelestialBody.mars()
+    departure_window = (np.datetime64("2026-08-01"), np.datetime64("2027-02-01"))
+
+    problem = MGAProblem([earth, mars], departure_window, [(150, 500)])
+    result = optimize_sequence(problem, seed=0)
+
+    grid = porkchop(earth, mars, departure_window,
+                    (np.datetime64("2027-01-01"), np.datetime64("2028-06-01")), 100, 100)
+    assert result.fun == approx(np.nanmin(grid.total_dv), rel=0.01)
+    assert result.fun <= np.nanmin(grid.total_dv)
+
+    # Workers evaluate a pickled copy of the problem
+    population = np.array([problem.departure_window, [200, 300]])
+    assert pickle.loads(pickle.dumps(problem))(population) == approx(problem(population))
+
+    leg, = refine_with_simulation(problem, result.x)
+    assert leg.miss_distance < 1e3
+    assert np.linalg.norm(leg.correction) < 10
@@ -0,0 +1,36 @@
+import numpy as np
+from pytest import approx
+
+from flyby.analysis.porkchop import porkchop, heliocentric_state_grid
+from flyby.orbit_models.lambert import lambert_between_bodies
+from flyby.solar_system_model.celestial_body import CelestialBody
+
+
+def test_porkchop_matches_lambert_between_bodies():
+    earth = CelestialBody.earth()
+    mars = CelestialBody.mars()
+    departure_window = (np.datetime64("2026-08-01"), np.datetime64("2027-02-01"))
+    arrival_window = (np.datetime64("2027-03-01"), np.datetime64("2028-03-01"))
+
+    heliocentric_state_grid.cache_clear()
+    grid = porkchop(earth, mars, departure_window, arrival_window, 30, 40)
+
+    assert grid.c3.shape == (30, 40)
+    assert heliocentric_state_grid.cache_info().misses == 2
+
+    v1, v2, earth_state, mars_state = lambert_between_bodies(
+        earth, mars, grid.departure_jd[:, np.newaxis], grid.arrival_jd[np.newaxis, :])
+
+    assert grid.v_inf_departure == approx(
+        np.linalg.norm(v1 - earth_state[..., 3:], axis=-1), rel=1e-6)
+    assert grid.v_inf_arrival == approx(
+        np.linalg.norm(v2 - mars_state[..., 3:], axis=-1), rel=1e-6)
+
+    # The 2026 Mars window needs a C3 of around 10 km^2/s^2
+    assert grid.optimum("c3")[2] / 1e6 == approx(10, abs=3)
+
+    # Trans-Mars injection from low Earth orbit takes around 3.6 km/s
+    parked = porkchop(earth, mars, departure_window, arrival_window, 30, 40,
+                      departure_altitude=200e3, arrival_altitude=400e3)
+    assert heliocentric_state_grid.cache_info().hits == 2
+    assert np.nanmin(parked.departure_dv) / 1e3 == approx(3.6, abs=0.2)
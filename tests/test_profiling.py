@@ -0,0 +1,66 @@
+import json
+
+import numpy as np
+
+from flyby.simulation.events import Event
+from flyby.simulation.profiling import Profile, active_profile, profiling
+from flyby.simulation.simulation import simulate
+from flyby.solar_system_model.celestial_body import CelestialBody
+
+
+def test_simulate_profile(leo_spacecraft):
+    for integrator in ("scipy", "native"):
+        spacecraft, end_time = leo_spacecraft(5)
+        profile = Profile()
+        solution = simulate(spacecraft, end_time, show_progress=False, integrator=integrator,
+                            profile=profile)
+
+        counters = profile.counters
+        assert counters["simulations"] == 1
+        assert counters["rates_evaluations"] == solution.nfev
+        assert counters["steps_accepted"] == len(solution.t) - 1
+        assert counters["event_evaluations"] == 0
+
+        # Two evaluations to start and twelve per attempted step of DOP853
+        attempts = counters["steps_accepted"] + counters["steps_rejected"]
+        assert counters["steps_rejected"] > 0
+        assert solution.nfev == 2 + 12 * attempts
+
+        assert profile.lookups == {body.name: solution.nfev
+                                   for body in spacecraft.interacting_bodies}
+
+        paths = set(profile.phases)
+        assert {"interpolants", "interpolants;Earth", "integration",
+                "post-processing"} <= paths
+        assert ("integration;kernel" in paths) == (integrator == "native")
+
+        exported = json.loads(profile.to_json())
+        assert exported["counters"] == counters
+        self_seconds = sum(phase["self_seconds"] for phase in exported["phases"].values())
+        total_seconds = sum(phase["seconds"] for path, phase in exported["phases"].items()
+                            if ";" not in path)
+        assert np.isclose(self_seconds, total_seconds)
+
+        folded = [line.rsplit(" ", 1) for line in profile.folded().splitlines()]
+        assert {path for path, _ in folded} == paths
+        assert all(int(microseconds) >= 0 for _, microseconds in folded)
+
+
+def test_profiling_block(leo_spacecraft):
+    earth = CelestialBody.earth()
+
+    assert active_profile() is None
+    with profiling() as profile:
+        assert active_profile() is profile
+        for integrator in ("scipy", "native"):
+            simulate(*leo_spacecraft(2), show_progress=False, integrator=integrator,
+                     events=[Event.altitude(earth, 620e3)])
+    assert active_profile() is None
+
+    assert profile.counters["simulations"] == 2
+    assert profile.counters["event_evaluations"] > 0
+
+    # The event looks up the Earth on top of the rates
+    lookups = profile.lookups
+    assert lookups["Earth"] - lookups["Sun"] == profile.counters["event_evaluations"]
+    assert profile.phases["integration"][1] == 2
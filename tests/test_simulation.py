@@ -0,0 +1,200 @@
+import numpy as np
+from pytest import approx
+
+from flyby.orbit_models.frames import body_state
+from flyby.simulation.events import Event, standard_events
+from flyby.simulation.integrators import integrate
+from flyby.simulation.parallel import simulate_parallel
+from flyby.simulation.simulation import (generate_initial_conditions_from_cartesian,
+                                         simulate, simulate_batch)
+from flyby.solar_system_model.celestial_body import CelestialBody
+from flyby.spacecraft_model.force_model import AdaptiveForceModel
+from flyby.time_model.julian_day import datetime64_to_jd
+
+
+def test_simulate_batch_matches_simulate():
+    earth = CelestialBody.earth()
+    initial_time = np.datetime64('2025-01-01')
+    end_time = initial_time + np.timedelta64(30, 'D')
+
+    states = np.array([[2e9, 0, 0, 3e3, 0, 0],
+                       [0, -2e9, 0, 0, -3e3, 0],
+                       [0, 0, 2e9, 0, 0, 3e3]])
+
+    trajectories = simulate_batch(states, earth, initial_time, end_time, show_progress=False)
+
+    assert trajectories.shape == (3,)
+    assert trajectories['y'].shape[:2] == (3, 6)
+
+    for state, trajectory in zip(states, trajectories):
+        spacecraft = generate_initial_conditions_from_cartesian(state, earth, initial_time)
+        solution = simulate(spacecraft, end_time, show_progress=False)
+
+        assert trajectory['t'][-1] == solution.t[-1]
+        assert np.linalg.norm(trajectory['y'][:3, -1] - solution.y[:3, -1]) < 1e3
+
+
+def test_simulate_parallel_matches_simulate():
+    earth = CelestialBody.earth()
+    initial_time = np.datetime64('2025-01-01')
+    end_time = initial_time + np.timedelta64(30, 'D')
+
+    spacecraft = [generate_initial_conditions_from_cartesian(
+        np.array([2e9, 0, 0, 0, 3e3 + 100 * k, 0]), earth, initial_time + np.timedelta64(k, 'D'))
+        for k in range(4)]
+
+    solutions = simulate_parallel(spacecraft, end_time, processes=2, show_progress=False)
+
+    for s, solution in zip(spacecraft, solutions):
+        expected = simulate(s, end_time, show_progress=False)
+        assert solution.y[:, -1] == approx(expected.y[:, -1])
+
+
+def test_native_integrators_match_scipy(leo_spacecraft):
+    state = np.array([2e9, 0, 0, 0, 3e3, 0])
+
+    expected = simulate(*leo_spacecraft(200, state), show_progress=False)
+
+    for method, step in (("DOP853", None), ("RKF78", None), ("Yoshida4", 3600.0)):
+        spacecraft, end_time = leo_spacecraft(200, state)
+        solution = simulate(spacecraft, end_time, show_progress=False,
+                            integrator="native", method=method, step=step)
+
+        assert solution.success
+        assert solution.t[0] == 0 and solution.t[-1] == expected.t[-1]
+        assert solution.y[:, 0] == approx(spacecraft.initial_state_icrs)
+        # About 1e-8 of the distance travelled, as for the tolerances
+        assert np.linalg.norm(solution.y[:3, -1] - expected.y[:3, -1]) < 1e4
+
+    # The compiled DOP853 starts with the same steps as SciPy's, until the
+    # error estimates of tiny steps are dominated by rounding
+    native = simulate(*leo_spacecraft(200, state), show_progress=False, integrator="native")
+    assert native.t[:4] == approx(expected.t[:4], rel=1e-9)
+
+
+def test_events():
+    earth = CelestialBody.earth()
+    initial_time = np.datetime64('2025-01-01')
+    end_time = initial_time + np.timedelta64(700, 'D')
+
+    def bodies():
+        return generate_initial_conditions_from_cartesian(
+            np.zeros(6), earth, initial_time).interacting_bodies
+
+    events = standard_events(bodies(), datetime64_to_jd(initial_time))
+    events.append(Event.periapsis(next(body for body in bodies() if body.name == "Earth")))
+    names = [event.name for event in events]
+
+    for integrator in ("scipy", "native"):
+        # Escape: periapsis at the start and leaving the sphere of influence
+        escape = simulate(generate_initial_conditions_from_cartesian(
+            np.array([7000e3, 0, 0, 0, 10.9e3, 0]), earth, initial_time),
+            end_time, show_progress=False, integrator=integrator, events=events)
+
+        assert escape.status == 0
+        assert escape.t_events[names.index("Earth SOI exit")] / 86400 == approx([3.9], abs=0.05)
+        assert escape.t_events[names.index("Earth periapsis")][0] == approx(0, abs=1e-6)
+        assert len(escape.t_events[names.index("Earth SOI entry")]) == 0
+
+        # Suborbital: stops at the surface instead of running for 700 days
+        impact = simulate(generate_initial_conditions_from_cartesian(
+            np.array([7000e3, 0, 0, 0, 6e3, 0]), earth, initial_time),
+            end_time, show_progress=False, integrator=integrator, events=events)
+
+        assert impact.status == 1
+        assert impact.t[-1] == approx(647.54, abs=0.01)
+        assert impact.t_events[names.index("Earth impact")] == approx([impact.t[-1]])
+
+        earth_position = body_state(earth, datetime64_to_jd(initial_time) + impact.t[-1] / 86400)[:3]
+        assert np.linalg.norm(impact.y[:3, -1] - earth_position) == approx(earth.radius)
+
+
+def test_dense_trajectory(leo_spacecraft):
+    state = np.array([2e9, 0, 0, 0, 3e3, 0])
+
+    def run(**kwargs):
+        return simulate(*leo_spacecraft(200, state), show_progress=False, dense_output=True,
+                        **kwargs)
+
+    expected = run()
+    jd_0 = leo_spacecraft(200, state)[0].jd_0
+    t = np.linspace(0, expected.t[-1], 1001)
+
+    for solution in (expected, run(method="RK45"), run(integrator="native"),
+                     run(integrator="native", method="RKF78")):
+        trajectory = solution.trajectory
+        # Through the steps, and between them as the integrator's own dense output
+        assert trajectory.at(solution.t) == approx(solution.y.T, rel=1e-12)
+        if solution.sol is not None:
+            assert trajectory.at(t) == approx(solution.sol(t).T, rel=1e-12)
+        assert np.linalg.norm(trajectory.states(jd_0 + t / 86400)[:, :3] - expected.sol(t)[:3].T,
+                              axis=1).max() < 1e4
+
+    jd, states = expected.trajectory.resample(step=3600)
+    assert len(jd) == 200 * 24 + 1 and jd[-1] == approx(jd_0 + 200, abs=1e-9)
+    assert expected.trajectory.nbytes < states.nbytes
+
+
+def test_adaptive_force_model(leo_spacecraft):
+    state = np.array([2e9, 0, 0, 0, 3e3, 0])
+
+    expected = simulate(*leo_spacecraft(5, state), show_progress=False, integrator="native")
+
+    force_model = AdaptiveForceModel(tolerance=1e-9)
+    spacecraft, end_time = leo_spacecraft(5, state)
+    solution = simulate(spacecraft, end_time, show_progress=False, integrator="native",
+                        force_model=force_model)
+
+    assert solution.success and solution.t[-1] == expected.t[-1]
+    assert [t for t, _ in force_model.segments] == approx(86400.0 * np.arange(5))
+
+    # Neptune is omitted, the Sun and Earth never are
+    names = np.array([body.name for body in spacecraft.interacting_bodies])
+    for _, active in force_model.segments:
+        assert "Neptune" not in names[active]
+        assert {"Sun", "Earth"} <= set(names[active])
+
+    # Within the displacement the omitted accelerations can cause
+    assert np.linalg.norm(solution.y[:3, -1] - expected.y[:3, -1]) < 0.5 * 1e-9 * (5 * 86400.0)**2
+
+
+def test_central_body(leo_spacecraft):
+    earth = CelestialBody.earth()
+
+    barycentric = simulate(*leo_spacecraft(1), show_progress=False, integrator="native")
+    spacecraft, end_time = leo_spacecraft(1)
+    relative = simulate(spacecraft, end_time, show_progress=False, integrator="native",
+                        central_body=earth)
+
+    index = [body.name for body in spacecraft.interacting_bodies].index("Earth")
+    assert relative.frames == [(0.0, index)]
+    assert relative.y[:, 0] == approx(spacecraft.initial_state_icrs)
+
+    # Barycentric positions only resolve the orbit to about rtol * 1 AU
+    reference = integrate(spacecraft.ephemeris_tables, spacecraft.jd_0,
+                          spacecraft.initial_state_icrs, 86400.0, rtol=1e-12, central=index)
+    assert np.linalg.norm(relative.y[:3, -1] - reference.y[:3, -1]) < 10
+    assert np.linalg.norm(barycentric.y[:3, -1] - reference.y[:3, -1]) > 100
+
+
+def test_central_body_switching(leo_spacecraft):
+    state = np.array([7e6, 0, 0, 0, 10.9e3, 0])
+
+    solutions = []
+    for central_body in (None, "auto"):
+        spacecraft, end_time = leo_spacecraft(30, state)
+        events = [Event.sphere_of_influence_exit(body, spacecraft.jd_0)
+                  for body in spacecraft.interacting_bodies if body.name == "Earth"]
+        solutions.append(simulate(spacecraft, end_time, show_progress=False, integrator="native",
+                                  events=events, central_body=central_body))
+    barycentric, switched = solutions
+
+    # From the Earth to the Sun on leaving the Earth's sphere of influence
+    names = [body.name for body in spacecraft.interacting_bodies]
+    assert [names[b] for _, b in switched.frames] == ["Earth", "Sun"]
+    assert len(switched.t_events[0]) == 1
+    assert switched.frames[1][0] == approx(switched.t_events[0][0])
+    assert switched.t_events[0][0] == approx(barycentric.t_events[0][0], abs=1.0)
+
+    assert switched.t[-1] == barycentric.t[-1]
+    assert np.linalg.norm(switched.y[:3, -1] - barycentric.y[:3, -1]) < 1e4
@@ -1,12 +1,96 @@
 import os
-from flyby.solar_system_model.jpl_ephemeris import de440
+import numpy as np
+import pytest
+from flyby.math_utilities.fast_linear_interpolator import FastLerp
+from flyby.solar_system_model.celestial_body import CelestialBody
+from flyby.solar_system_model.jpl_ephemeris import EphemerisProvider, de440
+from flyby.solar_system_model.relational_tree import RelationalTree
 from pytest import approx
 
 
 def test_ephemeris_download():
-    assert os.path.exists("de440.bsp")
+    assert de440.kernel is not None
+    assert os.path.exists(de440.path)
+
+
+def test_ephemeris_is_lazy():
+    provider = EphemerisProvider(path=de440.path)
+    assert provider._kernel is None
+
+    position = provider.segment(4).compute(2457061.5)
+    assert position == approx(de440[0, 4].compute(2457061.5))
 
 
 def test_earth_ephem():
     position, velocity = de440[0, 4].compute_and_differentiate(2457061.5)
     assert velocity == approx([-363896.059, 2019662.996,  936169.773])
+
+
+def test_chebyshev_interpolant():
+    earth = CelestialBody.earth()
+    earth.construct_interpolant(2457061.5, 2457761.5, method="chebyshev")
+
+    for jd in np.linspace(2457061.5, 2457761.5, 37):
+        position, velocity = de440[0, earth.ephemeris_id].compute_and_differentiate(jd)
+        state = earth.get_state(jd)
+        assert state[:3] == approx(position * 1e3, rel=1e-12)
+        assert state[3:] == approx(velocity * 1e3 / 86400, rel=1e-9)
+        assert earth.get_velocity(jd) == approx(state[3:])
+
+
+def test_hermite_interpolant():
+    start, end = 2457061.5, 2457061.5 + 3 * 365
+    t_jd = np.linspace(start, end, 1001)
+    n_records = n_bytes = 0
+
+    bodies = RelationalTree.solar_system().all_bodies
+    for body in bodies:
+        body.construct_interpolant(start, end, method="hermite", tolerance=1e3)
+
+        position, velocity = de440[0, body.ephemeris_id].compute_and_differentiate(t_jd)
+        states = np.array([body.get_state(jd) for jd in t_jd]).T
+
+        assert np.linalg.norm(states[:3] - position * 1e3, axis=0).max() < 1e3
+        assert body.position_interpolant.coefficients.shape[2] == 4
+        n_records += len(body.position_interpolant.coefficients)
+        n_bytes += body.position_interpolant.coefficients.nbytes
+
+    # The linear interpolant has 10 nodes per day for every body, each a
+    # float64 position; the Hermite records are over 10 times fewer, and
+    # take under a quarter of the memory with their 4 coefficients
+    n_lerp_nodes = len(bodies) * 10 * (end - start)
+    assert n_records < n_lerp_nodes / 10
+    assert n_bytes < n_lerp_nodes * 3 * 8 / 4
+
+    # Spans of under a day still get a whole record
+    earth = CelestialBody.earth()
+    for method, tolerance in (("hermite", 1e3), ("lerp", 1e5)):
+        earth.construct_interpolant(start, start + 0.25, method=method)
+        position = de440[0, earth.ephemeris_id].compute(start + 0.2) * 1e3
+        assert np.linalg.norm(earth.get_position(start + 0.2) - position) < tolerance
+
+
+def test_fast_lerp_arrays():
+    jd = np.linspace(0, 10, 11)
+    values = np.array([np.sin(jd), np.cos(jd), jd**2])
+
+    lerp = FastLerp(jd, values)
+    t = np.concatenate((np.linspace(-1, 11, 50), np.random.default_rng(0).uniform(0, 10, 50)))
+    expected = np.array([np.interp(t, jd, row) for row in values]).T
+
+    assert lerp(t) == approx(expected, rel=1e-12)
+    assert np.array([lerp(t_k) for t_k in t]) == approx(expected, rel=1e-12)
+    assert lerp(t.reshape(10, 10)).shape == (10, 10, 3)
+
+    assert np.isnan(FastLerp(jd, values, out_of_range="nan")(t[:2])).all()
+    assert FastLerp(jd, values, out_of_range="extrapolate")(11.0) \
+        == approx(values[:, -1] + values[:, -1] - values[:, -2])
+    with pytest.raises(ValueError):
+        FastLerp(jd, values, out_of_range="raise")(t)
+
+    # Bodies evaluate arrays of times with either interpolant
+    earth = CelestialBody.earth()
+    for method in ("lerp", "chebyshev"):
+        earth.construct_interpolant(2457061.5, 2457071.5, method=method)
+        t_jd = np.linspace(2457061.5, 2457071.5, 7)
+        assert earth.get_state(t_jd) == approx(np.array([earth.get_state(t) for t in t_jd]))
@@ -0,0 +1,38 @@
+import json
+
+import numpy as np
+from pytest import approx
+
+from flyby.simulation.simulation import simulate
+from flyby.simulation.telemetry import ProgressMonitor
+
+
+def test_simulate_reports_progress(leo_spacecraft):
+    for integrator in ("scipy", "native"):
+        reports = []
+        solution = simulate(*leo_spacecraft(5), show_progress=False, integrator=integrator,
+                            telemetry=[reports.append], progress_interval=0.0)
+
+        assert len(reports) > 1
+        assert [report.final for report in reports] == [False] * (len(reports) - 1) + [True]
+        assert np.all(np.diff([report.t for report in reports]) >= 0)
+
+        final = reports[-1]
+        assert final.t == solution.t[-1] and final.fraction == approx(1)
+        assert final.steps == len(solution.t) - 1
+        assert final.evaluations == solution.nfev
+        assert final.days_per_second == approx(5 / final.elapsed, rel=1e-3)
+        assert json.loads(json.dumps(final.as_dict()))["steps"] == final.steps
+
+
+def test_monitor_throttles_reports():
+    reports = []
+    monitor = ProgressMonitor(86400.0, [reports.append], interval=3600.0)
+
+    for k in range(1000):
+        monitor.update(86.4 * k, k, 12 * k)
+    assert reports == []
+
+    assert monitor.close().final
+    assert monitor.close() is None
+    assert len(reports) == 1 and reports[0].steps == 999
@@ -0,0 +1,52 @@
+import numpy as np
+from pytest import approx
+
+from flyby.simulation.simulation import simulate
+from flyby.simulation.trajectory_file import TrajectoryReader, TrajectoryWriter
+from flyby.solar_system_model.celestial_body import CelestialBody
+
+
+def test_streamed_simulation(tmp_path, leo_spacecraft):
+    earth = CelestialBody.earth()
+    state = np.array([7000e3, 0, 0, 0, 10.9e3, 0])
+
+    expected = simulate(*leo_spacecraft(8, state), show_progress=False, integrator="native")
+
+    for integrator in ("native", "scipy"):
+        spacecraft, end_time = leo_spacecraft(8, state)
+        solution = simulate(spacecraft, end_time, show_progress=False, integrator=integrator,
+                            output=str(tmp_path / integrator))
+
+        reader = solution.trajectory_file
+        assert reader.complete and reader.jd_0 == spacecraft.jd_0
+        assert reader.t[-1] == solution.t[-1] and reader.states[-1] == approx(solution.y[:, -1])
+        if integrator == "native":
+            assert len(solution.t) == 2
+            assert np.array_equal(reader.t, expected.t)
+            assert np.array_equal(reader.states, expected.y.T)
+
+        # Leaves the Earth's sphere of influence after about 3.9 days
+        t_jd, states, bodies = reader.read()
+        assert bodies[0] == earth.ephemeris_id and bodies[-1] == CelestialBody.sun().ephemeris_id
+        exit = np.argmax(bodies != earth.ephemeris_id)
+        assert t_jd[exit - 1] - reader.jd_0 < 3.9 < t_jd[exit] - reader.jd_0
+
+        t_jd, states, bodies = reader.read(reader.jd_0 + 2, reader.jd_0 + 5)
+        assert len(t_jd) == len(states) == len(bodies) > 0
+        assert t_jd[0] >= reader.jd_0 + 2 and t_jd[-1] <= reader.jd_0 + 5
+
+
+def test_partial_file_is_readable(tmp_path):
+    path = str(tmp_path / "partial")
+    writer = TrajectoryWriter(path, 2460000.5, chunk_size=10)
+    for start in range(0, 25, 5):
+        writer.append(np.arange(start, start + 5.0), np.ones((5, 6)))
+
+    reader = TrajectoryReader(path)
+    assert len(reader) == 20 and not reader.complete
+    assert (reader.bodies == -1).all()
+
+    writer.close()
+    reader = TrajectoryReader(path)
+    assert len(reader) == 25 and reader.complete
+    assert reader.t == approx(np.arange(25.0))